@@ -0,0 +1,17 @@
+"""
+Gunicorn settings for serving mysite.asgi with Uvicorn workers.
+
+Each worker runs an event loop, so async views such as like_post and
+follow_toggle do not hold a worker while they wait on the database.
+
+    gunicorn -c deploy/gunicorn_asgi.py mysite.asgi
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '127.0.0.1:8000')
+# One event loop per core is enough; more workers only add memory
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_class = 'uvicorn_worker.UvicornWorker'
+timeout = 30
+accesslog = os.environ.get('ACCESS_LOG')
@@ -0,0 +1,15 @@
+"""
+Gunicorn settings for serving mysite.wsgi with synchronous workers.
+
+    gunicorn -c deploy/gunicorn_wsgi.py mysite.wsgi
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '127.0.0.1:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+# Each worker handles one request at a time per thread
+threads = int(os.environ.get('WEB_THREADS', 1))
+worker_class = 'gthread' if threads > 1 else 'sync'
+timeout = 30
+accesslog = os.environ.get('ACCESS_LOG')
@@ -1,5 +1,9 @@
 from django.contrib import admin
-from .models import BlogCategory, BlogPost, Project, Tutorial, Comment, Profile, Like, Share, Notification
+from . import jobs, newsletter, rendering, slugs
+from .models import (
+    BlogCategory, BlogPost, Project, Tutorial, Comment, Profile, Like, Share, Notification, Job,
+    LoginAttemptRollup, NewsletterCampaign, NewsletterSubscriber,
+)
 
 @admin.register(BlogCategory)
 class BlogCategoryAdmin(admin.ModelAdmin):
@@ -8,10 +12,40 @@ class BlogCategoryAdmin(admin.ModelAdmin):
 
 @admin.register(BlogPost)
 class BlogPostAdmin(admin.ModelAdmin):
-    list_display = ('title', 'author', 'category', 'created_at', 'featured')
+    list_display = ('title', 'author', 'category', 'created_at', 'word_count', 'featured')
     list_filter = ('category', 'author', 'featured')
     search_fields = ('title', 'content')
-    prepopulated_fields = {"slug": ("title",)}
+    actions = ['backfill_slugs', 'rerender_content']
+    # Kept by main.counters; a form save must not write back the values it loaded
+    readonly_fields = ('likes_count', 'comments_count', 'shares_count')
+
+    def get_form(self, request, obj=None, **kwargs):
+        form = super().get_form(request, obj, **kwargs)
+        # Left blank, the slug is allocated from the title on save
+        form.base_fields['slug'].required = False
+        form.base_fields['slug'].help_text = 'Leave blank to generate a unique slug from the title.'
+        return form
+
+    def save_model(self, request, obj, form, change):
+        update_fields = None
+        if change:
+            # Only the edited columns, as PostForm does
+            edited = [name for name in form.base_fields if not obj._meta.get_field(name).many_to_many]
+            update_fields = [*edited, *rendering.RENDERED_FIELDS, 'updated_at']
+        if obj.slug:
+            obj.save(update_fields=update_fields)
+        else:
+            slugs.save_with_unique_slug(obj, obj.title, update_fields=update_fields)
+
+    @admin.action(description='Repair empty or invalid slugs')
+    def backfill_slugs(self, request, queryset):
+        updated = slugs.backfill(queryset)
+        self.message_user(request, f'{updated} slugs repaired.')
+
+    @admin.action(description='Render content again')
+    def rerender_content(self, request, queryset):
+        changed = rendering.rerender(queryset)
+        self.message_user(request, f'{changed} posts re-rendered.')
 
 @admin.register(Project)
 class ProjectAdmin(admin.ModelAdmin):
@@ -51,3 +85,50 @@ class NotificationAdmin(admin.ModelAdmin):
     list_display = ('recipient', 'sender', 'notification_type', 'created_at', 'is_read')
     list_filter = ('notification_type', 'is_read', 'created_at')
     search_fields = ('recipient__username', 'sender__username')
+
+@admin.register(LoginAttemptRollup)
+class LoginAttemptRollupAdmin(admin.ModelAdmin):
+    list_display = ('day', 'ip_address', 'successes', 'failures')
+    list_filter = ('day',)
+    search_fields = ('ip_address',)
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('task', 'status', 'priority', 'run_at', 'attempts', 'max_attempts', 'finished_at')
+    list_filter = ('status', 'task')
+    search_fields = ('task', 'last_error')
+    readonly_fields = ('attempts', 'locked_by', 'locked_at', 'created_at', 'finished_at', 'last_error')
+    actions = ['retry_now']
+
+    def changelist_view(self, request, extra_context=None):
+        extra_context = {**(extra_context or {}), 'queue_depth': jobs.queue_depth()}
+        return super().changelist_view(request, extra_context=extra_context)
+
+    @admin.action(description='Retry selected jobs now')
+    def retry_now(self, request, queryset):
+        from django.utils import timezone
+
+        updated = queryset.exclude(status=Job.RUNNING).update(
+            status=Job.QUEUED, run_at=timezone.now(), attempts=0, finished_at=None,
+        )
+        self.message_user(request, f'{updated} jobs queued again.')
+
+@admin.register(NewsletterSubscriber)
+class NewsletterSubscriberAdmin(admin.ModelAdmin):
+    list_display = ('email', 'subscribed_at')
+    search_fields = ('email',)
+    show_full_result_count = False
+
+@admin.register(NewsletterCampaign)
+class NewsletterCampaignAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'status', 'sent_count', 'failed_count', 'started_at', 'finished_at')
+    list_filter = ('status',)
+    readonly_fields = ('status', 'last_subscriber_id', 'sent_count', 'failed_count', 'started_at', 'finished_at')
+    actions = ['send_campaigns']
+
+    @admin.action(description='Send selected campaigns')
+    def send_campaigns(self, request, queryset):
+        campaigns = list(queryset.exclude(status=NewsletterCampaign.SENT))
+        for campaign in campaigns:
+            newsletter.schedule(campaign)
+        self.message_user(request, f'{len(campaigns)} campaigns queued for sending.')
@@ -0,0 +1,256 @@
+"""
+Serving collected static files straight from the application.
+
+collectstatic (through CompressedManifestStaticFilesStorage) writes hashed
+copies of every file plus .gz and .br siblings. StaticFilesMiddleware indexes
+STATIC_ROOT once at startup and answers /static/ requests from that index:
+hashed names are cached forever, the precompressed sibling the client accepts
+is sent, and conditional and byte-range requests are honoured.
+"""
+import gzip
+import json
+import mimetypes
+import os
+import re
+from email.utils import formatdate, parsedate_to_datetime
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; only .gz files are written without it
+    brotli = None
+
+# Preference order when the client accepts several encodings
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'application/xml', 'image/svg+xml')
+
+# Compressed siblings that do not save at least this fraction are not written
+MIN_SAVING = 0.05
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def is_compressible(name):
+    content_type = mimetypes.guess_type(name)[0] or ''
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def compress_file(path):
+    """Write .gz (and .br when available) next to path if they are worth it; returns the paths written."""
+    with open(path, 'rb') as source:
+        data = source.read()
+    compressors = [('.gz', lambda raw: gzip.compress(raw, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        compressors.append(('.br', lambda raw: brotli.compress(raw, quality=11)))
+    written = []
+    for suffix, compress in compressors:
+        compressed = compress(data)
+        if len(compressed) <= len(data) * (1 - MIN_SAVING):
+            with open(path + suffix, 'wb') as target:
+                target.write(compressed)
+            written.append(path + suffix)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage that also precompresses every text asset it collects."""
+
+    # Templates may still name a file collectstatic has not seen yet
+    manifest_strict = False
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if is_compressible(name) and self.exists(name):
+                compress_file(self.path(name))
+
+
+class StaticFile:
+    """One servable file in STATIC_ROOT and its precompressed siblings."""
+
+    def __init__(self, path, immutable):
+        self.immutable = immutable
+        self.content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        self.variants = {None: self._stat(path)}
+        for encoding, suffix in ENCODINGS:
+            if os.path.exists(path + suffix):
+                self.variants[encoding] = self._stat(path + suffix)
+        self.last_modified = self.variants[None]['mtime']
+
+    @staticmethod
+    def _stat(path):
+        stat = os.stat(path)
+        return {
+            'path': path,
+            'size': stat.st_size,
+            'mtime': int(stat.st_mtime),
+            'etag': f'"{int(stat.st_mtime):x}-{stat.st_size:x}"',
+        }
+
+
+def build_index(root, prefix, manifest_name='staticfiles.json'):
+    """Map every URL path under prefix to a StaticFile; compressed siblings are not entries of their own."""
+    index = {}
+    if not root or not os.path.isdir(root):
+        return index
+    hashed = set()
+    manifest_path = os.path.join(root, manifest_name)
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as manifest:
+            hashed = set(json.load(manifest).get('paths', {}).values())
+    suffixes = tuple(suffix for _, suffix in ENCODINGS)
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            name = os.path.relpath(path, root).replace(os.sep, '/')
+            if name.endswith(suffixes) and os.path.exists(path[:path.rfind('.')]):
+                continue
+            index[prefix + name] = StaticFile(path, immutable=name in hashed)
+    return index
+
+
+def accepted_encodings(header):
+    """Content codings the client accepts (q > 0) according to Accept-Encoding."""
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = 1.0
+        match = re.search(r'q=([\d.]+)', params)
+        if match:
+            try:
+                quality = float(match.group(1))
+            except ValueError:
+                quality = 0.0
+        if coding and quality > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def parse_range(header, size):
+    """Return (start, end) inclusive for a single satisfiable byte range, or None."""
+    match = _RANGE_RE.match(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    elif last:
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        return None
+    if start > end or start >= size:
+        return None
+    return start, end
+
+
+class StaticFilesMiddleware:
+    """Serve STATIC_ROOT from an in-memory index built when the process starts."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.max_age = getattr(settings, 'STATIC_MAX_AGE', 60)
+        self.index = build_index(settings.STATIC_ROOT, settings.STATIC_URL)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        static_file = self.index.get(request.path_info)
+        if static_file is None or request.method not in ('GET', 'HEAD'):
+            return self.get_response(request)
+        return self.serve(request, static_file)
+
+    async def __acall__(self, request):
+        static_file = self.index.get(request.path_info)
+        if static_file is None or request.method not in ('GET', 'HEAD'):
+            return await self.get_response(request)
+        # Static files are small; reading them whole avoids streaming a sync iterator under ASGI
+        return self.serve(request, static_file, stream=False)
+
+    def serve(self, request, static_file, stream=True):
+        range_header = request.headers.get('Range')
+        encoding = None
+        if not range_header:
+            accepted = accepted_encodings(request.headers.get('Accept-Encoding', ''))
+            encoding = next((name for name, _ in ENCODINGS if name in accepted and name in static_file.variants), None)
+        variant = static_file.variants[encoding]
+
+        headers = {
+            'Content-Type': static_file.content_type,
+            'Cache-Control': IMMUTABLE_CACHE_CONTROL if static_file.immutable else f'public, max-age={self.max_age}',
+            'ETag': variant['etag'] if encoding is None else f'{variant["etag"][:-1]}-{encoding}"',
+            'Last-Modified': formatdate(static_file.last_modified, usegmt=True),
+            'Accept-Ranges': 'bytes',
+        }
+        if len(static_file.variants) > 1:
+            headers['Vary'] = 'Accept-Encoding'
+        if encoding:
+            headers['Content-Encoding'] = encoding
+
+        if self.not_modified(request, headers['ETag'], static_file.last_modified):
+            response = HttpResponseNotModified()
+            for name in ('Cache-Control', 'ETag', 'Last-Modified', 'Vary'):
+                if name in headers:
+                    response[name] = headers[name]
+            return response
+
+        size = variant['size']
+        byte_range = None
+        if range_header and request.headers.get('If-Range', headers['ETag']) == headers['ETag']:
+            byte_range = parse_range(range_header, size)
+            if byte_range is None:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{size}'
+                return response
+
+        if byte_range is not None:
+            start, end = byte_range
+            status = 206
+            headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+            length = end - start + 1
+        else:
+            start, status, length = 0, 200, size
+        headers['Content-Length'] = str(length)
+
+        if request.method == 'HEAD':
+            response = HttpResponse(status=status)
+        else:
+            handle = open(variant['path'], 'rb')
+            if byte_range is None and stream:
+                response = FileResponse(handle, status=status)
+            else:
+                with handle:
+                    handle.seek(start)
+                    response = HttpResponse(handle.read(length), status=status)
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+    @staticmethod
+    def not_modified(request, etag, last_modified):
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(',')]
+            return '*' in tags or etag in tags or f'W/{etag}' in tags
+        if_modified_since = request.headers.get('If-Modified-Since')
+        if if_modified_since:
+            try:
+                return parsedate_to_datetime(if_modified_since).timestamp() >= last_modified
+            except (TypeError, ValueError):
+                return False
+        return False
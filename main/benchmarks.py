@@ -0,0 +1,282 @@
+"""
+Query-count and latency benchmarks for every named route in main.urls.
+
+Each route is requested repeatedly through the Django test client against
+seeded data. The SQL query count and the p50/p95/p99 latency are compared
+with the route's budget file in main/budgets/<route>.json.
+"""
+import gc
+import json
+import random
+import statistics
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Optional
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import related, suggestions, trending, urls as main_urls
+from .models import BlogCategory, BlogPost, Comment, Like, Notification, Profile, Project, Tutorial
+
+BUDGET_DIR = Path(__file__).resolve().parent / 'budgets'
+
+# When budgets are regenerated, latency budgets get this much headroom so the
+# suite is stable on slower machines; query budgets stay exact.
+LATENCY_HEADROOM = 3.0
+MIN_LATENCY_BUDGET_MS = 20.0
+
+
+@dataclass
+class Route:
+    name: str
+    method: str = 'get'
+    # 'member' (the seeded reader), 'author' (owns seeded posts) or None for anonymous
+    login: Optional[str] = 'member'
+    args: Callable = lambda ctx: []
+    data: Callable = lambda ctx: {}
+    # Runs untimed before each request, e.g. to create the post a delete will remove
+    before: Optional[Callable] = None
+
+
+@dataclass
+class Result:
+    name: str
+    queries: int
+    timings_ms: list = field(default_factory=list)
+
+    def percentile(self, pct):
+        if len(self.timings_ms) == 1:
+            return self.timings_ms[0]
+        return statistics.quantiles(self.timings_ms, n=100, method='inclusive')[pct - 1]
+
+    @property
+    def p50(self):
+        return self.percentile(50)
+
+    @property
+    def p95(self):
+        return self.percentile(95)
+
+    @property
+    def p99(self):
+        return self.percentile(99)
+
+
+class Context:
+    """Objects the route specs refer to, created by seed()."""
+
+    def __init__(self, member, author, post, category):
+        self.member = member
+        self.author = author
+        self.post = post
+        self.category = category
+
+    def disposable_post(self):
+        return BlogPost.objects.create(
+            title='Disposable', slug=f'disposable-{random.getrandbits(48)}',
+            author=self.author, category=self.category, content='To be deleted',
+        )
+
+
+ROUTES = [
+    Route('home', login=None),
+    Route('blog_list', login=None),
+    Route('blog_detail', login=None, args=lambda ctx: [ctx.post.slug]),
+    Route('project_list', login=None),
+    Route('tutorial_list', login=None),
+    Route('search', login=None, data=lambda ctx: {'q': 'django'}),
+    Route('register', login=None),
+    Route('login', login=None),
+    Route('logout', method='post'),
+    Route('dashboard', login='author'),
+    Route('feed'),
+    Route('create_post'),
+    Route('edit_post', login='author', args=lambda ctx: [ctx.post.pk]),
+    Route('delete_post', method='post', login='author',
+          before=lambda ctx: setattr(ctx, 'victim', ctx.disposable_post()),
+          args=lambda ctx: [ctx.victim.pk]),
+    Route('toggle_featured', method='post', login='author', args=lambda ctx: [ctx.post.pk]),
+    Route('like_post', method='post', data=lambda ctx: {'post_id': ctx.post.pk}),
+    Route('add_comment', method='post', args=lambda ctx: [ctx.post.pk], data=lambda ctx: {'content': 'Benchmark'}),
+    Route('edit_profile'),
+    Route('profile', args=lambda ctx: [ctx.author.username]),
+    Route('follow_toggle', method='post', data=lambda ctx: {'user_id': ctx.author.pk}),
+    Route('notifications', login='author'),
+    Route('event_stream', login='author'),
+]
+
+
+def missing_routes():
+    """Names in main.urls that have no benchmark spec."""
+    named = {pattern.name for pattern in main_urls.urlpatterns if pattern.name}
+    return sorted(named - {route.name for route in ROUTES})
+
+
+def seed(users=60, posts_per_user=8, seed_value=42):
+    """Create a small but realistic data set and return a Context for the routes."""
+    rng = random.Random(seed_value)
+    words = ('django python sqlite cache query index search feed cloud deploy '
+             'template view model signal async worker queue test').split()
+
+    category = BlogCategory.objects.create(name='Benchmarks', icon='*')
+    BlogCategory.objects.bulk_create([BlogCategory(name=f'Topic {i}') for i in range(5)])
+    Project.objects.bulk_create([Project(title=f'Project {i}', description='...', featured=i < 3) for i in range(10)])
+    Tutorial.objects.bulk_create([Tutorial(title=f'Tutorial {i}', description='...', featured=i < 3) for i in range(10)])
+
+    # Hash once: create_user() would run the password hasher for every user
+    password = make_password('bench')
+    people = User.objects.bulk_create([User(username=f'bench{i}', password=password) for i in range(users)])
+    member, author = people[0], people[1]
+    profiles = Profile.objects.bulk_create([Profile(user=person) for person in people])
+    for profile in profiles:
+        profile.following.add(*rng.sample([other for other in profiles if other != profile], 10))
+
+    all_posts = []
+    for person in people:
+        for i in range(posts_per_user):
+            body = ' '.join(rng.choice(words) for _ in range(200))
+            all_posts.append(BlogPost.objects.create(
+                title=f'{person.username} on {rng.choice(words)} #{i}',
+                slug=f'{person.username}-{i}', author=person, category=category, content=body,
+            ))
+    for post in all_posts:
+        for liker in rng.sample(people, 5):
+            Like.objects.get_or_create(user=liker, post=post)
+        Comment.objects.create(post=post, author=rng.choice(people), content='Great write-up')
+    Notification.objects.bulk_create([
+        Notification(recipient=author, sender=rng.choice(people), notification_type='like', post=rng.choice(all_posts))
+        for _ in range(100)
+    ])
+
+    related.refresh(full=True)
+    trending.refresh(rebuild=True)
+    suggestions.rebuild()
+
+    post = BlogPost.objects.filter(author=author).first()
+    return Context(member, author, post, category)
+
+
+def run_route(route, ctx, iterations=20):
+    client = Client()
+    user = {'member': ctx.member, 'author': ctx.author}.get(route.login)
+    cache.clear()
+
+    result = Result(route.name, queries=0)
+    # The first request warms caches and is not measured
+    for iteration in range(iterations + 1):
+        if user is not None:
+            client.force_login(user)
+        if route.before:
+            route.before(ctx)
+        url = reverse(route.name, args=route.args(ctx))
+        request = getattr(client, route.method)
+        # Like timeit, keep garbage collection pauses out of the measurement
+        gc.collect()
+        gc.disable()
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = request(url, route.data(ctx))
+                elapsed_ms = (time.perf_counter() - started) * 1000
+        finally:
+            gc.enable()
+        if response.status_code >= 400:
+            raise AssertionError(f'{route.name} returned {response.status_code}')
+        if iteration:
+            result.timings_ms.append(elapsed_ms)
+            result.queries = max(result.queries, len(queries.captured_queries))
+    return result
+
+
+def capture_route(route, ctx):
+    """Request route once with empty caches and return the queries it ran."""
+    client = Client()
+    user = {'member': ctx.member, 'author': ctx.author}.get(route.login)
+    if user is not None:
+        client.force_login(user)
+    if route.before:
+        route.before(ctx)
+    cache.clear()
+    with CaptureQueriesContext(connection) as queries:
+        response = getattr(client, route.method)(reverse(route.name, args=route.args(ctx)), route.data(ctx))
+    if response.status_code >= 400:
+        raise AssertionError(f'{route.name} returned {response.status_code}')
+    return [query['sql'] for query in queries.captured_queries]
+
+
+def measure_revisits(route, ctx, iterations=50):
+    """
+    CPU milliseconds and queries per request for route, rendered in full and
+    revalidated with the ETag of the previous response.
+    """
+    client = Client()
+    user = {'member': ctx.member, 'author': ctx.author}.get(route.login)
+    if user is not None:
+        client.force_login(user)
+    url = reverse(route.name, args=route.args(ctx))
+    # Settle the CSRF cookie, which is part of the validator
+    client.get(url)
+    etag = client.get(url).headers.get('ETag')
+
+    results = {}
+    for label, headers in (('full', {}), ('revalidated', {'HTTP_IF_NONE_MATCH': etag})):
+        expected = 304 if headers else 200
+        cpu, queries = 0.0, 0
+        for _ in range(iterations):
+            gc.collect()
+            gc.disable()
+            try:
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.process_time()
+                    response = client.get(url, **headers)
+                    cpu += time.process_time() - started
+            finally:
+                gc.enable()
+            if response.status_code != expected:
+                raise AssertionError(f'{route.name} returned {response.status_code}, expected {expected}')
+            queries = max(queries, len(captured.captured_queries))
+        results[label] = (cpu * 1000 / iterations, queries)
+    return results
+
+
+def load_budget(name):
+    path = BUDGET_DIR / f'{name}.json'
+    if not path.exists():
+        return None
+    return json.loads(path.read_text())
+
+
+def write_budget(result):
+    BUDGET_DIR.mkdir(exist_ok=True)
+    budget = {
+        'route': result.name,
+        'max_queries': result.queries,
+        'p50_ms': round(max(result.p50 * LATENCY_HEADROOM, MIN_LATENCY_BUDGET_MS), 1),
+        'p95_ms': round(max(result.p95 * LATENCY_HEADROOM, MIN_LATENCY_BUDGET_MS), 1),
+        'p99_ms': round(max(result.p99 * LATENCY_HEADROOM, MIN_LATENCY_BUDGET_MS), 1),
+    }
+    (BUDGET_DIR / f'{result.name}.json').write_text(json.dumps(budget, indent=4) + '\n')
+    return budget
+
+
+def violations(result, budget, check_latency=True):
+    """Return a list of human-readable budget violations for result."""
+    if budget is None:
+        return [f'{result.name}: no budget file in {BUDGET_DIR}']
+    problems = []
+    if result.queries > budget['max_queries']:
+        problems.append(f"{result.name}: {result.queries} queries > budget {budget['max_queries']}")
+    if check_latency:
+        for pct in ('p50', 'p95', 'p99'):
+            measured = getattr(result, pct)
+            allowed = budget[f'{pct}_ms']
+            if measured > allowed:
+                problems.append(f'{result.name}: {pct} {measured:.1f} ms > budget {allowed} ms')
+    return problems
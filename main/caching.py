@@ -0,0 +1,178 @@
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+# Every cached value lives in a namespace. Bumping a namespace's version makes
+# all of its keys unreachable at once, so invalidation never has to find them.
+# Versions start from the clock rather than 1, so a version key the cache
+# evicted comes back higher than any version it handed out before and stale
+# values stored under those versions are never served again.
+NAMESPACES = (
+    'categories',
+    'featured_posts',
+    'projects',
+    'tutorials',
+    'post_cards',
+    # Bumped when main.related stores new neighbours; no values, only versions
+    'related_posts',
+    'trending',
+)
+
+DEFAULT_TIMEOUT = getattr(settings, 'CACHE_DEFAULT_TIMEOUT', 60 * 60)
+# Share of lookups counted by record(); stats() scales the counts back up
+STATS_SAMPLE_RATE = getattr(settings, 'CACHE_STATS_SAMPLE_RATE', 0.01)
+
+_MISSING = object()
+
+
+def get_cache():
+    return caches[getattr(settings, 'OBJECT_CACHE_ALIAS', 'default')]
+
+
+def _version_key(namespace):
+    return f'ns:{namespace}:version'
+
+
+def namespace_version(namespace):
+    cache = get_cache()
+    version = cache.get(_version_key(namespace))
+    if version is None:
+        # add() so two processes starting at the same time agree on the version
+        cache.add(_version_key(namespace), time.time_ns(), timeout=None)
+        version = cache.get(_version_key(namespace), 0)
+    return version
+
+
+def make_key(namespace, *parts):
+    """Return the versioned cache key for parts within namespace."""
+    suffix = ':'.join(str(part) for part in parts)
+    return f'{namespace}:v{namespace_version(namespace)}:{suffix}'
+
+
+def invalidate(*namespaces):
+    """Drop every key in the given namespaces by moving them to a new version."""
+    cache = get_cache()
+    for namespace in namespaces:
+        try:
+            cache.incr(_version_key(namespace))
+        except ValueError:
+            cache.set(_version_key(namespace), time.time_ns(), timeout=None)
+
+
+def record(namespace, hit):
+    """Count a hit or miss for namespace, for a STATS_SAMPLE_RATE share of calls."""
+    if random.random() >= STATS_SAMPLE_RATE:
+        return
+    cache = get_cache()
+    key = f'stats:{namespace}:{"hits" if hit else "misses"}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def get_or_set(namespace, parts, compute, timeout=DEFAULT_TIMEOUT):
+    """Return the cached value for parts, calling compute() to fill it on a miss."""
+    cache = get_cache()
+    key = make_key(namespace, *parts)
+    value = cache.get(key, _MISSING)
+    record(namespace, value is not _MISSING)
+    if value is _MISSING:
+        value = compute()
+        cache.set(key, value, timeout)
+    return value
+
+
+def stats():
+    """Return estimated {namespace: (hits, misses, hit_ratio)} for every namespace."""
+    cache = get_cache()
+    keys = [f'stats:{namespace}:{kind}' for namespace in NAMESPACES for kind in ('hits', 'misses')]
+    counts = cache.get_many(keys)
+    scale = 1 / STATS_SAMPLE_RATE if STATS_SAMPLE_RATE else 0
+    report = {}
+    for namespace in NAMESPACES:
+        hits = round(counts.get(f'stats:{namespace}:hits', 0) * scale)
+        misses = round(counts.get(f'stats:{namespace}:misses', 0) * scale)
+        total = hits + misses
+        report[namespace] = (hits, misses, hits / total if total else 0.0)
+    return report
+
+
+def reset_stats():
+    get_cache().delete_many(
+        [f'stats:{namespace}:{kind}' for namespace in NAMESPACES for kind in ('hits', 'misses')]
+    )
+
+
+# Cached querysets shared by the views
+
+def categories():
+    from .models import BlogCategory
+
+    return get_or_set('categories', ['all'], lambda: list(BlogCategory.objects.all()))
+
+
+def featured_posts(limit=3):
+    from .models import BlogPost
+    from .rendering import LIST_DEFERRED
+
+    return get_or_set('featured_posts', [limit], lambda: list(
+        BlogPost.objects.filter(featured=True).select_related('author', 'category')
+        .defer(*LIST_DEFERRED).order_by('-created_at')[:limit]
+    ))
+
+
+def trending_posts(limit=3):
+    from .trending import ranking
+
+    return get_or_set('trending', [limit], lambda: [score.post for score in ranking().order_by('-score')[:limit]])
+
+
+def projects(featured_only=False, limit=None):
+    from .models import Project
+
+    def compute():
+        queryset = Project.objects.all().order_by('-created_at')
+        if featured_only:
+            queryset = queryset.filter(featured=True)
+        return list(queryset[:limit] if limit else queryset)
+
+    return get_or_set('projects', [featured_only, limit], compute)
+
+
+def tutorials(featured_only=False, limit=None):
+    from .models import Tutorial
+
+    def compute():
+        queryset = Tutorial.objects.all().order_by('-created_at')
+        if featured_only:
+            queryset = queryset.filter(featured=True)
+        return list(queryset[:limit] if limit else queryset)
+
+    return get_or_set('tutorials', [featured_only, limit], compute)
+
+
+def featured_post_ids():
+    """Ids of the featured posts currently cached, without touching the database."""
+    cache = get_cache()
+    cached = cache.get(make_key('featured_posts', 3)) or []
+    return {post.pk for post in cached}
+
+
+def invalidate_for(instance):
+    """Invalidate exactly the namespaces whose cached values depend on instance."""
+    from .models import BlogCategory, BlogPost, Project, Tutorial
+
+    if isinstance(instance, BlogCategory):
+        # Post cards print the category name
+        invalidate('categories', 'post_cards')
+    elif isinstance(instance, BlogPost):
+        # Only featured posts are cached as objects; cards are keyed on updated_at
+        if instance.featured or instance.pk in featured_post_ids():
+            invalidate('featured_posts')
+    elif isinstance(instance, Project):
+        invalidate('projects')
+    elif isinstance(instance, Tutorial):
+        invalidate('tutorials')
@@ -0,0 +1,112 @@
+"""
+Conditional GET for the post, list and profile pages.
+
+A page decorated with @conditional_page(state) gets an ETag built from
+state(request, *args, **kwargs), a small dict read with one aggregate query
+(latest updated_at, row counts, counter sums), together with who is looking:
+the viewer's id, their CSRF cookie (the page embeds a token for it) and
+whether JSON was asked for. A GET whose If-None-Match matches is answered
+with 304 Not Modified before the view runs, so no page queries are made and
+no template is rendered.
+
+The unread badge is left out of the ETag: for signed-in viewers the event
+stream opened by every page starts with the current counters anyway.
+
+Last-Modified is sent for information only. Counter changes do not move
+updated_at, so If-Modified-Since on its own never produces a 304.
+
+Responses Vary on Cookie and Accept. They are marked no-cache so browsers
+revalidate on every visit, and private for signed-in viewers.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.db.models import CharField, Count, Func, Max, Sum
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from django.views.decorators.http import condition
+
+from . import caching
+from .pagination import wants_json
+
+# Changes every ETag at once, e.g. when a deployment changes the templates
+VERSION = getattr(settings, 'CONDITIONAL_PAGE_VERSION', '1')
+
+
+class Summary(Func):
+    """
+    Several aggregates joined into one text value, for a compact validator
+    column. Plain || compiles several times faster than Concat(), which adds
+    a COALESCE and a nested pair per part; NULL only comes from empty sets.
+    """
+    arg_joiner = " || ':' || "
+    template = '(%(expressions)s)'
+    output_field = CharField()
+
+
+def posts_summary(prefix=''):
+    """
+    Changes whenever one of the aggregated posts is added, removed, edited or
+    its counters move; prefix is the path to the posts, e.g. 'post__'.
+    """
+    return Summary(*(
+        Aggregate(f'{prefix}{field}')
+        for Aggregate, field in (
+            (Count, 'pk'), (Max, 'updated_at'), (Sum, 'pk'),
+            (Sum, 'likes_count'), (Sum, 'comments_count'), (Sum, 'shares_count'),
+        )
+    ))
+
+
+def etag_for(request, state, namespaces=()):
+    """The weak ETag for state as seen by the viewer of request."""
+    viewer = [
+        VERSION,
+        request.user.pk,
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+        wants_json(request),
+    ]
+    versions = [caching.namespace_version(namespace) for namespace in namespaces]
+    digest = hashlib.blake2b(repr((viewer, versions, sorted(state.items()))).encode(), digest_size=16).hexdigest()
+    return f'W/"{digest}"'
+
+
+def conditional_page(state, namespaces=()):
+    """
+    Answer repeat GETs of the decorated view with 304 when state has not changed.
+
+    state(request, *args, **kwargs) returns a dict describing what the page
+    shows, or None when the view should handle the request itself (e.g. to
+    raise 404). An 'updated' datetime in it is sent as Last-Modified.
+    namespaces are caching namespaces whose cached values the page shows.
+    """
+    def decorator(view):
+        def etag(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return None
+            # The page would show these messages once; never hide them behind a 304
+            if len(messages.get_messages(request)):
+                return None
+            current = state(request, *args, **kwargs)
+            request.page_state = current
+            return None if current is None else etag_for(request, current, namespaces)
+
+        conditional_view = condition(etag_func=etag)(view)
+
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            current = getattr(request, 'page_state', None)
+            if current is not None and response.status_code in (200, 304):
+                patch_vary_headers(response, ['Cookie', 'Accept'])
+                if request.user.is_authenticated:
+                    patch_cache_control(response, private=True, no_cache=True)
+                else:
+                    patch_cache_control(response, public=True, no_cache=True)
+                if current.get('updated') and not response.has_header('Last-Modified'):
+                    response.headers['Last-Modified'] = http_date(current['updated'].timestamp())
+            return response
+        return wrapped
+    return decorator
@@ -0,0 +1,113 @@
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+# BlogPost counter column maintained for each engagement model, keyed by model_name
+POST_COUNTERS = {
+    'like': 'likes_count',
+    'share': 'shares_count',
+    'comment': 'comments_count',
+}
+
+
+def bump(model, lookup, field, delta):
+    """Atomically add delta to a counter column without reading it first."""
+    if delta >= 0:
+        value = F(field) + delta
+    else:
+        # Never let a counter that has drifted go negative
+        value = Greatest(F(field) + delta, 0)
+    model.objects.filter(**lookup).update(**{field: value})
+
+
+def follow_changed(profile, action, reverse, pk_set):
+    """
+    Apply an m2m_changed event on Profile.following to the follow counters.
+
+    When reverse is False, profile is the follower and pk_set the profiles it
+    (un)follows; when True, profile is the one being followed.
+    """
+    if action == 'pre_clear':
+        related = profile.followers if reverse else profile.following
+        profile._cleared_follow_ids = set(related.values_list('pk', flat=True))
+        return
+    if action == 'post_clear':
+        pk_set = getattr(profile, '_cleared_follow_ids', set())
+        delta = -1
+    elif action == 'post_add':
+        delta = 1
+    elif action == 'post_remove':
+        delta = -1
+    else:
+        return
+    if not pk_set:
+        return
+
+    own_field, other_field = ('followers_count', 'following_count') if reverse else ('following_count', 'followers_count')
+    model = type(profile)
+    bump(model, {'pk': profile.pk}, own_field, delta * len(pk_set))
+    bump(model, {'pk__in': pk_set}, other_field, delta)
+
+
+def _count_of(queryset, field):
+    """Correlated subquery counting rows of queryset whose field matches the outer pk."""
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('*'))
+            .values('total')
+        ),
+        0,
+    )
+
+
+def _repair(queryset, expected):
+    """Rewrite every counter in expected that differs from its recomputed value."""
+    queryset = queryset.annotate(**{f'actual_{name}': value for name, value in expected.items()})
+    drifted = Q()
+    for name in expected:
+        drifted |= ~Q(**{name: F(f'actual_{name}')})
+    return queryset.filter(drifted).update(**{name: F(f'actual_{name}') for name in expected})
+
+
+def recount_posts():
+    """Repair likes/comments/shares counters on every BlogPost; returns rows fixed."""
+    from .models import BlogPost, Comment, Like, Share
+
+    return _repair(BlogPost.objects.all(), {
+        'likes_count': _count_of(Like.objects.all(), 'post'),
+        'comments_count': _count_of(Comment.objects.all(), 'post'),
+        'shares_count': _count_of(Share.objects.all(), 'post'),
+    })
+
+
+def recount_profiles():
+    """Repair follower, post and unread-notification counters on every Profile; returns rows fixed."""
+    from .models import BlogPost, Notification, Profile
+
+    follows = Profile.following.through.objects.all()
+    return _repair(Profile.objects.all(), {
+        'followers_count': _count_of(follows, 'to_profile'),
+        'following_count': _count_of(follows, 'from_profile'),
+        'posts_count': Coalesce(
+            Subquery(
+                BlogPost.objects.filter(author=OuterRef('user'))
+                .order_by()
+                .values('author')
+                .annotate(total=Count('*'))
+                .values('total')
+            ),
+            0,
+        ),
+        'unread_notifications_count': Coalesce(
+            Subquery(
+                Notification.objects.filter(recipient=OuterRef('user'), is_read=False)
+                .order_by()
+                .values('recipient')
+                .annotate(total=Count('*'))
+                .values('total')
+            ),
+            0,
+        ),
+    })
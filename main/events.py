@@ -0,0 +1,309 @@
+"""
+Per-user event hub behind the /events/ Server-Sent Events stream.
+
+Code that changes something a user should see live calls publish(); once
+the surrounding transaction commits, the event is handed to the configured
+backend (EVENTS_BACKEND) which delivers it to every stream that user has
+open. Backends keep a short history so a reconnecting client that sends
+Last-Event-ID receives what it missed; when that is not possible the stream
+starts with a snapshot of the current counters instead.
+
+LocalBackend only reaches streams in the same process. With several worker
+processes use DatabaseBackend: events are written to StreamEvent and every
+process polls that table once per EVENTS_POLL_INTERVAL for all of its
+subscribers together.
+"""
+import asyncio
+import itertools
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from . import jobs
+
+HEARTBEAT_INTERVAL = getattr(settings, 'EVENTS_HEARTBEAT_INTERVAL', 15)
+POLL_INTERVAL = getattr(settings, 'EVENTS_POLL_INTERVAL', 1.0)
+HISTORY_SIZE = getattr(settings, 'EVENTS_HISTORY_SIZE', 100)
+# How long DatabaseBackend keeps events around for resuming clients, in seconds
+RETENTION = getattr(settings, 'EVENTS_RETENTION', 60 * 60)
+
+# EventSource reconnect delay: short when the stream stays open (ASGI), long
+# when each request only delivers what is pending and closes (WSGI)
+RETRY_MS = 3000
+RETRY_MS_SHORT_LIVED = 30000
+
+
+@dataclass
+class Event:
+    id: int
+    user_id: int
+    type: str
+    data: dict = field(default_factory=dict)
+
+    def encode(self):
+        return f'id: {self.id}\nevent: {self.type}\ndata: {json.dumps(self.data)}\n\n'
+
+
+@dataclass(eq=False)
+class Subscription:
+    user_id: int
+    loop: asyncio.AbstractEventLoop
+    queue: asyncio.Queue
+
+
+class LocalBackend:
+    """Delivers events to the streams open in this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Start from the wall clock so ids keep growing across restarts
+        self._first_id = time.time_ns() // 1000
+        self._ids = itertools.count(self._first_id)
+        self._history = defaultdict(lambda: deque(maxlen=HISTORY_SIZE))
+        self._subscribers = defaultdict(set)
+
+    def publish(self, user_id, event_type, data):
+        with self._lock:
+            event = Event(next(self._ids), user_id, event_type, data)
+            self._history[user_id].append(event)
+        self.deliver(event)
+        return event
+
+    def deliver(self, event):
+        """Hand event to this process' subscribers; safe to call from any thread."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(event.user_id, ()))
+        for subscription in subscribers:
+            subscription.loop.call_soon_threadsafe(subscription.queue.put_nowait, event)
+
+    def subscribe(self, user_id):
+        subscription = Subscription(user_id, asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            self._subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def since(self, user_id, last_event_id):
+        """Events after last_event_id, or None if some of them are no longer known."""
+        with self._lock:
+            history = list(self._history.get(user_id, ()))
+        if last_event_id < self._first_id:
+            return None
+        if len(history) == HISTORY_SIZE and history[0].id > last_event_id + 1:
+            return None
+        return [event for event in history if event.id > last_event_id]
+
+
+class DatabaseBackend(LocalBackend):
+    """Shares events between processes through the StreamEvent table."""
+
+    def __init__(self):
+        super().__init__()
+        # Id of the last StreamEvent delivered in this process. Each loop has
+        # its own poller, and they all deliver to every subscriber, so the
+        # cursor is only read and moved under _cursor_lock
+        self._cursor = None
+        self._cursor_lock = threading.Lock()
+        # {event loop: (subscriptions on it, its poller task)}; under WSGI every
+        # request runs its own loop, so entries go when their last subscriber does
+        self._pollers = {}
+        self._last_prune = 0.0
+
+    def publish(self, user_id, event_type, data):
+        from .models import StreamEvent
+
+        row = StreamEvent.objects.create(user_id=user_id, event_type=event_type, data=data)
+        # Other processes pick the row up on their next poll; this one delivers
+        # it from the same poll so every subscriber sees events in id order
+        return Event(row.pk, user_id, event_type, data)
+
+    def subscribe(self, user_id):
+        subscription = super().subscribe(user_id)
+        loop = subscription.loop
+        with self._lock:
+            count, poller = self._pollers.get(loop, (0, None))
+            if poller is None or poller.done():
+                poller = loop.create_task(self._poll())
+            self._pollers[loop] = (count + 1, poller)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        super().unsubscribe(subscription)
+        loop = subscription.loop
+        with self._lock:
+            count, poller = self._pollers.pop(loop, (0, None))
+            if count > 1:
+                self._pollers[loop] = (count - 1, poller)
+                return
+        if poller is not None and not loop.is_closed():
+            poller.cancel()
+
+    async def _poll(self):
+        from .models import StreamEvent
+
+        if self._cursor is None:
+            latest = await StreamEvent.objects.order_by('-pk').values_list('pk', flat=True).afirst()
+            with self._cursor_lock:
+                if self._cursor is None:
+                    self._cursor = latest or 0
+        while self._subscribers:
+            await asyncio.sleep(POLL_INTERVAL)
+            rows = StreamEvent.objects.filter(pk__gt=self._cursor).order_by('pk')[:500]
+            self._deliver_new([row async for row in rows])
+            if time.monotonic() - self._last_prune > 60:
+                self._last_prune = time.monotonic()
+                await sync_to_async(self.prune)()
+
+    def _deliver_new(self, rows):
+        """Deliver the rows (in id order) that no poller in this process has delivered yet."""
+        with self._cursor_lock:
+            for row in rows:
+                if row.pk > self._cursor:
+                    self._cursor = row.pk
+                    self.deliver(Event(row.pk, row.user_id, row.event_type, row.data))
+
+    def prune(self):
+        prune_stream_events()
+
+    def since(self, user_id, last_event_id):
+        from .models import StreamEvent
+
+        rows = list(StreamEvent.objects.filter(user_id=user_id, pk__gt=last_event_id).order_by('pk')[:HISTORY_SIZE + 1])
+        if len(rows) > HISTORY_SIZE:
+            return None
+        if last_event_id and not StreamEvent.objects.filter(pk__lte=last_event_id).exists():
+            # Everything up to last_event_id has been pruned: events may be missing
+            return None
+        return [Event(row.pk, row.user_id, row.event_type, row.data) for row in rows]
+
+
+@jobs.task
+def prune_stream_events():
+    """Delete StreamEvent rows older than RETENTION; they are too old to resume from."""
+    from datetime import timedelta
+
+    from django.utils import timezone
+
+    from .models import StreamEvent
+
+    StreamEvent.objects.filter(created_at__lt=timezone.now() - timedelta(seconds=RETENTION)).delete()
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = import_string(getattr(settings, 'EVENTS_BACKEND', 'main.events.LocalBackend'))()
+    return _backend
+
+
+def publish(user_id, event_type, data):
+    """Send an event to every open stream of user_id once the current transaction commits."""
+    transaction.on_commit(lambda: get_backend().publish(user_id, event_type, data))
+
+
+def publish_counters(user_id, deltas=None, values=None, **extra):
+    """Publish a 'counters' event: deltas to add and/or absolute values to set."""
+    data = dict(extra)
+    if deltas:
+        data['deltas'] = deltas
+    if values:
+        data['values'] = values
+    publish(user_id, 'counters', data)
+
+
+async def snapshot(user_id):
+    """A 'counters' event carrying the user's current values, sent when history cannot be replayed."""
+    from .models import Profile
+
+    counts = await Profile.objects.filter(user_id=user_id).values('unread_notifications_count', 'followers_count').afirst()
+    values = {
+        'unread_notifications': counts['unread_notifications_count'] if counts else 0,
+        'followers_count': counts['followers_count'] if counts else 0,
+    }
+    return f'event: counters\ndata: {json.dumps({"values": values})}\n\n'
+
+
+def parse_event_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+async def stream(user_id, last_event_id=None, keep_open=True):
+    """
+    Yield the Server-Sent Events wire format for user_id's events.
+
+    Missed events after last_event_id are replayed first. With keep_open the
+    stream then follows live events, sending a comment line as a heartbeat
+    whenever nothing happened for HEARTBEAT_INTERVAL seconds.
+    """
+    backend = get_backend()
+    # Subscribe before replaying so nothing published in between is lost
+    subscription = backend.subscribe(user_id)
+    try:
+        yield f'retry: {RETRY_MS if keep_open else RETRY_MS_SHORT_LIVED}\n\n'
+        last_event_id = parse_event_id(last_event_id)
+        replay = None
+        if last_event_id is not None:
+            replay = await sync_to_async(backend.since)(user_id, last_event_id)
+        if replay is None:
+            yield await snapshot(user_id)
+            replay = []
+        seen = last_event_id or 0
+        for event in replay:
+            seen = event.id
+            yield event.encode()
+        if not keep_open:
+            return
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                yield ': heartbeat\n\n'
+                continue
+            if event.id > seen:
+                seen = event.id
+                yield event.encode()
+    finally:
+        backend.unsubscribe(subscription)
+
+
+def follow_changed(profile, action, reverse, pk_set):
+    """Publish followers_count deltas for an m2m_changed event on Profile.following."""
+    if action == 'post_clear':
+        pk_set = getattr(profile, '_cleared_follow_ids', set())
+        delta = -1
+    elif action == 'post_add':
+        delta = 1
+    elif action == 'post_remove':
+        delta = -1
+    else:
+        return
+    if not pk_set:
+        return
+    if reverse:
+        publish_counters(profile.user_id, deltas={'followers_count': delta * len(pk_set)})
+        return
+    for user_id in type(profile).objects.filter(pk__in=pk_set).values_list('user_id', flat=True):
+        publish_counters(user_id, deltas={'followers_count': delta})
@@ -0,0 +1,173 @@
+from django.conf import settings
+
+from . import jobs, rendering
+from .pagination import NEXT, CursorPage, CursorPaginator
+
+# Authors with more followers than this are not fanned out on write; their posts
+# are merged into each follower's timeline when it is read instead
+FANOUT_THRESHOLD = getattr(settings, 'FEED_FANOUT_THRESHOLD', 1000)
+
+# How many of an author's most recent posts are copied into a timeline on follow
+BACKFILL_LIMIT = getattr(settings, 'FEED_BACKFILL_LIMIT', 50)
+
+BATCH_SIZE = 500
+
+
+def is_celebrity(profile):
+    return profile.followers_count > FANOUT_THRESHOLD
+
+
+def _entries_for(post_rows, owner_ids, author_id):
+    from .models import FeedEntry
+
+    return [
+        FeedEntry(owner_id=owner_id, post_id=post_id, author_id=author_id, created_at=created_at)
+        for owner_id in owner_ids
+        for post_id, created_at in post_rows
+    ]
+
+
+def fan_out_post(post):
+    """Copy a new post into the timeline of its author and of each follower."""
+    from .models import FeedEntry, Profile
+
+    author_profile = Profile.objects.filter(user_id=post.author_id).first()
+    owner_ids = [post.author_id]
+    if author_profile is not None and not is_celebrity(author_profile):
+        owner_ids += Profile.objects.filter(following=author_profile).values_list('user_id', flat=True)
+    FeedEntry.objects.bulk_create(
+        _entries_for([(post.pk, post.created_at)], owner_ids, post.author_id),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(owner_ids, author_profile):
+    """Copy the author's most recent posts into the timelines of owner_ids (new followers)."""
+    from .models import BlogPost, FeedEntry
+
+    if is_celebrity(author_profile) or not owner_ids:
+        return
+    recent = (
+        BlogPost.objects.filter(author_id=author_profile.user_id)
+        .order_by('-created_at')
+        .values_list('id', 'created_at')[:BACKFILL_LIMIT]
+    )
+    FeedEntry.objects.bulk_create(
+        _entries_for(list(recent), owner_ids, author_profile.user_id),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+@jobs.task
+def backfill_followers(profile_id):
+    """
+    Copy the recent posts of an author who dropped back to FANOUT_THRESHOLD
+    followers into all of their followers' timelines: while they were above it
+    their posts were only merged in on read, and timeline_page stops doing that.
+    """
+    from .models import Profile
+
+    profile = Profile.objects.filter(pk=profile_id).first()
+    if profile is None:
+        return
+    backfill(list(Profile.objects.filter(following=profile).values_list('user_id', flat=True)), profile)
+
+
+def follow_changed(profile, action, reverse, pk_set):
+    """
+    Apply an m2m_changed event on Profile.following to the stored timelines.
+
+    When reverse is False, profile is the follower and pk_set the profiles it
+    (un)follows; when True, profile is the one being followed. Runs after the
+    follow counters are updated, so an unfollow that brings an author back to
+    FANOUT_THRESHOLD followers sees the new count and queues
+    backfill_followers for them.
+    """
+    from .models import FeedEntry, Profile
+
+    if action == 'pre_clear':
+        if reverse:
+            FeedEntry.objects.filter(author_id=profile.user_id).exclude(owner_id=profile.user_id).delete()
+        else:
+            FeedEntry.objects.filter(owner_id=profile.user_id).exclude(author_id=profile.user_id).delete()
+            # Each of them loses this follower once the clear is done
+            profile._feed_crossing_ids = list(
+                profile.following.filter(followers_count=FANOUT_THRESHOLD + 1).values_list('pk', flat=True)
+            )
+        return
+    if action == 'post_clear':
+        # A reverse clear leaves the profile without followers to backfill
+        for crossed_id in getattr(profile, '_feed_crossing_ids', ()):
+            jobs.enqueue(backfill_followers, profile_id=crossed_id)
+        return
+    if action not in ('post_add', 'post_remove') or not pk_set:
+        return
+
+    others = Profile.objects.filter(pk__in=pk_set)
+    if action == 'post_add':
+        if reverse:
+            profile.refresh_from_db(fields=['followers_count'])
+            backfill(list(others.values_list('user_id', flat=True)), profile)
+        else:
+            for followed in others.only('user_id', 'followers_count'):
+                backfill([profile.user_id], followed)
+    elif reverse:
+        FeedEntry.objects.filter(
+            author_id=profile.user_id,
+            owner_id__in=others.values('user_id'),
+        ).delete()
+        profile.refresh_from_db(fields=['followers_count'])
+        if FANOUT_THRESHOLD - len(pk_set) < profile.followers_count <= FANOUT_THRESHOLD:
+            jobs.enqueue(backfill_followers, profile_id=profile.pk)
+    else:
+        FeedEntry.objects.filter(
+            owner_id=profile.user_id,
+            author_id__in=others.values('user_id'),
+        ).delete()
+        for crossed_id in others.filter(followers_count=FANOUT_THRESHOLD).values_list('pk', flat=True):
+            jobs.enqueue(backfill_followers, profile_id=crossed_id)
+
+
+def timeline_page(user, cursor=None, per_page=10):
+    """
+    Return a CursorPage of posts for the user's home timeline, newest first.
+
+    Fanned-out posts come from a single range scan of the user's FeedEntry rows.
+    Posts by followed celebrities are read from BlogPost and merged in.
+    """
+    from .models import BlogPost, FeedEntry, Profile
+
+    related = ('post__author', 'post__category')
+    entries = FeedEntry.objects.filter(owner=user).select_related(*related).defer(
+        *(f'post__{name}' for name in rendering.LIST_DEFERRED)
+    )
+    entry_page = CursorPaginator(entries, per_page, tiebreak='post_id').page(cursor)
+    posts = [entry.post for entry in entry_page]
+
+    celebrity_ids = list(
+        Profile.objects.filter(
+            followers__user=user,
+            followers_count__gt=FANOUT_THRESHOLD,
+        ).values_list('user_id', flat=True)
+    )
+    if not celebrity_ids:
+        return CursorPage(posts, entry_page.next_cursor, entry_page.previous_cursor)
+
+    post_paginator = CursorPaginator(
+        BlogPost.objects.filter(author_id__in=celebrity_ids).select_related('author', 'category')
+        .defer(*rendering.LIST_DEFERRED),
+        per_page,
+    )
+    celebrity_page = post_paginator.page(cursor)
+
+    merged = {post.pk: post for post in posts}
+    for post in celebrity_page:
+        merged.setdefault(post.pk, post)
+    ordered = sorted(merged.values(), key=lambda post: (post.created_at, post.pk), reverse=True)
+    rows = ordered[:per_page]
+
+    has_next = entry_page.has_next() or celebrity_page.has_next() or len(ordered) > per_page
+    next_cursor = post_paginator.encode_cursor(NEXT, rows[-1]) if rows and has_next else None
+    return CursorPage(rows, next_cursor)
@@ -1,5 +1,5 @@
 from django import forms
-from django.utils.text import slugify
+from . import rendering, slugs
 from .models import BlogPost, Comment, Profile
 
 class CommentForm(forms.ModelForm):
@@ -28,16 +28,18 @@ class PostForm(forms.ModelForm):
 
     def save(self, commit=True):
         instance = super().save(commit=False)
-        if not instance.slug:
-            slug = slugify(instance.title)
-            count = 0
-            while BlogPost.objects.filter(slug=slug).exists():
-                count += 1
-                slug = f"{slugify(instance.title)}-{count}"
-            instance.slug = slug
-        
-        if commit:
-            instance.save()
+        if instance.pk:
+            if commit:
+                # Only the edited columns: the engagement counters may have
+                # moved since the post was loaded
+                instance.save(update_fields=[*self._meta.fields, *rendering.RENDERED_FIELDS, 'updated_at'])
+        elif instance.slug:
+            if commit:
+                instance.save()
+        elif commit:
+            slugs.save_with_unique_slug(instance, instance.title)
+        else:
+            instance.slug = slugs.allocate(BlogPost, instance.title)
         return instance
 
 class ProfileUpdateForm(forms.ModelForm):
@@ -55,3 +57,10 @@ class ProfileUpdateForm(forms.ModelForm):
                 'accept': 'image/*'
             })
         }
+
+    def save(self, commit=True):
+        instance = super().save(commit=False)
+        if commit:
+            # Leave the follower, post and unread counters to their F() updates
+            instance.save(update_fields=self._meta.fields if instance.pk else None)
+        return instance
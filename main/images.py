@@ -0,0 +1,145 @@
+"""
+Resized, re-encoded variants of uploaded images.
+
+Every source image under IMAGE_SOURCE_DIRS gets a small set of variants
+(thumb, card, full), each at 1x and 2x pixel density, stored in
+MEDIA_ROOT/variants/<source name>/<variant>-<density>x.<ext>. Variants are
+produced by a background job when a file is uploaded, and on demand by the
+image_variant view the first time a missing one is requested.
+"""
+import mimetypes
+import re
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from . import jobs
+
+# name: (size in CSS pixels, crop to a square?)
+VARIANTS = {
+    'thumb': (40, True),
+    'card': (150, True),
+    'full': (1200, False),
+}
+DENSITIES = (1, 2)
+
+FORMAT = getattr(settings, 'IMAGE_VARIANT_FORMAT', 'WEBP')
+QUALITY = getattr(settings, 'IMAGE_VARIANT_QUALITY', 80)
+SOURCE_DIRS = getattr(settings, 'IMAGE_SOURCE_DIRS', ('avatars/', 'post_media/'))
+VARIANT_DIR = 'variants'
+
+EXTENSION = FORMAT.lower()
+
+_VARIANT_RE = re.compile(
+    rf'^{VARIANT_DIR}/(?P<source>.+)/(?P<variant>[a-z]+)-(?P<density>\d)x\.{EXTENSION}$'
+)
+
+def variant_name(source_name, variant, density=1):
+    """Storage name of one variant of source_name."""
+    return f'{VARIANT_DIR}/{source_name}/{variant}-{density}x.{EXTENSION}'
+
+
+def parse_variant_name(name):
+    """Return (source_name, variant, density) for a variant name, or None if it is not one."""
+    match = _VARIANT_RE.match(name)
+    if match is None:
+        return None
+    source, variant, density = match['source'], match['variant'], int(match['density'])
+    if variant not in VARIANTS or density not in DENSITIES or '..' in source.split('/'):
+        return None
+    if not source.startswith(tuple(SOURCE_DIRS)):
+        return None
+    return source, variant, density
+
+
+def content_type(name):
+    return mimetypes.guess_type(name)[0] or f'image/{EXTENSION}'
+
+
+def render(image, variant, density):
+    """Resize an opened source image for variant at density and return the new image."""
+    size, crop = VARIANTS[variant]
+    pixels = size * density
+    # Apply the EXIF orientation before the metadata is thrown away
+    image = ImageOps.exif_transpose(image)
+    if crop:
+        pixels = min(pixels, image.width, image.height)
+        image = ImageOps.fit(image, (pixels, pixels), Image.Resampling.LANCZOS)
+    else:
+        image = image.copy()
+        image.thumbnail((pixels, pixels), Image.Resampling.LANCZOS)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    return image
+
+
+def encode(image):
+    """Encode image without EXIF, XMP or ICC metadata."""
+    if FORMAT == 'JPEG' and image.mode == 'RGBA':
+        image = image.convert('RGB')
+    options = {'quality': QUALITY}
+    if FORMAT == 'WEBP':
+        options['method'] = 4
+    buffer = BytesIO()
+    image.save(buffer, FORMAT, **options)
+    return buffer.getvalue()
+
+
+def generate(source_name, variants=None, storage=default_storage):
+    """
+    Write the given [(variant, density)] of source_name (all of them by default)
+    and return the storage names written.
+    """
+    variants = variants or [(variant, density) for variant in VARIANTS for density in DENSITIES]
+    written = []
+    with storage.open(source_name, 'rb') as source, Image.open(source) as image:
+        image.load()
+        for variant, density in variants:
+            name = variant_name(source_name, variant, density)
+            data = encode(render(image, variant, density))
+            # Overwrite rather than let the storage pick a new name
+            storage.delete(name)
+            written.append(storage.save(name, ContentFile(data)))
+    return written
+
+
+def delete_variants(source_name, storage=default_storage):
+    """Remove every stored variant of source_name."""
+    directory = f'{VARIANT_DIR}/{source_name}'
+    if not storage.exists(directory):
+        return
+    for filename in storage.listdir(directory)[1]:
+        storage.delete(f'{directory}/{filename}')
+
+
+def has_variants(source_name, storage=default_storage):
+    return storage.exists(variant_name(source_name, 'card'))
+
+
+@jobs.task
+def generate_variants(source_name):
+    if default_storage.exists(source_name):
+        generate(source_name)
+
+
+def schedule(source_name):
+    """Generate the variants of source_name in a background job once the upload is committed."""
+    jobs.enqueue(generate_variants, source_name=source_name)
+
+
+def srcset(fieldfile, variant):
+    """Return {'src', 'srcset', 'width', 'height'} for displaying fieldfile as variant."""
+    size, crop = VARIANTS[variant]
+    attrs = {
+        'src': default_storage.url(variant_name(fieldfile.name, variant, 1)),
+        'srcset': ', '.join(
+            f'{default_storage.url(variant_name(fieldfile.name, variant, density))} {density}x'
+            for density in DENSITIES
+        ),
+    }
+    if crop:
+        attrs['width'] = attrs['height'] = size
+    return attrs
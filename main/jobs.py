@@ -0,0 +1,240 @@
+"""
+A small background job queue stored in the Job table.
+
+enqueue() inserts a row in the caller's transaction, so a job only becomes
+visible to workers once the work that produced it has committed, and a view
+can hand work off and return straight away. Workers (run_workers) claim due
+jobs in a single statement: SELECT ... FOR UPDATE SKIP LOCKED where the
+database supports it, otherwise one UPDATE ... WHERE id IN (SELECT ...),
+which SQLite runs under its write lock, so no job is ever claimed twice.
+
+A job that raises is retried with exponential backoff until max_attempts;
+a job whose worker died is put back in the queue after JOB_TIMEOUT seconds.
+Tasks that can run longer than that call heartbeat() as they go, which keeps
+their job's lock fresh and tells them when the job has been taken from them.
+A worker also locks each job of its batch again just before running it and
+skips those it no longer holds, so a job requeued while it waited its turn
+only runs on the worker that claimed it next.
+Tasks in JOB_SCHEDULE ({task name: seconds}) are enqueued again that long
+after their previous run finished.
+"""
+import logging
+import os
+import random
+import socket
+import threading
+import traceback
+from datetime import timedelta
+from importlib import import_module
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = getattr(settings, 'JOB_MAX_ATTEMPTS', 5)
+RETRY_BASE_DELAY = getattr(settings, 'JOB_RETRY_BASE_DELAY', 10)
+RETRY_MAX_DELAY = getattr(settings, 'JOB_RETRY_MAX_DELAY', 60 * 60)
+# A running job whose worker has not finished it after this many seconds is requeued
+TIMEOUT = getattr(settings, 'JOB_TIMEOUT', 15 * 60)
+# Finished jobs are deleted after this many seconds; failed ones are kept for inspection
+RETENTION = getattr(settings, 'JOB_RETENTION', 24 * 60 * 60)
+POLL_INTERVAL = getattr(settings, 'JOB_POLL_INTERVAL', 1.0)
+BATCH_SIZE = getattr(settings, 'JOB_BATCH_SIZE', 10)
+SCHEDULE = getattr(settings, 'JOB_SCHEDULE', {})
+
+TASKS = {}
+# The job each worker thread is running, for heartbeat()
+_current = threading.local()
+
+
+def task(func):
+    """Register func so workers can run it by its dotted name."""
+    TASKS[f'{func.__module__}.{func.__qualname__}'] = func
+    return func
+
+
+def resolve(name):
+    if name not in TASKS:
+        # Importing the module runs its @task decorators
+        import_module(name.rpartition('.')[0])
+    try:
+        return TASKS[name]
+    except KeyError:
+        raise LookupError(f'{name} is not a registered task') from None
+
+
+def task_name(func_or_name):
+    if isinstance(func_or_name, str):
+        return func_or_name
+    return f'{func_or_name.__module__}.{func_or_name.__qualname__}'
+
+
+def enqueue(func_or_name, *, run_at=None, delay=None, priority=0, max_attempts=MAX_ATTEMPTS, **kwargs):
+    """Queue a call of a registered task with JSON-serializable keyword arguments; returns the Job."""
+    from .models import Job
+
+    name = task_name(func_or_name)
+    resolve(name)
+    if run_at is None:
+        run_at = timezone.now() + timedelta(seconds=delay or 0)
+    return Job.objects.create(task=name, kwargs=kwargs, run_at=run_at, priority=priority, max_attempts=max_attempts)
+
+
+def default_worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'[:64]
+
+
+def claim(worker_id, limit=BATCH_SIZE):
+    """Mark up to limit due jobs as running for worker_id and return them."""
+    from .models import Job
+
+    now = timezone.now()
+    due = Job.objects.filter(status=Job.QUEUED, run_at__lte=now).order_by('-priority', 'run_at')
+    claimed = {'status': Job.RUNNING, 'locked_by': worker_id, 'locked_at': now, 'attempts': F('attempts') + 1}
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            pks = list(due.select_for_update(skip_locked=True).values_list('pk', flat=True)[:limit])
+            Job.objects.filter(pk__in=pks).update(**claimed)
+    else:
+        # One statement, so it is atomic under SQLite's write lock
+        Job.objects.filter(status=Job.QUEUED, pk__in=due.values('pk')[:limit]).update(**claimed)
+    jobs = Job.objects.filter(status=Job.RUNNING, locked_by=worker_id, locked_at=now)
+    return list(jobs.order_by('-priority', 'run_at'))
+
+
+def backoff(attempts):
+    """Seconds to wait before retrying a job that has failed attempts times."""
+    delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempts - 1))
+    # Jitter so jobs that failed together do not retry together
+    return delay * random.uniform(0.8, 1.2)
+
+
+def run(job):
+    """
+    Run one claimed job and record the outcome; returns True if it succeeded,
+    False if it raised and None if it was no longer this worker's to run.
+    """
+    from .models import Job
+
+    mine = Job.objects.filter(pk=job.pk, status=Job.RUNNING, locked_by=job.locked_by)
+    # Jobs claimed in one batch wait for the ones before them; one that waited
+    # past TIMEOUT may have been requeued by cleanup() and claimed elsewhere
+    if not mine.update(locked_at=timezone.now()):
+        logger.info('Job %s (%s) was taken over by another worker; skipped', job.pk, job.task)
+        return None
+    _current.job = job
+    try:
+        resolve(job.task)(**job.kwargs)
+    except Exception:
+        logger.exception('Job %s (%s) failed on attempt %s', job.pk, job.task, job.attempts)
+        now = timezone.now()
+        if job.attempts >= job.max_attempts:
+            outcome = {'status': Job.FAILED, 'finished_at': now}
+        else:
+            outcome = {'status': Job.QUEUED, 'run_at': now + timedelta(seconds=backoff(job.attempts))}
+        mine.update(last_error=traceback.format_exc()[-5000:], locked_by='', locked_at=None, **outcome)
+        return False
+    finally:
+        _current.job = None
+    mine.update(status=Job.DONE, finished_at=timezone.now(), locked_by='', locked_at=None)
+    return True
+
+
+def heartbeat():
+    """
+    Refresh the lock of the job running in this thread so cleanup() does not
+    requeue it; returns False if the job is no longer this worker's, in which
+    case the task should stop. Outside a job it does nothing and returns True.
+    """
+    from .models import Job
+
+    job = getattr(_current, 'job', None)
+    if job is None:
+        return True
+    mine = Job.objects.filter(pk=job.pk, status=Job.RUNNING, locked_by=job.locked_by)
+    return bool(mine.update(locked_at=timezone.now()))
+
+
+def work(worker_id=None, stop=None, burst=False, batch_size=BATCH_SIZE, poll_interval=POLL_INTERVAL):
+    """
+    Claim and run jobs until stop is set, or with burst until none are due.
+
+    Returns the number of jobs run.
+    """
+    worker_id = worker_id or default_worker_id()
+    stop = stop or threading.Event()
+    processed = 0
+    while not stop.is_set():
+        close_old_connections()
+        batch = claim(worker_id, batch_size)
+        if not batch:
+            if burst:
+                break
+            stop.wait(poll_interval)
+            continue
+        for job in batch:
+            if run(job) is not None:
+                processed += 1
+    close_old_connections()
+    return processed
+
+
+def schedule_periodic():
+    """Give every JOB_SCHEDULE task without a pending job its next one."""
+    from .models import Job
+
+    now = timezone.now()
+    for name, every in SCHEDULE.items():
+        with transaction.atomic():
+            runs = Job.objects.filter(task=name)
+            if runs.filter(status__in=[Job.QUEUED, Job.RUNNING]).exists():
+                continue
+            last = runs.exclude(finished_at=None).order_by('-finished_at').values_list('finished_at', flat=True).first()
+            enqueue(name, run_at=last + timedelta(seconds=every) if last else now)
+
+
+def checkpoint(name):
+    """The position last saved for name with save_checkpoint(), or None."""
+    from .models import Checkpoint
+
+    return Checkpoint.objects.filter(name=name).values_list('position', flat=True).first()
+
+
+def save_checkpoint(name, position):
+    from .models import Checkpoint
+
+    Checkpoint.objects.update_or_create(name=name, defaults={'position': position})
+
+
+def cleanup():
+    """Requeue jobs abandoned by dead workers and delete old finished ones."""
+    from .models import Job
+
+    now = timezone.now()
+    requeued = Job.objects.filter(status=Job.RUNNING, locked_at__lt=now - timedelta(seconds=TIMEOUT)).update(
+        status=Job.QUEUED, locked_by='', locked_at=None, run_at=now,
+    )
+    deleted, _ = Job.objects.filter(status=Job.DONE, finished_at__lt=now - timedelta(seconds=RETENTION)).delete()
+    return requeued, deleted
+
+
+def queue_depth():
+    """Per-task counts of queued, due, running and failed jobs, and when the oldest due job became due."""
+    from .models import Job
+
+    now = timezone.now()
+    return list(
+        Job.objects.exclude(status=Job.DONE)
+        .values('task')
+        .annotate(
+            queued=Count('pk', filter=Q(status=Job.QUEUED)),
+            due=Count('pk', filter=Q(status=Job.QUEUED, run_at__lte=now)),
+            running=Count('pk', filter=Q(status=Job.RUNNING)),
+            failed=Count('pk', filter=Q(status=Job.FAILED)),
+            oldest_due=Min('run_at', filter=Q(status=Job.QUEUED, run_at__lte=now)),
+        )
+        .order_by('task')
+    )
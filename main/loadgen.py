@@ -0,0 +1,372 @@
+"""
+Synthetic data for load testing.
+
+Everything is written in chunks, one transaction per chunk, so no model
+signals run and no query is issued per row: users, profiles and posts go
+through bulk_create(), the million-row relation tables through executemany(). Denormalized counters, the
+search index and the stored timelines are rebuilt in bulk afterwards.
+
+Popularity follows a power law: a few users attract most followers, and a few
+posts attract most likes, shares and comments. The same seed always produces
+the same data set.
+"""
+import itertools
+import os
+import random
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import connection, connections, transaction
+from django.utils import timezone
+
+from . import rendering
+
+# Zipf exponent used for every popularity distribution
+POWER_LAW_EXPONENT = 1.1
+
+# Timestamps are spread over this many days before now
+HISTORY_DAYS = 365
+
+# SQLite page cache used while loading, in KiB
+BULK_LOAD_CACHE_KB = 256 * 1024
+
+WORDS = (
+    'django python sqlite cache query index search feed cloud deploy template view model '
+    'signal async worker queue test design scale latency profile stream batch image '
+    'server client browser static media form admin session token router shard replica'
+).split()
+
+
+def power_law_weights(count, exponent=POWER_LAW_EXPONENT):
+    """Cumulative weights for random.choices() where rank r has weight 1 / r**exponent."""
+    return list(itertools.accumulate(1 / (rank ** exponent) for rank in range(1, count + 1)))
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Let bulk_create() keep the created_at/updated_at values set on the objects."""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+@contextmanager
+def bulk_load():
+    """Give SQLite a page cache big enough to hold the indexes being filled."""
+    if connection.vendor != 'sqlite':
+        yield
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA cache_size')
+        previous = cursor.fetchone()[0]
+        cursor.execute(f'PRAGMA cache_size = -{BULK_LOAD_CACHE_KB}')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA cache_size = {previous}')
+
+
+@contextmanager
+def scratch_database(prefix='scratch-'):
+    """
+    Point every database alias at a new, empty SQLite file for the duration of
+    the block and yield its path; the file is removed afterwards.
+    """
+    workdir = tempfile.mkdtemp(prefix=prefix)
+    path = os.path.join(workdir, 'db.sqlite3')
+    original = {alias: connections[alias].settings_dict['NAME'] for alias in connections}
+    for alias in connections:
+        connections[alias].close()
+        connections[alias].settings_dict['NAME'] = path
+    try:
+        yield path
+    finally:
+        for alias, name in original.items():
+            connections[alias].close()
+            connections[alias].settings_dict['NAME'] = name
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+class LoadGenerator:
+    """Builds a data set of the requested size; call run() to write it."""
+
+    def __init__(self, users=10_000, follows=200_000, posts=50_000, likes=1_000_000, shares=100_000,
+                 comments=200_000, notifications=200_000, subscribers=0, seed=0, prefix='load',
+                 batch_size=20000, stdout=None):
+        self.counts = {
+            'users': users, 'follows': follows, 'posts': posts, 'likes': likes,
+            'shares': shares, 'comments': comments, 'notifications': notifications,
+            'subscribers': subscribers,
+        }
+        self.rng = random.Random(seed)
+        self.prefix = prefix
+        self.batch_size = batch_size
+        self.stdout = stdout
+        self.now = timezone.now()
+        self.started = time.perf_counter()
+
+    def log(self, message):
+        if self.stdout is not None:
+            self.stdout.write(f'{message} ({time.perf_counter() - self.started:.1f}s)')
+
+    def timestamp(self, after=None):
+        """A random moment in the history window, later than after if given."""
+        start = after or self.now - timedelta(days=HISTORY_DAYS)
+        return start + (self.now - start) * self.rng.random()
+
+    def write(self, model, objects):
+        """bulk_create objects in chunks, one transaction per chunk; returns the rows written."""
+        written = 0
+        for chunk in chunked(objects, self.batch_size):
+            with transaction.atomic():
+                model.objects.bulk_create(chunk, batch_size=self.batch_size)
+            written += len(chunk)
+        return written
+
+    def stamp(self, after=None):
+        """timestamp() already converted to the database's datetime representation."""
+        return connection.ops.adapt_datetimefield_value(self.timestamp(after))
+
+    def insert(self, model, fields, rows):
+        """
+        INSERT plain value tuples for fields with executemany(); returns the rows written.
+
+        Used for the tables that get millions of rows, where building a model
+        instance per row would cost more than the insert itself. Rows are
+        sorted first so SQLite appends to its indexes instead of splitting
+        pages all over them.
+        """
+        rows = sorted(rows)
+        columns = ', '.join(connection.ops.quote_name(model._meta.get_field(name).column) for name in fields)
+        placeholders = ', '.join(['%s'] * len(fields))
+        sql = f'INSERT INTO {connection.ops.quote_name(model._meta.db_table)} ({columns}) VALUES ({placeholders})'
+        for start in range(0, len(rows), self.batch_size):
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.executemany(sql, rows[start:start + self.batch_size])
+        return len(rows)
+
+    def ranked(self, ids):
+        """Shuffle ids so popularity rank is independent of insertion order."""
+        ids = list(ids)
+        self.rng.shuffle(ids)
+        return ids
+
+    def unique_pairs(self, count, left, left_weights, right, right_weights, allow_equal=True):
+        """
+        Yield up to count distinct (left, right) id pairs drawn from the two
+        distributions; weights of None mean uniform.
+        """
+        count = min(count, len(left) * len(right) - (0 if allow_equal else min(len(left), len(right))))
+        seen = set()
+        while len(seen) < count:
+            needed = count - len(seen)
+            lefts = self.rng.choices(left, cum_weights=left_weights, k=needed)
+            rights = self.rng.choices(right, cum_weights=right_weights, k=needed)
+            for pair in zip(lefts, rights):
+                if pair in seen or (not allow_equal and pair[0] == pair[1]):
+                    continue
+                seen.add(pair)
+                yield pair
+
+    def run(self):
+        with bulk_load():
+            user_ids = self.create_users()
+            self.create_follows(user_ids)
+            posts = self.create_posts(user_ids)
+            self.create_engagement(user_ids, posts)
+            self.create_notifications(user_ids, posts)
+            self.create_subscribers()
+            self.rebuild_derived_data()
+        return self.counts
+
+    def create_users(self):
+        from django.contrib.auth.hashers import make_password
+        from django.contrib.auth.models import User
+        from .models import Profile
+
+        if User.objects.filter(username__startswith=f'{self.prefix}_').exists():
+            raise ValueError(f'Users prefixed "{self.prefix}_" already exist; pick another prefix')
+
+        # One hash for everyone: running the password hasher per user would dominate the run
+        password = make_password('loadtest')
+        total = self.counts['users']
+        self.write(User, (
+            User(username=f'{self.prefix}_{i}', email=f'{self.prefix}_{i}@example.com',
+                 password=password, date_joined=self.timestamp())
+            for i in range(total)
+        ))
+        user_ids = list(
+            User.objects.filter(username__startswith=f'{self.prefix}_').order_by('pk').values_list('pk', flat=True)
+        )
+        # The post_save signal that creates profiles does not run for bulk_create
+        self.write(Profile, (Profile(user_id=user_id) for user_id in user_ids))
+        self.log(f'{len(user_ids)} users and profiles')
+        return user_ids
+
+    def create_follows(self, user_ids):
+        from .models import Profile
+
+        profile_ids = dict(Profile.objects.filter(user_id__in=user_ids).values_list('user_id', 'pk'))
+        profiles = [profile_ids[user_id] for user_id in user_ids]
+        weights = power_law_weights(len(profiles))
+        # Followers are drawn uniformly, the followed by popularity
+        Follow = Profile.following.through
+        self.counts['follows'] = self.insert(Follow, ('from_profile', 'to_profile'), self.unique_pairs(
+            self.counts['follows'], profiles, None, self.ranked(profiles), weights, allow_equal=False,
+        ))
+        self.log(f'{self.counts["follows"]} follows')
+
+    def create_posts(self, user_ids):
+        """Create the posts and return [(id, author_id, created_at)], oldest first."""
+        from .models import BlogCategory, BlogPost
+
+        categories = list(BlogCategory.objects.values_list('pk', flat=True)) or [None]
+        authors = self.rng.choices(
+            self.ranked(user_ids), cum_weights=power_law_weights(len(user_ids), exponent=0.8), k=self.counts['posts'],
+        )
+        created = sorted(self.timestamp() for _ in authors)
+
+        def build():
+            for i, (author_id, created_at) in enumerate(zip(authors, created)):
+                topic = self.rng.choice(WORDS)
+                content = ' '.join(self.rng.choices(WORDS, k=self.rng.randint(50, 400)))
+                # bulk_create skips the pre_save receiver that renders the body
+                yield BlogPost(
+                    title=f'Notes on {topic} #{i}',
+                    slug=f'{self.prefix}-{i}',
+                    author_id=author_id,
+                    category_id=self.rng.choice(categories),
+                    content=content,
+                    created_at=created_at,
+                    updated_at=created_at,
+                    **rendering.render(content),
+                )
+
+        with explicit_timestamps(BlogPost):
+            self.write(BlogPost, build())
+        posts = list(
+            BlogPost.objects.filter(slug__startswith=f'{self.prefix}-')
+            .order_by('created_at', 'pk')
+            .values_list('pk', 'author_id', 'created_at')
+        )
+        self.log(f'{len(posts)} posts')
+        return posts
+
+    def create_engagement(self, user_ids, posts):
+        from .models import Comment, Like, Share
+
+        post_ids = self.ranked([post[0] for post in posts])
+        created = {post[0]: post[2] for post in posts}
+        post_weights = power_law_weights(len(post_ids))
+        # Some users are far more active than others
+        actors = self.ranked(user_ids)
+        actor_weights = power_law_weights(len(actors), exponent=0.8)
+
+        for model, name in ((Like, 'likes'), (Share, 'shares')):
+            pairs = self.unique_pairs(self.counts[name], actors, actor_weights, post_ids, post_weights)
+            self.counts[name] = self.insert(model, ('user', 'post', 'created_at'), (
+                (user_id, post_id, self.stamp(created[post_id])) for user_id, post_id in pairs
+            ))
+            self.log(f'{self.counts[name]} {name}')
+
+        total = self.counts['comments'] if post_ids else 0
+        commenters = self.rng.choices(actors, cum_weights=actor_weights, k=total)
+        commented = self.rng.choices(post_ids, cum_weights=post_weights, k=total)
+        self.counts['comments'] = self.insert(Comment, ('post', 'author', 'content', 'created_at'), (
+            (post_id, author_id, ' '.join(self.rng.choices(WORDS, k=self.rng.randint(3, 40))),
+             self.stamp(created[post_id]))
+            for author_id, post_id in zip(commenters, commented)
+        ))
+        self.log(f'{self.counts["comments"]} comments')
+
+    def create_notifications(self, user_ids, posts):
+        from .models import Notification
+
+        total = self.counts['notifications'] if posts else 0
+        types = [choice for choice, _ in Notification.NOTIFICATION_TYPES]
+        post_weights = power_law_weights(len(posts))
+        ranked_posts = self.ranked(posts)
+        columns = ('recipient', 'sender', 'notification_type', 'post', 'actor_count', 'is_read', 'created_at')
+        self.counts['notifications'] = self.insert(Notification, columns, (
+            (
+                author_id,
+                self.rng.choice(user_ids),
+                self.rng.choice(types),
+                post_id,
+                min(int(self.rng.paretovariate(1.5)), 500),
+                self.rng.random() < 0.7,
+                self.stamp(created_at),
+            )
+            for post_id, author_id, created_at in self.rng.choices(ranked_posts, cum_weights=post_weights, k=total)
+        ))
+        self.log(f'{self.counts["notifications"]} notifications')
+
+    def create_subscribers(self):
+        from .models import NewsletterSubscriber
+
+        self.counts['subscribers'] = self.insert(NewsletterSubscriber, ('email', 'subscribed_at'), (
+            (f'{self.prefix}_subscriber_{i:07d}@example.com', self.stamp())
+            for i in range(self.counts['subscribers'])
+        ))
+        self.log(f'{self.counts["subscribers"]} newsletter subscribers')
+
+    def rebuild_derived_data(self):
+        """Bring counters, the search index and timelines in line with the new rows."""
+        from . import counters, search
+
+        with transaction.atomic():
+            counters.recount_posts()
+            counters.recount_profiles()
+        self.log('counters recomputed')
+        search.rebuild_index()
+        self.log('search index rebuilt')
+        self.log(f'{fill_timelines()} timeline entries')
+
+
+def fill_timelines():
+    """Fan every post out to its author and followers in one INSERT ... SELECT; returns rows added."""
+    from .feed import FANOUT_THRESHOLD
+    from .models import BlogPost, FeedEntry, Profile
+
+    follows = Profile.following.through._meta.db_table
+    profiles = Profile._meta.db_table
+    posts = BlogPost._meta.db_table
+    entries = FeedEntry._meta.db_table
+    # Celebrity posts are merged in when a timeline is read, so they are not stored
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {entries} (owner_id, post_id, author_id, created_at) "
+            f"SELECT p.author_id, p.id, p.author_id, p.created_at FROM {posts} p "
+            f"WHERE NOT EXISTS (SELECT 1 FROM {entries} e WHERE e.owner_id = p.author_id AND e.post_id = p.id)"
+        )
+        added = cursor.rowcount
+        cursor.execute(
+            f"INSERT INTO {entries} (owner_id, post_id, author_id, created_at) "
+            f"SELECT follower.user_id, p.id, p.author_id, p.created_at FROM {posts} p "
+            f"JOIN {profiles} author ON author.user_id = p.author_id AND author.followers_count <= %s "
+            f"JOIN {follows} f ON f.to_profile_id = author.id "
+            f"JOIN {profiles} follower ON follower.id = f.from_profile_id "
+            f"WHERE NOT EXISTS (SELECT 1 FROM {entries} e WHERE e.owner_id = follower.user_id AND e.post_id = p.id)",
+            [FANOUT_THRESHOLD],
+        )
+        added += cursor.rowcount
+    return added
@@ -0,0 +1,90 @@
+"""
+Batched, off-request writes of LoginAttempt rows.
+
+record() only appends to an in-memory list; a daemon thread writes the
+collected rows with one bulk_create() every LOGIN_ATTEMPT_FLUSH_INTERVAL
+seconds, or sooner once LOGIN_ATTEMPT_BATCH_SIZE rows are waiting. Rows still
+queued when the process exits are written by an atexit hook. created_at is
+the time of the flush, so it can lag the attempt by up to the interval.
+"""
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = getattr(settings, 'LOGIN_ATTEMPT_FLUSH_INTERVAL', 2.0)
+BATCH_SIZE = getattr(settings, 'LOGIN_ATTEMPT_BATCH_SIZE', 500)
+
+
+class AttemptWriter:
+    """Collects login attempts and writes them in batches from a background thread."""
+
+    def __init__(self, interval=FLUSH_INTERVAL, batch_size=BATCH_SIZE, background=True):
+        self.interval = interval
+        self.batch_size = batch_size
+        # Without a background thread rows are only written by flush()
+        self.background = background
+        self.pending = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def record(self, ip_address, email, success, user=None, user_agent=''):
+        with self._lock:
+            self.pending.append({
+                'user_id': user.pk if user is not None else None,
+                'email': email[:254],
+                'ip_address': ip_address,
+                'success': success,
+                'user_agent': user_agent,
+            })
+            full = len(self.pending) >= self.batch_size
+            if self.background and self._thread is None:
+                # Started lazily so it runs in the worker process, not a pre-fork parent
+                self._thread = threading.Thread(target=self._run, name='login-attempts', daemon=True)
+                self._thread.start()
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        """Write every queued attempt now; returns the number of rows written."""
+        from .models import LoginAttempt
+
+        with self._lock:
+            pending, self.pending = self.pending, []
+        if not pending:
+            return 0
+        LoginAttempt.objects.bulk_create([LoginAttempt(**fields) for fields in pending], batch_size=self.batch_size)
+        return len(pending)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Could not write login attempts')
+            finally:
+                close_old_connections()
+
+
+writer = AttemptWriter()
+atexit.register(writer.flush)
+
+
+def record(request, email, success, user=None):
+    """Queue a LoginAttempt for request; never touches the database on the calling thread."""
+    from .throttle import client_ip
+
+    writer.record(
+        ip_address=client_ip(request),
+        email=email,
+        success=success,
+        user=user,
+        user_agent=request.headers.get('User-Agent', ''),
+    )
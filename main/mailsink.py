@@ -0,0 +1,101 @@
+"""
+A minimal local SMTP server for exercising the real SMTP email backend.
+
+It accepts every message (or refuses chosen recipients), keeps only counts
+and the last few messages, and can drop the connection after a given number
+of messages to simulate a mail server going away mid-send.
+"""
+import socketserver
+import threading
+from collections import deque
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        sink = self.server.sink
+        with sink.lock:
+            sink.connections += 1
+        self.reply('220 localhost ESMTP sink')
+        recipients = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command[:4].upper()
+            if verb == 'EHLO':
+                self.reply('250-localhost')
+                self.reply('250 8BITMIME')
+            elif verb == 'HELO':
+                self.reply('250 localhost')
+            elif verb == 'MAIL':
+                recipients = []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                address = command.partition(':')[2].strip().strip('<>')
+                if sink.refuse(address):
+                    self.reply('550 No such user')
+                else:
+                    recipients.append(address)
+                    self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                while (chunk := self.rfile.readline()) not in (b'.\r\n', b'.\n', b''):
+                    data.append(chunk)
+                if not sink.accept(recipients, b''.join(data)):
+                    return
+                self.reply('250 OK')
+            elif verb == 'RSET':
+                recipients = []
+                self.reply('250 OK')
+            elif verb == 'NOOP':
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SMTPSink:
+    """Run with `with SMTPSink() as sink:` and point EMAIL_HOST/EMAIL_PORT at sink.host/sink.port."""
+
+    def __init__(self, refuse=None, disconnect_after=None, keep=10):
+        # refuse(address) -> True to reject that recipient
+        self.refuse = refuse or (lambda address: False)
+        self.disconnect_after = disconnect_after
+        self.messages = 0
+        self.recipients = 0
+        self.connections = 0
+        self.last_messages = deque(maxlen=keep)
+        self.lock = threading.Lock()
+        self._server = _Server(('127.0.0.1', 0), _Handler)
+        self._server.sink = self
+        self.host, self.port = self._server.server_address
+
+    def accept(self, recipients, data):
+        """Record a message; returns False when the connection should be dropped instead."""
+        with self.lock:
+            if self.disconnect_after is not None and self.messages >= self.disconnect_after:
+                return False
+            self.messages += 1
+            self.recipients += len(recipients)
+            self.last_messages.append((recipients, data))
+        return True
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, name='smtp-sink', daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from main import retention
+
+
+class Command(BaseCommand):
+    help = 'Delete rows past their RETENTION_POLICIES age in short chunks, then release the freed space'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--policy', action='append', dest='policies', help='Apply only this policy (repeatable)')
+        parser.add_argument('--chunk-size', type=int, default=retention.CHUNK_SIZE, help='Rows deleted per transaction')
+        parser.add_argument('--pause', type=float, default=retention.PAUSE, help='Seconds to wait between chunks')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the rows that would be deleted')
+        parser.add_argument('--no-vacuum', action='store_true', help='Skip the incremental vacuum afterwards')
+        parser.add_argument(
+            '--enable-incremental-vacuum', action='store_true',
+            help='Switch the database to auto_vacuum = INCREMENTAL first (runs a full VACUUM once)',
+        )
+
+    def handle(self, *args, **options):
+        if options['enable_incremental_vacuum']:
+            retention.enable_incremental_vacuum()
+            self.stdout.write('Enabled incremental vacuum')
+
+        deleted = retention.apply_policies(
+            options['policies'], chunk_size=options['chunk_size'], pause=options['pause'], dry_run=options['dry_run'],
+        )
+        for name, count in deleted.items():
+            self.stdout.write(f'{name}: {count} rows {"expired" if options["dry_run"] else "deleted"}')
+
+        if not options['dry_run'] and not options['no_vacuum']:
+            released = retention.vacuum(pause=options['pause'])
+            if released is None:
+                self.stdout.write('Skipped vacuum: auto_vacuum is not INCREMENTAL (see --enable-incremental-vacuum)')
+            else:
+                self.stdout.write(f'Released {released} free pages')
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully applied {len(deleted)} retention policies'
+            )
+        )
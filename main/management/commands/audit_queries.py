@@ -0,0 +1,67 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.runner import DiscoverRunner
+from django.test.utils import setup_test_environment, teardown_test_environment
+from main import benchmarks, queryplans
+
+
+class Command(BaseCommand):
+    help = 'Run EXPLAIN QUERY PLAN on the SQL every route issues and suggest indexes for scans and sorts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--route', action='append', dest='routes', help='Only audit this route (repeatable)')
+        parser.add_argument('--sql', action='store_true', help='Print the full SQL of flagged queries')
+        parser.add_argument(
+            '--fail-on-fixable', action='store_true',
+            help='Exit with an error if a suggested index would remove a flag',
+        )
+
+    def handle(self, *args, **options):
+        missing = benchmarks.missing_routes()
+        if missing:
+            raise CommandError(f'Routes without a benchmark spec: {", ".join(missing)}')
+
+        routes = benchmarks.ROUTES
+        if options['routes']:
+            routes = [route for route in routes if route.name in options['routes']]
+
+        # Audited against a throwaway test database, like the route benchmarks
+        setup_test_environment(debug=False)
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        old_config = runner.setup_databases()
+        try:
+            ctx = benchmarks.seed()
+            captured = {route.name: benchmarks.capture_route(route, ctx) for route in routes}
+            findings = queryplans.audit(captured)
+        finally:
+            runner.teardown_databases(old_config)
+            teardown_test_environment()
+
+        for finding in findings:
+            sql = finding.sql if options['sql'] else re.sub(r'^SELECT .*? FROM ', 'SELECT ... FROM ', finding.sql)
+            self.stdout.write(self.style.WARNING(', '.join(sorted(finding.routes))) + f': {sql}')
+            for issue in finding.issues:
+                self.stdout.write(f'    {issue}')
+            if finding.recommendation:
+                outcome = 'fixes it' if finding.resolved else 'does not fix it'
+                self.stdout.write(f'    suggested {self.describe(*finding.recommendation)} {outcome}')
+
+        fixable = sorted({finding.recommendation for finding in findings if finding.resolved}, key=str)
+        if fixable:
+            self.stdout.write('\nSuggested indexes:')
+            for recommendation in fixable:
+                self.stdout.write(f'    {self.describe(*recommendation)}')
+            if options['fail_on_fixable']:
+                raise CommandError(f'{len(fixable)} suggested index(es) missing')
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully audited {sum(map(len, captured.values()))} queries from {len(captured)} routes, '
+            f'{len(findings)} flagged'
+        ))
+
+    @staticmethod
+    def describe(label, fields, condition):
+        index = f'models.Index(fields={list(fields)!r}'
+        if condition:
+            index += ', condition=Q(' + ', '.join(f'{name}={value}' for name, value in condition) + ')'
+        return f'{label}: {index})'
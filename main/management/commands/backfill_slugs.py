@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from main import slugs
+from main.models import BlogPost
+
+
+class Command(BaseCommand):
+    help = 'Give blog posts with an empty, over-long or malformed slug a unique one'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows per UPDATE batch')
+
+    def handle(self, *args, **options):
+        updated = slugs.backfill(BlogPost.objects.all(), batch_size=options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully updated {updated} slugs'
+            )
+        )
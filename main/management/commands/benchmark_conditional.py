@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.test.runner import DiscoverRunner
+from django.test.utils import setup_test_environment, teardown_test_environment
+from main import benchmarks
+
+# Pages served with ETags (main.conditional)
+ROUTES = ('home', 'blog_list', 'blog_detail', 'profile')
+
+
+class Command(BaseCommand):
+    help = 'Compare the CPU time of full renders with ETag revalidations (304) of the conditional pages'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50, help='Requests per route and mode')
+
+    def handle(self, *args, **options):
+        routes = [route for route in benchmarks.ROUTES if route.name in ROUTES]
+
+        setup_test_environment(debug=False)
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        old_config = runner.setup_databases()
+        try:
+            ctx = benchmarks.seed()
+            results = [(route.name, benchmarks.measure_revisits(route, ctx, options['iterations'])) for route in routes]
+        finally:
+            runner.teardown_databases(old_config)
+            teardown_test_environment()
+
+        self.stdout.write(f'{"route":<14} {"200 cpu ms":>10} {"queries":>7} {"304 cpu ms":>10} {"queries":>7} {"saved":>6}')
+        for name, result in results:
+            (full_ms, full_queries), (revalidated_ms, revalidated_queries) = result['full'], result['revalidated']
+            saved = 1 - revalidated_ms / full_ms if full_ms else 0
+            self.stdout.write(
+                f'{name:<14} {full_ms:>10.2f} {full_queries:>7} {revalidated_ms:>10.2f} {revalidated_queries:>7} {saved:>6.0%}'
+            )
+        self.stdout.write(self.style.SUCCESS(f'Successfully measured {len(results)} routes'))
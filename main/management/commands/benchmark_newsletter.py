@@ -0,0 +1,85 @@
+import multiprocessing
+import resource
+import smtplib
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import override_settings
+from main import newsletter
+from main.loadgen import LoadGenerator, bulk_load, scratch_database
+from main.mailsink import SMTPSink
+from main.models import NewsletterCampaign
+
+
+def seed_subscribers(count):
+    with bulk_load():
+        LoadGenerator(subscribers=count).create_subscribers()
+    connections.close_all()
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Command(BaseCommand):
+    help = 'Send a campaign to a large synthetic subscriber list through a local SMTP server and report throughput'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscribers', type=int, default=500_000)
+        parser.add_argument('--batch-size', type=int, default=newsletter.BATCH_SIZE)
+        parser.add_argument('--rate', type=float, default=None, help='Messages per second')
+        parser.add_argument('--crash-after', type=int, default=None,
+                            help='Drop the SMTP connection after this many messages, then resume the campaign')
+
+    def handle(self, *args, **options):
+        with scratch_database(prefix='benchmark-newsletter-'):
+            call_command('migrate', verbosity=0, interactive=False)
+            # Seeded in a child process so its memory does not count towards the peak below
+            connections.close_all()
+            seeder = multiprocessing.get_context('fork').Process(target=seed_subscribers, args=(options['subscribers'],))
+            seeder.start()
+            seeder.join()
+            if seeder.exitcode:
+                raise CommandError('Seeding subscribers failed')
+            campaign = NewsletterCampaign.objects.create(
+                subject='Benchmark issue',
+                body_text='Plain text body\n' * 20,
+                body_html='<p>HTML body</p>' * 20,
+            )
+            rss_before = peak_rss_mb()
+
+            started = time.perf_counter()
+            if options['crash_after'] is not None:
+                with SMTPSink(disconnect_after=options['crash_after']) as sink, self.smtp(sink):
+                    try:
+                        newsletter.dispatch(campaign.pk, batch_size=options['batch_size'], rate=options['rate'])
+                    except smtplib.SMTPException as exc:
+                        self.stdout.write(f'Crashed as planned after {sink.messages} messages: {exc!r}')
+                    else:
+                        raise CommandError('The campaign finished before the planned crash')
+                campaign.refresh_from_db()
+                self.stdout.write(f'Resuming after subscriber {campaign.last_subscriber_id}')
+            with SMTPSink() as sink, self.smtp(sink):
+                campaign = newsletter.dispatch(campaign.pk, batch_size=options['batch_size'], rate=options['rate'])
+            elapsed = time.perf_counter() - started
+
+        if campaign.sent_count != options['subscribers']:
+            raise CommandError(f'Checkpoint says {campaign.sent_count} sent, expected {options["subscribers"]}')
+        self.stdout.write(f'{campaign.sent_count} messages over {sink.connections} SMTP connections in {elapsed:.1f}s')
+        self.stdout.write(f'{campaign.sent_count / elapsed:.0f} messages/s')
+        self.stdout.write(f'peak RSS {peak_rss_mb():.0f} MiB (before sending {rss_before:.0f} MiB)')
+        self.stdout.write(self.style.SUCCESS(f'Successfully sent a {options["subscribers"]}-subscriber campaign'))
+
+    @staticmethod
+    def smtp(sink):
+        return override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST=sink.host,
+            EMAIL_PORT=sink.port,
+            EMAIL_USE_TLS=False,
+            EMAIL_HOST_USER='',
+            EMAIL_HOST_PASSWORD='',
+        )
@@ -0,0 +1,67 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from main import notify
+from main.models import BlogPost, Notification, Profile
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compare notification write throughput of inline creates and the buffered pipeline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=10000, help='Events written per scenario')
+        parser.add_argument('--recipients', type=int, default=200, help='Distinct post authors receiving events')
+
+    def handle(self, *args, **options):
+        events = options['events']
+        recipients = options['recipients']
+        try:
+            with transaction.atomic():
+                self.run(events, recipients)
+                # Leave the database exactly as it was
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, events, recipients):
+        senders = User.objects.bulk_create(
+            [User(username=f'bench-sender-{i}') for i in range(events)], batch_size=500
+        )
+        authors = User.objects.bulk_create(
+            [User(username=f'bench-author-{i}') for i in range(recipients)], batch_size=500
+        )
+        Profile.objects.bulk_create([Profile(user=user) for user in authors], batch_size=500)
+        posts = BlogPost.objects.bulk_create(
+            [BlogPost(title=f'bench {i}', slug=f'bench-{i}', author=user, content='')
+             for i, user in enumerate(authors)],
+            batch_size=500,
+        )
+        stream = [
+            (posts[i % recipients].author_id, senders[i].pk, posts[i % recipients].pk)
+            for i in range(events)
+        ]
+
+        started = time.perf_counter()
+        for recipient_id, sender_id, post_id in stream:
+            Notification.objects.create(
+                recipient_id=recipient_id, sender_id=sender_id, notification_type='like', post_id=post_id
+            )
+        inline = time.perf_counter() - started
+        Notification.objects.filter(post__in=posts).delete()
+
+        started = time.perf_counter()
+        with notify.buffered():
+            for recipient_id, sender_id, post_id in stream:
+                notify.emit(recipient_id, sender_id, 'like', post_id=post_id)
+        buffered = time.perf_counter() - started
+        rows = Notification.objects.filter(post__in=posts).count()
+
+        self.stdout.write(f'Inline Notification.objects.create: {events / inline:,.0f} events/s ({events} rows)')
+        self.stdout.write(f'Buffered, coalesced pipeline:       {events / buffered:,.0f} events/s ({rows} rows)')
+        self.stdout.write(self.style.SUCCESS(f'Speed-up: {inline / buffered:.1f}x'))
@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test.runner import DiscoverRunner
+from django.test.utils import setup_test_environment, teardown_test_environment
+from main import benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Measure query counts and latency of every route in main.urls against its budget'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=30, help='Measured requests per route')
+        parser.add_argument('--route', action='append', dest='routes', help='Only run this route (repeatable)')
+        parser.add_argument('--update-budgets', action='store_true', help='Write the measured values as the new budgets')
+        parser.add_argument('--no-latency', action='store_true', help='Only enforce query budgets')
+
+    def handle(self, *args, **options):
+        missing = benchmarks.missing_routes()
+        if missing:
+            raise CommandError(f'Routes without a benchmark spec: {", ".join(missing)}')
+
+        routes = benchmarks.ROUTES
+        if options['routes']:
+            routes = [route for route in routes if route.name in options['routes']]
+
+        # Benchmarks run against a throwaway test database, never the real one
+        setup_test_environment(debug=False)
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        old_config = runner.setup_databases()
+        try:
+            results = self.run(routes, options['iterations'])
+        finally:
+            runner.teardown_databases(old_config)
+            teardown_test_environment()
+
+        problems = []
+        self.stdout.write(f'{"route":<18} {"queries":>7} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8}')
+        for result in results:
+            self.stdout.write(
+                f'{result.name:<18} {result.queries:>7} {result.p50:>8.1f} {result.p95:>8.1f} {result.p99:>8.1f}'
+            )
+            if options['update_budgets']:
+                benchmarks.write_budget(result)
+            else:
+                problems += benchmarks.violations(
+                    result, benchmarks.load_budget(result.name), check_latency=not options['no_latency']
+                )
+
+        if options['update_budgets']:
+            self.stdout.write(self.style.SUCCESS(f'Wrote {len(results)} budgets to {benchmarks.BUDGET_DIR}'))
+            return
+        if problems:
+            for problem in problems:
+                self.stderr.write(self.style.ERROR(problem))
+            raise CommandError(f'{len(problems)} budget(s) exceeded')
+        self.stdout.write(self.style.SUCCESS('All routes within budget'))
+
+    def run(self, routes, iterations):
+        ctx = benchmarks.seed()
+        return [benchmarks.run_route(route, ctx, iterations) for route in routes]
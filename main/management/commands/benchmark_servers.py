@@ -0,0 +1,162 @@
+import http.client
+import os
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from main.loadgen import scratch_database
+from main.models import BlogPost
+
+PROFILES = {
+    'wsgi': ('deploy/gunicorn_wsgi.py', 'mysite.wsgi'),
+    'asgi': ('deploy/gunicorn_asgi.py', 'mysite.asgi'),
+}
+
+# The CSRF middleware accepts an unmasked secret in both the cookie and the header
+CSRF_TOKEN = 'benchmarkbenchmarkbenchmarkbench'
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = 'Compare concurrent throughput of the social endpoints under the WSGI and ASGI deployment profiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Requests sent to each server')
+        parser.add_argument('--concurrency', type=int, default=50, help='Requests in flight at once')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Server worker processes')
+        parser.add_argument('--wsgi-threads', type=int, default=1, help='Threads per WSGI worker')
+        parser.add_argument('--profile', choices=sorted(PROFILES), action='append', dest='profiles')
+
+    def handle(self, *args, **options):
+        if shutil.which('gunicorn') is None:
+            raise CommandError('gunicorn is not installed')
+
+        with scratch_database(prefix='benchmark-servers-') as database:
+            call_command('migrate', verbosity=0, interactive=False)
+            call_command(
+                'seed_load_data', users=500, follows=5000, posts=2000, likes=20000, shares=1000,
+                comments=5000, notifications=5000, stdout=StringIO(),
+            )
+            workload = self.workload(options['requests'])
+            results = []
+            for profile in options['profiles'] or ['wsgi', 'asgi']:
+                results.append((profile, self.run_profile(profile, database, workload, options)))
+
+        self.stdout.write(f'{"profile":<8} {"req/s":>8} {"p50 ms":>8} {"p99 ms":>8} {"errors":>7}')
+        for profile, (throughput, latencies, errors) in results:
+            p50 = statistics.median(latencies) if latencies else 0
+            p99 = statistics.quantiles(latencies, n=100)[98] if len(latencies) > 1 else p50
+            self.stdout.write(f'{profile:<8} {throughput:>8.1f} {p50:>8.1f} {p99:>8.1f} {errors:>7}')
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully benchmarked {len(results)} server profiles with {options["workers"]} workers each'
+            )
+        )
+
+    def workload(self, total):
+        """A fixed, seeded mix of like, follow and comment requests from logged-in users."""
+        rng = random.Random(0)
+        users = list(User.objects.filter(username__startswith='load_').order_by('pk')[:100])
+        sessions = {}
+        for user in users:
+            session = SessionStore()
+            session[SESSION_KEY] = str(user.pk)
+            session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+            session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+            session.create()
+            sessions[user.pk] = session.session_key
+        post_ids = list(BlogPost.objects.values_list('pk', flat=True))
+
+        requests = []
+        for _ in range(total):
+            user = rng.choice(users)
+            kind = rng.random()
+            if kind < 0.6:
+                path, data = reverse('like_post'), {'post_id': rng.choice(post_ids)}
+            elif kind < 0.8:
+                followed = rng.choice([other for other in users if other != user])
+                path, data = reverse('follow_toggle'), {'user_id': followed.pk}
+            else:
+                path, data = reverse('add_comment', args=[rng.choice(post_ids)]), {'content': 'Benchmark comment'}
+            requests.append((path, urlencode(data), sessions[user.pk]))
+        return requests
+
+    def run_profile(self, profile, database, workload, options):
+        config, app = PROFILES[profile]
+        port = free_port()
+        env = dict(
+            os.environ,
+            DJANGO_DB_NAME=database,
+            BIND=f'127.0.0.1:{port}',
+            WEB_CONCURRENCY=str(options['workers']),
+            WEB_THREADS=str(options['wsgi_threads']),
+        )
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', config, app],
+            cwd=settings.BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        )
+        try:
+            self.wait_for(port, server)
+            send = lambda request: self.send(port, *request)
+            # Warm every worker up before measuring
+            with ThreadPoolExecutor(options['concurrency']) as pool:
+                list(pool.map(send, workload[:options['workers'] * 10]))
+                started = time.perf_counter()
+                outcomes = list(pool.map(send, workload))
+                elapsed = time.perf_counter() - started
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+        latencies = [latency for status, latency in outcomes if status == 200]
+        errors = len(outcomes) - len(latencies)
+        return len(latencies) / elapsed, latencies, errors
+
+    def wait_for(self, port, server, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f'Server exited: {server.stderr.read().decode()[-2000:]}')
+            try:
+                with socket.create_connection(('127.0.0.1', port), timeout=1):
+                    return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError(f'Server did not start listening on port {port}')
+
+    def send(self, port, path, body, session_key):
+        started = time.perf_counter()
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        try:
+            conn.request('POST', path, body=body, headers={
+                'Content-Type': 'application/x-www-form-urlencoded',
+                'Cookie': f'{settings.SESSION_COOKIE_NAME}={session_key}; {settings.CSRF_COOKIE_NAME}={CSRF_TOKEN}',
+                'X-CSRFToken': CSRF_TOKEN,
+            })
+            response = conn.getresponse()
+            response.read()
+            status = response.status
+        except OSError:
+            status = 0
+        finally:
+            conn.close()
+        return status, (time.perf_counter() - started) * 1000
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from main import suggestions
+
+
+class Command(BaseCommand):
+    help = 'Recompute every profile\'s friends-of-friends follow suggestions from the whole follow graph'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=suggestions.LIMIT, help='Suggestions kept per profile')
+        parser.add_argument('--batch-size', type=int, default=suggestions.BATCH_SIZE, help='Profiles stored per transaction')
+
+    def handle(self, *args, **options):
+        profiles, stored = suggestions.rebuild(limit=options['limit'], batch_size=options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully stored {stored} follow suggestions for {profiles} profiles'
+            )
+        )
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from main import related
+
+
+class Command(BaseCommand):
+    help = 'Compute each post\'s most similar posts from likes, shares and comments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Rebuild every post, not only those affected since the last run')
+        parser.add_argument('--limit', type=int, default=related.LIMIT, help='Neighbours kept per post')
+
+    def handle(self, *args, **options):
+        posts, written = related.refresh(full=options['full'], limit=options['limit'])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully stored {written} related posts for {posts} posts'
+            )
+        )
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from main import caching
+
+class Command(BaseCommand):
+    help = 'Show the cache hit ratio for each cache namespace'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset the counters after reporting')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{"namespace":<16} {"hits":>10} {"misses":>10} {"hit ratio":>10}')
+        for namespace, (hits, misses, ratio) in caching.stats().items():
+            self.stdout.write(f'{namespace:<16} {hits:>10} {misses:>10} {ratio:>10.1%}')
+
+        if options['reset']:
+            caching.reset_stats()
+            self.stdout.write(self.style.SUCCESS('Cache statistics reset'))
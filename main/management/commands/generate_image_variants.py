@@ -0,0 +1,32 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from main import images
+
+
+class Command(BaseCommand):
+    help = 'Create the resized variants of uploaded images that do not have them yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Regenerate variants that already exist')
+
+    def handle(self, *args, **options):
+        generated = 0
+        for directory in images.SOURCE_DIRS:
+            if not default_storage.exists(directory):
+                continue
+            for filename in default_storage.listdir(directory)[1]:
+                source_name = f'{directory.rstrip("/")}/{filename}'
+                if not options['force'] and images.has_variants(source_name):
+                    continue
+                try:
+                    images.generate(source_name)
+                except OSError as exc:
+                    self.stderr.write(f'Skipping {source_name}: {exc}')
+                    continue
+                generated += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully generated variants for {generated} images'
+            )
+        )
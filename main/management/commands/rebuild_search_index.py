@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from main import search
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for blog posts'
+
+    def handle(self, *args, **kwargs):
+        if not search.is_available():
+            self.stdout.write(
+                self.style.WARNING(
+                    'Full-text search needs SQLite with FTS5; falling back to LIKE queries'
+                )
+            )
+            return
+
+        indexed_count = search.rebuild_index()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully indexed {indexed_count} posts'
+            )
+        )
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from main import counters
+
+class Command(BaseCommand):
+    help = 'Recompute denormalized post and profile counters that have drifted'
+
+    def handle(self, *args, **kwargs):
+        with transaction.atomic():
+            posts_fixed = counters.recount_posts()
+            profiles_fixed = counters.recount_profiles()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully repaired counters on {posts_fixed} posts and {profiles_fixed} profiles'
+            )
+        )
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from main import rendering
+from main.models import BlogPost
+
+
+class Command(BaseCommand):
+    help = 'Render the stored HTML, excerpt and word count of existing blog posts again'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Posts read and updated per batch')
+        parser.add_argument('--missing', action='store_true', help='Only render posts that have no rendered HTML yet')
+
+    def handle(self, *args, **options):
+        posts = BlogPost.objects.all()
+        if options['missing']:
+            posts = posts.filter(content_html='')
+        changed = rendering.rerender(posts, batch_size=options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully re-rendered {changed} posts'
+            )
+        )
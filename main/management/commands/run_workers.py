@@ -0,0 +1,78 @@
+import multiprocessing
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from main import jobs
+
+# Seconds between requeueing abandoned jobs and scheduling periodic ones
+MAINTENANCE_INTERVAL = 30
+
+
+def work_in_process(stop, burst, batch_size):
+    # Workers stop through the shared event, not by being interrupted mid-job
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    jobs.work(stop=stop, burst=burst, batch_size=batch_size)
+
+
+class Command(BaseCommand):
+    help = 'Run background jobs from the Job table with a pool of worker threads or processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=2, help='Number of workers')
+        parser.add_argument('--pool', choices=['thread', 'process'], default='thread')
+        parser.add_argument('--batch-size', type=int, default=jobs.BATCH_SIZE, help='Jobs claimed at once per worker')
+        parser.add_argument('--burst', action='store_true', help='Exit once no job is due instead of waiting for more')
+
+    def handle(self, *args, **options):
+        concurrency, burst = options['concurrency'], options['burst']
+        self.maintain()
+
+        if concurrency == 1 and options['pool'] == 'thread':
+            stop = threading.Event()
+            self.on_signal(stop.set)
+            processed = jobs.work(stop=stop, burst=burst, batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Successfully ran {processed} jobs'))
+            return
+
+        if options['pool'] == 'process':
+            # Children must not share the parent's database connections
+            connections.close_all()
+            context = multiprocessing.get_context('fork')
+            stop = context.Event()
+            workers = [
+                context.Process(target=work_in_process, args=(stop, burst, options['batch_size']), daemon=True)
+                for _ in range(concurrency)
+            ]
+        else:
+            stop = threading.Event()
+            workers = [
+                threading.Thread(target=jobs.work, kwargs={
+                    'stop': stop, 'burst': burst, 'batch_size': options['batch_size'],
+                }, daemon=True)
+                for _ in range(concurrency)
+            ]
+        self.on_signal(stop.set)
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f'Started {concurrency} {options["pool"]} workers')
+
+        while any(worker.is_alive() for worker in workers):
+            for worker in workers:
+                worker.join(timeout=MAINTENANCE_INTERVAL / len(workers))
+            if not stop.is_set() and not burst:
+                self.maintain()
+        connections.close_all()
+        self.stdout.write(self.style.SUCCESS(f'Successfully stopped {concurrency} workers'))
+
+    def maintain(self):
+        requeued, _ = jobs.cleanup()
+        jobs.schedule_periodic()
+        if requeued:
+            self.stdout.write(f'Requeued {requeued} abandoned jobs')
+
+    @staticmethod
+    def on_signal(handler):
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: handler())
@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from main.loadgen import LoadGenerator
+
+
+class Command(BaseCommand):
+    help = 'Generate a large synthetic data set (users, follows, posts, engagement, notifications, subscribers) for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10_000)
+        parser.add_argument('--follows', type=int, default=200_000)
+        parser.add_argument('--posts', type=int, default=50_000)
+        parser.add_argument('--likes', type=int, default=1_000_000)
+        parser.add_argument('--shares', type=int, default=100_000)
+        parser.add_argument('--comments', type=int, default=200_000)
+        parser.add_argument('--notifications', type=int, default=200_000)
+        parser.add_argument('--subscribers', type=int, default=0, help='Newsletter subscribers')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed gives the same data')
+        parser.add_argument('--prefix', default='load', help='Prefix for generated usernames and slugs')
+        parser.add_argument('--batch-size', type=int, default=20000, help='Rows per transaction')
+
+    def handle(self, *args, **options):
+        generator = LoadGenerator(
+            users=options['users'],
+            follows=options['follows'],
+            posts=options['posts'],
+            likes=options['likes'],
+            shares=options['shares'],
+            comments=options['comments'],
+            notifications=options['notifications'],
+            subscribers=options['subscribers'],
+            seed=options['seed'],
+            prefix=options['prefix'],
+            batch_size=options['batch_size'],
+            stdout=self.stdout,
+        )
+        started = time.perf_counter()
+        try:
+            counts = generator.run()
+        except ValueError as exc:
+            raise CommandError(exc)
+
+        summary = ', '.join(f'{count} {name}' for name, count in counts.items())
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully generated {summary} in {time.perf_counter() - started:.1f}s'
+            )
+        )
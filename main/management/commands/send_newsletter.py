@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from main import newsletter
+from main.models import NewsletterCampaign
+
+
+class Command(BaseCommand):
+    help = 'Send a newsletter campaign to every subscriber, resuming from its checkpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('campaign_id', type=int)
+        parser.add_argument('--batch-size', type=int, default=newsletter.BATCH_SIZE, help='Messages per SMTP connection')
+        parser.add_argument('--rate', type=float, default=newsletter.RATE, help='Messages per second')
+        parser.add_argument('--background', action='store_true', help='Queue a job for run_workers instead')
+
+    def handle(self, *args, **options):
+        try:
+            campaign = NewsletterCampaign.objects.get(pk=options['campaign_id'])
+        except NewsletterCampaign.DoesNotExist:
+            raise CommandError(f'Campaign {options["campaign_id"]} does not exist')
+
+        if options['background']:
+            job = newsletter.schedule(campaign)
+            self.stdout.write(self.style.SUCCESS(f'Successfully queued job {job.pk} for "{campaign}"'))
+            return
+
+        def progress(campaign):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{campaign.sent_count} sent, up to subscriber {campaign.last_subscriber_id}')
+
+        campaign = newsletter.dispatch(
+            campaign.pk, batch_size=options['batch_size'], rate=options['rate'], progress=progress,
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully sent "{campaign}": {campaign.sent_count} sent, {campaign.failed_count} refused'
+            )
+        )
@@ -0,0 +1,107 @@
+import random
+import statistics
+import threading
+import time
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections, transaction
+from main.loadgen import scratch_database
+from main.models import BlogPost, Comment, Like
+
+
+class Command(BaseCommand):
+    help = 'Run concurrent reads, likes and comments against a scratch database and report throughput and lock errors'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16, help='Concurrent client threads')
+        parser.add_argument('--seconds', type=float, default=10.0, help='How long to run')
+        parser.add_argument('--write-ratio', type=float, default=0.3, help='Fraction of operations that write')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        with scratch_database(prefix='stress-database-'):
+            call_command('migrate', verbosity=0, interactive=False)
+            call_command(
+                'seed_load_data', users=500, follows=5000, posts=2000, likes=20000, shares=1000,
+                comments=5000, notifications=5000, stdout=StringIO(),
+            )
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                journal_mode = cursor.fetchone()[0]
+            user_ids = list(User.objects.filter(username__startswith='load_').values_list('pk', flat=True))
+            post_ids = list(BlogPost.objects.values_list('pk', flat=True))
+
+            results = {'read': [], 'write': []}
+            errors = []
+            lock = threading.Lock()
+            deadline = time.monotonic() + options['seconds']
+            threads = [
+                threading.Thread(target=self.client, args=(
+                    random.Random(options['seed'] + number), user_ids, post_ids, options['write_ratio'],
+                    deadline, results, errors, lock,
+                ))
+                for number in range(options['threads'])
+            ]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+
+        routers = ', '.join(settings.DATABASE_ROUTERS) or 'none'
+        self.stdout.write(f'journal_mode={journal_mode} routers={routers} threads={options["threads"]}')
+        self.stdout.write(f'{"kind":<8} {"ops":>8} {"ops/s":>8} {"p50 ms":>8} {"p99 ms":>8}')
+        for kind, latencies in results.items():
+            p50 = statistics.median(latencies) if latencies else 0
+            p99 = statistics.quantiles(latencies, n=100)[98] if len(latencies) > 1 else p50
+            self.stdout.write(f'{kind:<8} {len(latencies):>8} {len(latencies) / elapsed:>8.1f} {p50:>8.1f} {p99:>8.1f}')
+        if errors:
+            raise CommandError(f'{len(errors)} operations failed, e.g. {errors[0]}')
+        total = sum(len(latencies) for latencies in results.values())
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully ran {total} operations without database errors ({total / elapsed:.1f} ops/s)')
+        )
+
+    def client(self, rng, user_ids, post_ids, write_ratio, deadline, results, errors, lock):
+        """One simulated user session: a seeded mix of page reads and likes/comments."""
+        latencies = {'read': [], 'write': []}
+        failures = []
+        try:
+            while time.monotonic() < deadline:
+                kind = 'write' if rng.random() < write_ratio else 'read'
+                operation = self.write if kind == 'write' else self.read
+                started = time.perf_counter()
+                try:
+                    operation(rng, rng.choice(user_ids), rng.choice(post_ids))
+                except OperationalError as error:
+                    failures.append(str(error))
+                    continue
+                latencies[kind].append((time.perf_counter() - started) * 1000)
+        finally:
+            connections.close_all()
+        with lock:
+            for kind, values in latencies.items():
+                results[kind].extend(values)
+            errors.extend(failures)
+
+    def read(self, rng, user_id, post_id):
+        if rng.random() < 0.5:
+            post = BlogPost.objects.select_related('author__profile').get(pk=post_id)
+            list(post.comments.select_related('author').order_by('-created_at')[:20])
+        else:
+            list(BlogPost.objects.select_related('author').order_by('-created_at')[:20])
+
+    def write(self, rng, user_id, post_id):
+        post = BlogPost.objects.get(pk=post_id)
+        if rng.random() < 0.7:
+            with transaction.atomic():
+                like, created = Like.objects.get_or_create(user_id=user_id, post=post)
+                if not created:
+                    like.delete()
+        else:
+            Comment.objects.create(post=post, author_id=user_id, content='Stress test comment')
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from main import trending
+
+
+class Command(BaseCommand):
+    help = 'Add the likes, shares and comments created since the last run to the trending scores'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Drop every score and count the events of the last TRENDING_HORIZON seconds again',
+        )
+
+    def handle(self, *args, **options):
+        touched = trending.refresh(rebuild=options['rebuild'])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully updated the trending scores of {touched} posts'
+            )
+        )
@@ -0,0 +1,34 @@
+from django.db import migrations
+
+
+# The DDL is spelled out rather than taken from main.search, so later changes
+# to that module cannot change what this migration does
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS main_blogpost_fts "
+        "USING fts5(title, content, tokenize = 'unicode61 remove_diacritics 2', "
+        "prefix = '2 3')"
+    )
+    schema_editor.execute(
+        "INSERT INTO main_blogpost_fts(rowid, title, content) "
+        "SELECT id, title, content FROM main_blogpost"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS main_blogpost_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0002_remove_comment_approved_blogpost_likes_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,112 @@
+# Generated by Django 5.2.1 on 2026-10-17 03:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def _count_of(model, field, outer='pk'):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef(outer)})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('*'))
+            .values('total')
+        ),
+        0,
+    )
+
+
+def populate_counters(apps, schema_editor):
+    BlogPost = apps.get_model('main', 'BlogPost')
+    Profile = apps.get_model('main', 'Profile')
+    Like = apps.get_model('main', 'Like')
+    Share = apps.get_model('main', 'Share')
+    Comment = apps.get_model('main', 'Comment')
+    Follow = Profile.following.through
+
+    BlogPost.objects.update(
+        likes_count=_count_of(Like, 'post'),
+        comments_count=_count_of(Comment, 'post'),
+        shares_count=_count_of(Share, 'post'),
+    )
+    Profile.objects.update(
+        followers_count=_count_of(Follow, 'to_profile'),
+        following_count=_count_of(Follow, 'from_profile'),
+        posts_count=_count_of(BlogPost, 'author', outer='user'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0003_blogpost_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blogpost',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='blogpost',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='blogpost',
+            name='shares_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='LoginAttempt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.EmailField(max_length=254)),
+                ('ip_address', models.GenericIPAddressField()),
+                ('success', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user_agent', models.TextField(blank=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='TwoFactorAuth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=6)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField()),
+                ('used', models.BooleanField(default=False)),
+                ('ip_address', models.GenericIPAddressField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.1 on 2026-10-17 04:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+BACKFILL_LIMIT = 50
+
+
+def backfill_feeds(apps, schema_editor):
+    BlogPost = apps.get_model('main', 'BlogPost')
+    FeedEntry = apps.get_model('main', 'FeedEntry')
+    Profile = apps.get_model('main', 'Profile')
+    Follow = Profile.following.through
+
+    followers_by_author = {}
+    for follower_id, author_id in Follow.objects.values_list('from_profile__user_id', 'to_profile__user_id'):
+        followers_by_author.setdefault(author_id, []).append(follower_id)
+
+    for author_id in BlogPost.objects.values_list('author_id', flat=True).distinct():
+        recent = BlogPost.objects.filter(author_id=author_id).order_by('-created_at').values_list('id', 'created_at')[:BACKFILL_LIMIT]
+        owners = [author_id] + followers_by_author.get(author_id, [])
+        FeedEntry.objects.bulk_create(
+            [
+                FeedEntry(owner_id=owner_id, post_id=post_id, author_id=author_id, created_at=created_at)
+                for owner_id in owners
+                for post_id, created_at in recent
+            ],
+            batch_size=500,
+            ignore_conflicts=True,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_keyset_pagination_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to=settings.AUTH_USER_MODEL)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='main.blogpost')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['owner', 'created_at', 'post'], name='feedentry_timeline_idx'), models.Index(fields=['owner', 'author'], name='feedentry_owner_author_idx')],
+                'unique_together': {('owner', 'post')},
+            },
+        ),
+        migrations.RunPython(backfill_feeds, migrations.RunPython.noop),
+    ]
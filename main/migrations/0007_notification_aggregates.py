@@ -0,0 +1,43 @@
+# Generated by Django 5.2.1 on 2026-10-17 04:01
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_unread_counts(apps, schema_editor):
+    Notification = apps.get_model('main', 'Notification')
+    Profile = apps.get_model('main', 'Profile')
+    Profile.objects.update(
+        unread_notifications_count=Coalesce(
+            Subquery(
+                Notification.objects.filter(recipient=OuterRef('user'), is_read=False)
+                .order_by()
+                .values('recipient')
+                .annotate(total=Count('*'))
+                .values('total')
+            ),
+            0,
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_feed_entries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='actor_count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='unread_notifications_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_unread_counts, migrations.RunPython.noop),
+    ]
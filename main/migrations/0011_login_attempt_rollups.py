@@ -0,0 +1,27 @@
+# Generated by Django 5.2.1 on 2026-10-17 05:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_newsletter_campaigns'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoginAttemptRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('ip_address', models.GenericIPAddressField()),
+                ('successes', models.PositiveIntegerField(default=0)),
+                ('failures', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-day'],
+                'constraints': [models.UniqueConstraint(fields=('day', 'ip_address'), name='loginattemptrollup_day_ip_uniq')],
+            },
+        ),
+    ]
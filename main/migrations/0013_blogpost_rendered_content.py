@@ -0,0 +1,45 @@
+# Generated by Django 5.2.1 on 2026-10-17 05:40
+
+from django.db import migrations, models
+
+from main.rendering import RENDERED_FIELDS, render
+
+
+def render_existing_posts(apps, schema_editor):
+    BlogPost = apps.get_model('main', 'BlogPost')
+    # Keyset batches, as rendering.rerender() does, so only one batch of
+    # posts and their rendered bodies is held in memory at a time
+    rows = BlogPost.objects.order_by('pk').values_list('pk', 'content')
+    last_pk = 0
+    while True:
+        batch = list(rows.filter(pk__gt=last_pk)[:500])
+        if not batch:
+            break
+        BlogPost.objects.bulk_update([BlogPost(pk=pk, **render(content)) for pk, content in batch], RENDERED_FIELDS)
+        last_pk = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0012_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blogpost',
+            name='content_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='blogpost',
+            name='excerpt',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='blogpost',
+            name='word_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(render_existing_posts, migrations.RunPython.noop),
+    ]
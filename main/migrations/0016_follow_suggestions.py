@@ -0,0 +1,27 @@
+# Generated by Django 5.2.1 on 2026-10-17 06:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0015_trending_scores'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FollowSuggestion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mutuals', models.PositiveIntegerField()),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='follow_suggestions', to='main.profile')),
+                ('suggested', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='main.profile')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('profile', 'rank'), name='followsuggestion_profile_rank_uniq')],
+            },
+        ),
+    ]
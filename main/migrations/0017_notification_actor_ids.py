@@ -0,0 +1,26 @@
+# Generated by Django 5.2.1 on 2026-10-17 07:00
+
+from django.db import migrations, models
+from django.db.models.functions import JSONArray
+
+
+def populate_actor_ids(apps, schema_editor):
+    # Earlier senders of coalesced rows are unknown; their count stays as it is
+    Notification = apps.get_model('main', 'Notification')
+    Notification.objects.update(actor_ids=JSONArray('sender'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0016_follow_suggestions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='actor_ids',
+            field=models.JSONField(default=list),
+        ),
+        migrations.RunPython(populate_actor_ids, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.1 on 2026-10-17 07:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def copy_actor_ids(apps, schema_editor):
+    Notification = apps.get_model('main', 'Notification')
+    NotificationActor = apps.get_model('main', 'NotificationActor')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    last_pk = 0
+    while True:
+        batch = list(
+            Notification.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', 'actor_ids')[:500]
+        )
+        if not batch:
+            break
+        # Senders deleted since they were counted have no row to point at
+        existing = set(
+            User.objects.filter(pk__in={actor for _, actors in batch for actor in actors}).values_list('pk', flat=True)
+        )
+        NotificationActor.objects.bulk_create(
+            [
+                NotificationActor(notification_id=pk, actor_id=actor)
+                for pk, actors in batch for actor in actors if actor in existing
+            ],
+            ignore_conflicts=True,
+        )
+        last_pk = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0017_notification_actor_ids'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationActor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('actor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('notification', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='actors', to='main.notification')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('notification', 'actor'), name='notificationactor_uniq')],
+            },
+        ),
+        migrations.RunPython(copy_actor_ids, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='notification',
+            name='actor_ids',
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('is_read', False)), fields=['notification_type', 'recipient', 'created_at'], name='notification_coalesce_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.1 on 2026-10-17 07:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0018_notification_actors'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='followsuggestion',
+            constraint=models.UniqueConstraint(fields=('profile', 'suggested'), name='followsuggestion_profile_suggested_uniq'),
+        ),
+    ]
@@ -1,11 +1,14 @@
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
 from django.dispatch import receiver
 from django.urls import reverse
 from django.utils import timezone
-import random
-import string
+import secrets
+
+from django_cleanup.signals import cleanup_pre_delete
+
+from . import caching, counters, events, feed, images, notify, rendering, search, suggestions, trending
 
 # Create your models here.
 
@@ -22,11 +25,19 @@ class BlogPost(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     category = models.ForeignKey(BlogCategory, on_delete=models.SET_NULL, null=True)
     content = models.TextField()
+    # Rendered from content on save (see main.rendering)
+    content_html = models.TextField(blank=True, editable=False)
+    excerpt = models.TextField(blank=True, editable=False)
+    word_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     featured = models.BooleanField(default=False)
     likes = models.ManyToManyField(User, related_name='liked_posts', blank=True)
     shares = models.ManyToManyField(User, related_name='shared_posts', blank=True)
+    # Denormalized engagement counters, kept current by the signal receivers below
+    likes_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
+    shares_count = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return self.title
@@ -34,6 +45,19 @@ class BlogPost(models.Model):
     def get_absolute_url(self):
         return reverse('post_detail', kwargs={'pk': self.pk})
 
+    @property
+    def reading_minutes(self):
+        return rendering.reading_minutes(self.word_count)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of blog_list and profile posts
+            models.Index(fields=['created_at', 'id'], name='blogpost_created_id_idx'),
+            models.Index(fields=['author', 'created_at', 'id'], name='blogpost_author_created_idx'),
+            # Latest featured posts; SQLite only searches a boolean through a partial index
+            models.Index(fields=['created_at'], condition=models.Q(featured=True), name='blogpost_featured_idx'),
+        ]
+
 class Project(models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField()
@@ -44,6 +68,12 @@ class Project(models.Model):
     def __str__(self):
         return self.title
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='project_created_idx'),
+            models.Index(fields=['created_at'], condition=models.Q(featured=True), name='project_featured_idx'),
+        ]
+
 class Tutorial(models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField()
@@ -54,15 +84,41 @@ class Tutorial(models.Model):
     def __str__(self):
         return self.title
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='tutorial_created_idx'),
+            models.Index(fields=['created_at'], condition=models.Q(featured=True), name='tutorial_featured_idx'),
+        ]
+
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     bio = models.TextField(max_length=500, blank=True)
     avatar = models.ImageField(upload_to='avatars/', blank=True, null=True)
     following = models.ManyToManyField('self', symmetrical=False, related_name='followers', blank=True)
+    # Denormalized counters, kept current by the signal receivers below
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    posts_count = models.PositiveIntegerField(default=0)
+    unread_notifications_count = models.PositiveIntegerField(default=0)
     
     def __str__(self):
         return f'{self.user.username} Profile'
 
+class FeedEntry(models.Model):
+    """A post fanned out into the home timeline of one of its author's followers."""
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='feed_entries')
+    post = models.ForeignKey(BlogPost, on_delete=models.CASCADE, related_name='feed_entries')
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    # Copy of post.created_at so a timeline page is a single range scan of the index
+    created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('owner', 'post')
+        indexes = [
+            models.Index(fields=['owner', 'created_at', 'post'], name='feedentry_timeline_idx'),
+            models.Index(fields=['owner', 'author'], name='feedentry_owner_author_idx'),
+        ]
+
 class Like(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     post = models.ForeignKey(BlogPost, on_delete=models.CASCADE)
@@ -70,6 +126,10 @@ class Like(models.Model):
     
     class Meta:
         unique_together = ('user', 'post')
+        indexes = [
+            # New engagement since the last trending and related-posts runs
+            models.Index(fields=['created_at'], name='like_created_idx'),
+        ]
 
 class Share(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -78,6 +138,9 @@ class Share(models.Model):
     
     class Meta:
         unique_together = ('user', 'post')
+        indexes = [
+            models.Index(fields=['created_at'], name='share_created_idx'),
+        ]
 
 class Comment(models.Model):
     post = models.ForeignKey(BlogPost, on_delete=models.CASCADE, related_name='comments')
@@ -89,6 +152,15 @@ class Comment(models.Model):
     def __str__(self):
         return f'Comment by {self.author.username} on {self.post.title}'
 
+    class Meta:
+        indexes = [
+            # A user's latest comments on the dashboard
+            models.Index(fields=['author', 'created_at'], name='comment_author_created_idx'),
+            # A post's comments in order, on the post page and the profile prefetch
+            models.Index(fields=['post', 'created_at'], name='comment_post_created_idx'),
+            models.Index(fields=['created_at'], name='comment_created_idx'),
+        ]
+
 class Notification(models.Model):
     NOTIFICATION_TYPES = (
         ('like', 'Like'),
@@ -104,10 +176,159 @@ class Notification(models.Model):
     comment = models.ForeignKey(Comment, on_delete=models.CASCADE, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
+    # Number of distinct senders coalesced into this row (see NotificationActor); sender is the most recent one
+    actor_count = models.PositiveIntegerField(default=1)
     
     def __str__(self):
         return f'{self.sender.username} {self.notification_type} notification for {self.recipient.username}'
 
+    @property
+    def other_actors_count(self):
+        return self.actor_count - 1
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of a user's notifications
+            models.Index(fields=['recipient', 'created_at', 'id'], name='notification_recipient_idx'),
+            # Unread notifications: the dashboard, marking all read and coalescing new events
+            models.Index(fields=['recipient', 'created_at'], condition=models.Q(is_read=False), name='notification_unread_idx'),
+            # The unread row a new event of one type coalesces into
+            models.Index(
+                fields=['notification_type', 'recipient', 'created_at'], condition=models.Q(is_read=False),
+                name='notification_coalesce_idx',
+            ),
+        ]
+
+class NotificationActor(models.Model):
+    """A sender already counted in a coalesced Notification's actor_count."""
+    notification = models.ForeignKey(Notification, on_delete=models.CASCADE, related_name='actors')
+    actor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+
+    def __str__(self):
+        return f'{self.actor_id} in notification {self.notification_id}'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['notification', 'actor'], name='notificationactor_uniq'),
+        ]
+
+class StreamEvent(models.Model):
+    """An event waiting to be pushed to a user's open streams (see events.DatabaseBackend)."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='stream_events')
+    event_type = models.CharField(max_length=20)
+    data = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f'{self.event_type} event for {self.user_id}'
+
+    class Meta:
+        indexes = [
+            # Replaying a user's events after Last-Event-ID
+            models.Index(fields=['user', 'id'], name='streamevent_user_idx'),
+        ]
+
+class Job(models.Model):
+    """A unit of background work for main.jobs; claimed and run by run_workers."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    task = models.CharField(max_length=200)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    # Higher runs first among the jobs that are due
+    priority = models.SmallIntegerField(default=0)
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    last_error = models.TextField(blank=True)
+    locked_by = models.CharField(max_length=64, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.task} ({self.status})'
+
+    class Meta:
+        indexes = [
+            # Claiming the next due jobs
+            models.Index(fields=['status', '-priority', 'run_at'], name='job_claim_idx'),
+        ]
+
+class Checkpoint(models.Model):
+    """How far an incremental batch job has got, e.g. the start of its last complete run."""
+    name = models.CharField(max_length=100, unique=True)
+    position = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.name} at {self.position}'
+
+class RelatedPost(models.Model):
+    """One of a post's nearest neighbours by co-engagement, computed by main.related."""
+    post = models.ForeignKey(BlogPost, on_delete=models.CASCADE, related_name='related_posts')
+    related = models.ForeignKey(BlogPost, on_delete=models.CASCADE, related_name='+')
+    # Cosine similarity of the two posts' engagement vectors
+    score = models.FloatField()
+    # 0 is the most similar
+    rank = models.PositiveSmallIntegerField()
+
+    def __str__(self):
+        return f'{self.post_id} -> {self.related_id} ({self.score:.3f})'
+
+    class Meta:
+        constraints = [
+            # Also the index blog_detail reads a post's neighbours through, in order
+            models.UniqueConstraint(fields=['post', 'rank'], name='relatedpost_post_rank_uniq'),
+        ]
+
+class TrendingScore(models.Model):
+    """A post's time-decayed engagement score, kept current by main.trending."""
+    post = models.OneToOneField(BlogPost, on_delete=models.CASCADE, primary_key=True, related_name='trending')
+    # Copy of post.category so a category's ranking is one index range
+    category = models.ForeignKey(BlogCategory, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    # log of the decayed score scaled to trending.EPOCH; only comparisons between posts matter
+    score = models.FloatField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.post_id}: {self.score:.3f}'
+
+    class Meta:
+        indexes = [
+            # Both end in post_id, the ranking's tiebreak (a bigint key is not SQLite's rowid)
+            models.Index(fields=['score', 'post'], name='trendingscore_score_idx'),
+            models.Index(fields=['category', 'score', 'post'], name='trendingscore_category_idx'),
+        ]
+
+class FollowSuggestion(models.Model):
+    """A profile followed by people profile follows, but not by profile itself (see main.suggestions)."""
+    profile = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='follow_suggestions')
+    suggested = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='+')
+    # How many of the profiles profile follows follow suggested
+    mutuals = models.PositiveIntegerField()
+    # 0 is the strongest suggestion
+    rank = models.PositiveSmallIntegerField()
+
+    def __str__(self):
+        return f'{self.profile_id} -> {self.suggested_id} ({self.mutuals} mutual)'
+
+    class Meta:
+        constraints = [
+            # Also the index a profile's suggestions are read through, in order
+            models.UniqueConstraint(fields=['profile', 'rank'], name='followsuggestion_profile_rank_uniq'),
+            # Following someone drops them from the follower's suggestions through this one
+            models.UniqueConstraint(fields=['profile', 'suggested'], name='followsuggestion_profile_suggested_uniq'),
+        ]
+
 class ContactMessage(models.Model):
     name = models.CharField(max_length=100)
     email = models.EmailField()
@@ -125,6 +346,32 @@ class NewsletterSubscriber(models.Model):
     def __str__(self):
         return self.email
 
+class NewsletterCampaign(models.Model):
+    """One newsletter issue; main.newsletter.dispatch() sends it to every NewsletterSubscriber."""
+    DRAFT = 'draft'
+    SENDING = 'sending'
+    SENT = 'sent'
+    STATUS_CHOICES = (
+        (DRAFT, 'Draft'),
+        (SENDING, 'Sending'),
+        (SENT, 'Sent'),
+    )
+
+    subject = models.CharField(max_length=200)
+    body_text = models.TextField()
+    body_html = models.TextField(blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=DRAFT)
+    # Checkpoint: every subscriber up to this id has been handed to the mail server
+    last_subscriber_id = models.PositiveBigIntegerField(default=0)
+    sent_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.subject
+
 class TwoFactorAuth(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     code = models.CharField(max_length=6)
@@ -136,7 +383,7 @@ class TwoFactorAuth(models.Model):
     @staticmethod
     def generate_code():
         """Generate a 6-digit verification code"""
-        return ''.join(random.choices(string.digits, k=6))
+        return f'{secrets.randbelow(10 ** 6):06d}'
 
     def is_expired(self):
         """Check if the code has expired"""
@@ -163,6 +410,22 @@ class LoginAttempt(models.Model):
     class Meta:
         ordering = ['-created_at']
 
+class LoginAttemptRollup(models.Model):
+    """Daily per-IP totals of LoginAttempt rows removed by retention (see main.retention)."""
+    day = models.DateField()
+    ip_address = models.GenericIPAddressField()
+    successes = models.PositiveIntegerField(default=0)
+    failures = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.day} {self.ip_address}: {self.successes} succeeded, {self.failures} failed"
+
+    class Meta:
+        ordering = ['-day']
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'ip_address'], name='loginattemptrollup_day_ip_uniq'),
+        ]
+
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     """Create a Profile instance for all newly created User instances."""
@@ -170,9 +433,156 @@ def create_user_profile(sender, instance, created, **kwargs):
         Profile.objects.create(user=instance)
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    """Save the Profile instance whenever the User instance is saved."""
-    try:
-        instance.profile.save()
-    except Profile.DoesNotExist:
+def ensure_user_profile(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """Give an existing User saved without a Profile one; the Profile itself is not saved."""
+    # Partial saves, such as update_last_login at every login, skip the check
+    if created or raw or update_fields is not None:
+        return
+    if not Profile.objects.filter(user=instance).exists():
         Profile.objects.create(user=instance)
+
+@receiver(pre_save, sender=BlogPost)
+def render_blog_post(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Store the rendered body, excerpt and word count with the content."""
+    # Saves limited to other fields (including those of instances loaded with
+    # the body deferred) leave the rendered columns as they are
+    if not raw and (update_fields is None or 'content' in update_fields):
+        rendering.render_post(instance)
+
+@receiver(post_save, sender=BlogPost)
+def move_trending_score(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """Keep the category copied onto the post's trending score current."""
+    # A new post has no score yet
+    if not created and not raw and (update_fields is None or 'category' in update_fields):
+        trending.category_changed(instance)
+
+@receiver(post_save, sender=BlogPost)
+def index_blog_post(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Keep the full-text search index in step with the post."""
+    if raw or (update_fields is not None and not update_fields & set(search.INDEXED_FIELDS)):
+        # Counter and rendering saves would otherwise load a deferred content
+        return
+    search.index_post(instance)
+
+@receiver(post_delete, sender=BlogPost)
+def unindex_blog_post(sender, instance, **kwargs):
+    """Drop a deleted post from the full-text search index."""
+    search.unindex_post(instance.pk)
+
+@receiver(post_save, sender=BlogPost)
+def count_new_post(sender, instance, created, raw=False, **kwargs):
+    """Bump the author's post counter when a post is created."""
+    if created and not raw:
+        counters.bump(Profile, {'user_id': instance.author_id}, 'posts_count', 1)
+
+@receiver(post_delete, sender=BlogPost)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.bump(Profile, {'user_id': instance.author_id}, 'posts_count', -1)
+
+@receiver(post_save, sender=Like)
+@receiver(post_save, sender=Share)
+@receiver(post_save, sender=Comment)
+def count_new_engagement(sender, instance, created, raw=False, **kwargs):
+    """Bump the post's like/share/comment counter when a row is created."""
+    if created and not raw:
+        counters.bump(BlogPost, {'pk': instance.post_id}, counters.POST_COUNTERS[sender._meta.model_name], 1)
+
+@receiver(post_delete, sender=Like)
+@receiver(post_delete, sender=Share)
+@receiver(post_delete, sender=Comment)
+def count_deleted_engagement(sender, instance, **kwargs):
+    counters.bump(BlogPost, {'pk': instance.post_id}, counters.POST_COUNTERS[sender._meta.model_name], -1)
+
+@receiver(m2m_changed, sender=Profile.following.through)
+def count_follow_changes(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keep following/followers counters in step with Profile.following."""
+    counters.follow_changed(instance, action, reverse, pk_set)
+
+@receiver(m2m_changed, sender=Profile.following.through)
+def publish_follow_changes(sender, instance, action, reverse, pk_set, **kwargs):
+    """Push follower count changes to the followed users' open pages."""
+    events.follow_changed(instance, action, reverse, pk_set)
+
+@receiver(m2m_changed, sender=Profile.following.through)
+def update_follow_feeds(sender, instance, action, reverse, pk_set, **kwargs):
+    """Backfill or prune home timelines when follow edges change."""
+    feed.follow_changed(instance, action, reverse, pk_set)
+
+@receiver(m2m_changed, sender=Profile.following.through)
+def update_follow_suggestions(sender, instance, action, reverse, pk_set, **kwargs):
+    """Drop followed profiles from suggestions and recompute the follower's list in the background."""
+    suggestions.follow_changed(instance, action, reverse, pk_set)
+
+@receiver(post_save, sender=BlogPost)
+def fan_out_new_post(sender, instance, created, raw=False, **kwargs):
+    """Push a new post into the timelines of the author's followers."""
+    if created and not raw:
+        feed.fan_out_post(instance)
+
+@receiver(post_save, sender=Like)
+@receiver(post_save, sender=Share)
+@receiver(post_save, sender=Comment)
+def notify_post_author(sender, instance, created, raw=False, **kwargs):
+    """Tell the post's author about a new like, share or comment."""
+    if not created or raw:
+        return
+    actor_id = instance.author_id if sender is Comment else instance.user_id
+    notify.emit(
+        recipient_id=instance.post.author_id,
+        sender_id=actor_id,
+        notification_type=sender._meta.model_name,
+        post_id=instance.post_id,
+        comment_id=instance.pk if sender is Comment else None,
+    )
+
+@receiver(post_save, sender=Like)
+@receiver(post_save, sender=Share)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Like)
+@receiver(post_delete, sender=Share)
+@receiver(post_delete, sender=Comment)
+def publish_engagement_counts(sender, instance, raw=False, created=True, **kwargs):
+    """Push the post's new like/share/comment count to its author's open pages."""
+    if raw or not created:
+        return
+    # Only when the post is already loaded: looking it up would cost a query
+    # per row when a post and all of its likes are deleted together
+    if not sender._meta.get_field('post').is_cached(instance):
+        return
+    delta = -1 if kwargs['signal'] is post_delete else 1
+    events.publish_counters(
+        instance.post.author_id,
+        deltas={counters.POST_COUNTERS[sender._meta.model_name]: delta},
+        post=instance.post_id,
+    )
+
+@receiver(post_save, sender=BlogCategory)
+@receiver(post_save, sender=BlogPost)
+@receiver(post_save, sender=Project)
+@receiver(post_save, sender=Tutorial)
+@receiver(post_delete, sender=BlogCategory)
+@receiver(post_delete, sender=BlogPost)
+@receiver(post_delete, sender=Project)
+@receiver(post_delete, sender=Tutorial)
+def invalidate_cached_content(sender, instance, **kwargs):
+    """Drop the cached lists and fragments that show the changed object."""
+    caching.invalidate_for(instance)
+
+@receiver(m2m_changed, sender=BlogPost.likes.through)
+@receiver(m2m_changed, sender=BlogPost.shares.through)
+def invalidate_cached_post_relations(sender, instance, action, reverse, **kwargs):
+    if action.startswith('post_') and not reverse:
+        caching.invalidate_for(instance)
+
+@receiver(post_save, sender=Profile)
+def generate_avatar_variants(sender, instance, raw=False, **kwargs):
+    """Resize a newly uploaded avatar in the background."""
+    if raw or not instance.avatar or images.has_variants(instance.avatar.name):
+        return
+    images.schedule(instance.avatar.name)
+
+@receiver(cleanup_pre_delete)
+def delete_image_variants(sender, file, **kwargs):
+    """Remove the variants of an image django-cleanup is about to delete."""
+    if file.name:
+        images.delete_variants(file.name)
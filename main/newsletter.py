@@ -0,0 +1,149 @@
+"""
+Sending a NewsletterCampaign to every NewsletterSubscriber.
+
+Subscribers are read in keyset batches (id > checkpoint, ORDER BY id, LIMIT
+batch size), so only one batch is in memory and no read transaction stays
+open for the length of the campaign. Each batch goes out over one SMTP
+connection, then the campaign's checkpoint and counters move forward in a
+single UPDATE. A run that dies resumes after the last finished batch; at
+most that one unfinished batch is sent twice.
+
+The UPDATE only applies while the checkpoint is where this run left it, and
+a run inside a job refreshes the job's lock after every batch, so a campaign
+outlasting JOB_TIMEOUT is not resumed by a second worker. A run that finds
+the checkpoint moved, or its job taken over, stops after its current batch.
+
+Every subscriber gets the same message, so it is rendered to MIME once per
+run; with the SMTP backend each recipient then only costs a To and a
+Message-ID header prepended to those bytes.
+"""
+import smtplib
+import time
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.backends.smtp import EmailBackend as SMTPBackend
+from django.core.mail.message import sanitize_address
+from django.core.mail.utils import DNS_NAME
+from django.db.models import F
+from django.utils import timezone
+
+from . import jobs
+
+BATCH_SIZE = getattr(settings, 'NEWSLETTER_BATCH_SIZE', 500)
+# Messages per second across the whole campaign; None sends as fast as the server accepts
+RATE = getattr(settings, 'NEWSLETTER_RATE', None)
+
+
+class CampaignMessage:
+    """A campaign rendered to bytes once, addressed per recipient."""
+
+    PLACEHOLDER_ID = 'newsletter-message-id'
+
+    def __init__(self, campaign):
+        self.campaign = campaign
+        message = self.email_message(None)
+        message.extra_headers['Message-ID'] = self.PLACEHOLDER_ID
+        self.from_email = sanitize_address(message.from_email, message.encoding or settings.DEFAULT_CHARSET)
+        raw = message.message().as_bytes(linesep='\r\n')
+        self.body = raw.replace(f'Message-ID: {self.PLACEHOLDER_ID}\r\n'.encode(), b'', 1)
+        self.domain = str(DNS_NAME)
+
+    def email_message(self, email):
+        """The campaign as a regular EmailMessage, for backends other than SMTP."""
+        message = EmailMultiAlternatives(self.campaign.subject, self.campaign.body_text, to=[email] if email else [])
+        if self.campaign.body_html:
+            message.attach_alternative(self.campaign.body_html, 'text/html')
+        return message
+
+    def for_recipient(self, subscriber_id, email):
+        """(envelope address, message bytes) for one subscriber."""
+        address = email if email.isascii() else sanitize_address(email, settings.DEFAULT_CHARSET)
+        headers = f'To: {address}\r\nMessage-ID: <newsletter.{self.campaign.pk}.{subscriber_id}@{self.domain}>\r\n'
+        return address, headers.encode() + self.body
+
+
+def send_batch(message, subscribers, connection):
+    """Send message to [(id, email)] over one open connection; returns (sent, refused)."""
+    sent = refused = 0
+    for subscriber_id, email in subscribers:
+        try:
+            if isinstance(connection, SMTPBackend):
+                address, data = message.for_recipient(subscriber_id, email)
+                connection.connection.sendmail(message.from_email, [address], data)
+                sent += 1
+            else:
+                sent += connection.send_messages([message.email_message(email)])
+        except smtplib.SMTPRecipientsRefused:
+            # Bad address: skip it rather than failing the campaign
+            refused += 1
+    return sent, refused
+
+
+def dispatch(campaign_id, batch_size=BATCH_SIZE, rate=RATE, progress=None):
+    """
+    Send the campaign from its checkpoint to the last subscriber.
+
+    progress(campaign) is called after every batch. Returns the campaign.
+    """
+    from .models import NewsletterCampaign, NewsletterSubscriber
+
+    campaign = NewsletterCampaign.objects.get(pk=campaign_id)
+    if campaign.status == NewsletterCampaign.SENT:
+        return campaign
+    if campaign.started_at is None:
+        campaign.started_at = timezone.now()
+    campaign.status = NewsletterCampaign.SENDING
+    campaign.save(update_fields=['status', 'started_at'])
+
+    message = CampaignMessage(campaign)
+    started, handled = time.monotonic(), 0
+    while True:
+        batch = list(
+            NewsletterSubscriber.objects.filter(pk__gt=campaign.last_subscriber_id)
+            .order_by('pk')
+            .values_list('pk', 'email')[:batch_size]
+        )
+        if not batch:
+            break
+        with get_connection() as connection:
+            sent, refused = send_batch(message, batch, connection)
+
+        advanced = NewsletterCampaign.objects.filter(
+            pk=campaign.pk, last_subscriber_id=campaign.last_subscriber_id,
+        ).update(
+            last_subscriber_id=batch[-1][0],
+            sent_count=F('sent_count') + sent,
+            failed_count=F('failed_count') + refused,
+        )
+        if not advanced or not jobs.heartbeat():
+            # Another run is sending this campaign
+            campaign.refresh_from_db()
+            return campaign
+        campaign.last_subscriber_id = batch[-1][0]
+        campaign.sent_count += sent
+        campaign.failed_count += refused
+        if progress is not None:
+            progress(campaign)
+
+        handled += len(batch)
+        if rate:
+            # Sleep off any lead over the allowed pace
+            ahead = handled / rate - (time.monotonic() - started)
+            if ahead > 0:
+                time.sleep(ahead)
+
+    campaign.status = NewsletterCampaign.SENT
+    campaign.finished_at = timezone.now()
+    campaign.save(update_fields=['status', 'finished_at'])
+    return campaign
+
+
+@jobs.task
+def send_campaign(campaign_id):
+    dispatch(campaign_id)
+
+
+def schedule(campaign):
+    """Send campaign from a background job; a failed attempt retries from its checkpoint."""
+    return jobs.enqueue(send_campaign, max_attempts=10, campaign_id=campaign.pk)
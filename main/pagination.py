@@ -0,0 +1,147 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.db.models import Q
+from django.http import JsonResponse
+from django.template.loader import render_to_string
+from django.utils.dateparse import parse_datetime
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+class CursorPage:
+    """One page of results from a CursorPaginator."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Keyset paginator over a queryset ordered newest first by (created_at, id).
+
+    field and tiebreak name the two columns of the key when they differ from
+    created_at and the primary key; field may also hold numbers, read highest
+    first.
+
+    Unlike django.core.paginator.Paginator it never counts the queryset and
+    never uses OFFSET: each page is a single indexed range query starting from
+    the (created_at, id) of the last row on the previous page, so any page costs
+    the same as the first. Cursors are opaque url-safe tokens.
+    """
+
+    def __init__(self, queryset, per_page, field='created_at', tiebreak='pk'):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.field = field
+        self.tiebreak = tiebreak
+
+    def page(self, cursor=None):
+        """Return the page that starts at cursor (the first page if cursor is missing or invalid)."""
+        position = self.decode_cursor(cursor)
+        has_more, rows = self._trim(list(self.page_queryset(cursor)))
+        if position is None:
+            return self._build_page(rows, has_next=has_more, has_previous=False)
+        if position[0] == NEXT:
+            return self._build_page(rows, has_next=has_more, has_previous=True)
+        rows.reverse()
+        return self._build_page(rows, has_next=True, has_previous=has_more)
+
+    def page_queryset(self, cursor=None):
+        """The rows page(cursor) reads, plus one that tells whether more follow, as an unevaluated queryset."""
+        position = self.decode_cursor(cursor)
+        if position is None:
+            return self._slice(self.queryset, descending=True)
+
+        direction, value, key = position
+        if direction == NEXT:
+            # The leading range condition lets the database seek straight to value on its index
+            after = Q(**{f'{self.field}__lte': value}) & (
+                Q(**{f'{self.field}__lt': value}) | Q(**{f'{self.tiebreak}__lt': key})
+            )
+            return self._slice(self.queryset.filter(after), descending=True)
+
+        before = Q(**{f'{self.field}__gte': value}) & (
+            Q(**{f'{self.field}__gt': value}) | Q(**{f'{self.tiebreak}__gt': key})
+        )
+        return self._slice(self.queryset.filter(before), descending=False)
+
+    def _slice(self, queryset, descending):
+        prefix = '-' if descending else ''
+        # One extra row tells us whether another page follows without a COUNT
+        return queryset.order_by(f'{prefix}{self.field}', f'{prefix}{self.tiebreak}')[:self.per_page + 1]
+
+    def _trim(self, rows):
+        return len(rows) > self.per_page, rows[:self.per_page]
+
+    def _build_page(self, rows, has_next, has_previous):
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = self.encode_cursor(NEXT, rows[-1])
+        if rows and has_previous:
+            previous_cursor = self.encode_cursor(PREVIOUS, rows[0])
+        return CursorPage(rows, next_cursor, previous_cursor)
+
+    def encode_cursor(self, direction, obj):
+        value = getattr(obj, self.field)
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        key = getattr(obj, self.tiebreak)
+        payload = json.dumps([direction, value, key], separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """Return (direction, value, key) for a cursor token, or None if it is not valid."""
+        if not cursor:
+            return None
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            direction, value, key = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            if isinstance(value, str):
+                value = parse_datetime(value)
+            elif isinstance(value, bool) or not isinstance(value, (int, float)):
+                value = None
+            key = int(key)
+        except (binascii.Error, UnicodeError, ValueError, TypeError):
+            return None
+        if direction not in (NEXT, PREVIOUS) or value is None:
+            return None
+        return direction, value, key
+
+
+def wants_json(request):
+    """True when the page is being fetched by the infinite-scroll script."""
+    return 'application/json' in request.headers.get('Accept', '')
+
+
+def page_json_response(request, page, template_name, context=None):
+    """Render the rows of a page with template_name and return them as JSON."""
+    context = dict(context or {}, page_obj=page)
+    return JsonResponse({
+        'html': render_to_string(template_name, context, request=request),
+        'next_cursor': page.next_cursor,
+        'has_next': page.has_next(),
+    })
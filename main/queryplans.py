@@ -0,0 +1,249 @@
+"""
+EXPLAIN QUERY PLAN audit of the SQL the views run.
+
+Every SELECT, UPDATE and DELETE is explained and flagged when SQLite:
+- scans a whole table or index while the query filters that table;
+- searches an index that leaves some of the query's equality filters on
+  that table to be checked row by row;
+- builds a temporary B-tree to sort, group or deduplicate.
+
+For each flag the audit suggests an index on the flagged table: its equality
+columns followed by its ORDER BY columns. Boolean filters become the
+condition of a partial index instead, because SQLite cannot search an index
+for a bare `flag` or `NOT flag` term but does use an index whose WHERE
+matches it. The suggested index is created, the query explained again to see
+whether the flags go away, and the index dropped. The SQL is only parsed
+approximately, which is enough for what the ORM generates.
+
+Two flags remain on the benchmarked routes, and no index removes them:
+- search sorts its FTS5 matches by bm25() rank, which is computed per match
+  and so cannot come from an index;
+- the profile page prefetches its posts' comments with post_id IN (...)
+  ORDER BY created_at. comment_post_created_idx returns each post's
+  comments in order, but merging several posts' runs still needs a sort.
+"""
+import re
+from dataclasses import dataclass, field
+
+from django.apps import apps
+from django.db import connection
+
+STATEMENTS = ('SELECT', 'UPDATE', 'DELETE', 'WITH')
+# "main_post"."author_id" or U0."author_id"
+COLUMN = r'(?:"(\w+)"|\b([A-Z]\d+))\."(\w+)"'
+# Compared with a value, not with another column (a join)
+EQUALITY = re.compile(COLUMN + r'\s*(=|IN\s*\(|IS\s+NULL)(?!\s*(?:"|[A-Z]\d+\.))')
+# Boolean columns are filtered as bare "t"."flag" or NOT "t"."flag"
+BOOLEAN = re.compile(r'(?:^|\(|\bAND|\bOR|\b(NOT))\s*' + COLUMN + r'(?=\s*(?:\bAND\b|\bOR\b|\)|$))')
+ALIAS = re.compile(r'"(\w+)"\s+(?:AS\s+)?([A-Z]\d+)\b')
+PLAN_TABLE = re.compile(r'^(SCAN|SEARCH) (\w+)(?: USING (?:COVERING )?INDEX (\w+)(?: \((.*)\))?)?')
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+CANDIDATE_INDEX = 'audit_candidate_idx'
+
+
+@dataclass
+class Finding:
+    sql: str
+    plan: list
+    issues: list
+    routes: set = field(default_factory=set)
+    # Suggested index as (model label, field names, {boolean field: value}), and whether it clears the issues
+    recommendation: tuple = None
+    resolved: bool = False
+
+
+def fingerprint(sql):
+    """sql with literals replaced, so one query shape is reported once."""
+    return LITERALS.sub('?', sql)
+
+
+def explain(sql):
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def depths(sql):
+    """Parenthesis depth at each character of sql, ignoring string literals."""
+    result, depth, quoted = [], 0, False
+    for char in sql:
+        if char == "'":
+            quoted = not quoted
+        elif not quoted and char == '(':
+            depth += 1
+        elif not quoted and char == ')':
+            depth -= 1
+            result.append(depth)
+            continue
+        result.append(depth)
+    return result
+
+
+def clause(sql, levels, keyword, ends):
+    """Text of the top-level clause starting at keyword, up to the next of ends; '' if absent."""
+    starts = [match.end() for match in re.finditer(keyword, sql) if levels[match.start()] == 0]
+    if not starts:
+        return ''
+    start = starts[0]
+    stops = [
+        start + match.start()
+        for end in ends for match in re.finditer(end, sql[start:]) if levels[start + match.start()] == 0
+    ]
+    return sql[start:min(stops, default=len(sql))]
+
+
+def in_or_group(text, position):
+    """Whether the condition at position is one branch of an OR."""
+    levels = depths(text)
+    depth = levels[position]
+    left = position
+    while left > 0 and levels[left - 1] >= depth:
+        left -= 1
+    right = position
+    while right < len(text) and levels[right] >= depth:
+        right += 1
+    return any(levels[left + m.start()] == depth for m in re.finditer(r'\bOR\b', text[left:right]))
+
+
+def parse(sql):
+    """
+    Columns of sql's top-level clauses as (table, column) pairs: equality
+    filters, boolean filters (with the value they require), ORDER BY / GROUP
+    BY columns, and the set of filtered tables; plus the alias map.
+    """
+    aliases = {alias: table for table, alias in ALIAS.findall(sql)}
+    levels = depths(sql)
+    where = clause(sql, levels, r' WHERE ', [r' GROUP BY ', r' ORDER BY ', r' LIMIT ', r' HAVING '])
+    order = clause(sql, levels, r' ORDER BY ', [r' LIMIT '])
+    group = clause(sql, levels, r' GROUP BY ', [r' ORDER BY ', r' LIMIT ', r' HAVING '])
+
+    def table_of(match, offset=0):
+        return match.group(1 + offset) or aliases.get(match.group(2 + offset))
+
+    equality, booleans = [], {}
+    for match in EQUALITY.finditer(where):
+        column = (table_of(match), match.group(3))
+        if column[0] and column not in equality and not in_or_group(where, match.start()):
+            equality.append(column)
+    # = comes before IN, and IS NULL last, in the suggested index
+    equality.sort(key=lambda column: (
+        0 if re.search(rf'\."{column[1]}"\s*=', where) else 2 if re.search(rf'\."{column[1]}"\s*IS', where) else 1
+    ))
+    for match in BOOLEAN.finditer(where):
+        column = (table_of(match, 1), match.group(4))
+        if column[0] and not in_or_group(where, match.end() - 1):
+            booleans[column] = match.group(1) is None
+    ordering = []
+    for text in (order, group):
+        for match in re.finditer(COLUMN, text):
+            column = (table_of(match), match.group(3))
+            if column[0] and column not in ordering:
+                ordering.append(column)
+    filtered = {table_of(match) for match in re.finditer(COLUMN, where)} - {None}
+    return equality, booleans, ordering, filtered, aliases
+
+
+def issues(sql, plan):
+    """Problems in plan as (table or None, description) pairs."""
+    equality, booleans, _, filtered, aliases = parse(sql)
+    found = []
+    for detail in plan:
+        if 'TEMP B-TREE' in detail:
+            found.append((None, detail))
+            continue
+        match = PLAN_TABLE.match(detail)
+        if not match:
+            continue
+        kind, name, index, constraint = match.groups()
+        table = aliases.get(name, name)
+        if kind == 'SCAN' and table in filtered and not (index and is_partial(table, index)):
+            # Scanning a partial index only visits the rows its condition allows
+            found.append((table, detail))
+        elif kind == 'SEARCH' and index and constraint is not None:
+            used = set(re.findall(r'(\w+)[=<>]', constraint))
+            unused = [column for owner, column in equality if owner == table and column not in used]
+            if not is_partial(table, index):
+                unused += [column for owner, column in booleans if owner == table]
+            if unused:
+                found.append((table, f'{detail}; {", ".join(unused)} checked row by row'))
+    return found
+
+
+def is_partial(table, index):
+    with connection.cursor() as cursor:
+        cursor.execute(f'PRAGMA index_list({connection.ops.quote_name(table)})')
+        return any(row[1] == index and row[4] for row in cursor.fetchall())
+
+
+def recommend(sql, found):
+    """(table, columns, {boolean column: value}) of an index addressing found, or None."""
+    equality, booleans, ordering, _, _ = parse(sql)
+    tables = [table for table, _ in found if table] or [table for table, _ in ordering]
+    if not tables or model_for(tables[0]) is None:
+        return None
+    table = tables[0]
+    condition = {column: value for (owner, column), value in booleans.items() if owner == table}
+    columns = [column for owner, column in equality if owner == table]
+    columns += [column for owner, column in ordering if owner == table and column not in columns]
+    if not columns:
+        return None
+    return table, columns, condition
+
+
+def model_for(table):
+    for model in apps.get_models():
+        if model._meta.db_table == table:
+            return model
+    return None
+
+
+def field_names(table, columns, condition):
+    model = model_for(table)
+    by_column = {model_field.column: model_field.name for model_field in model._meta.concrete_fields}
+    return (
+        model._meta.label,
+        tuple(by_column.get(column, column) for column in columns),
+        tuple((by_column.get(column, column), value) for column, value in condition.items()),
+    )
+
+
+def try_index(sql, table, columns, condition):
+    """Whether an index on table(columns) WHERE condition removes every issue with sql; it is dropped again."""
+    quote = connection.ops.quote_name
+    where = ' AND '.join(f'{"" if value else "NOT "}{quote(column)}' for column, value in condition.items())
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE INDEX {CANDIDATE_INDEX} ON {quote(table)} ({", ".join(map(quote, columns))})'
+            + (f' WHERE {where}' if where else '')
+        )
+        try:
+            return not issues(sql, explain(sql))
+        finally:
+            cursor.execute(f'DROP INDEX {CANDIDATE_INDEX}')
+
+
+def audit(captured):
+    """
+    captured is {route name: [sql, ...]}; returns the Findings, one per
+    flagged query shape, with their suggested index already tried out.
+    """
+    findings = {}
+    for route, statements in captured.items():
+        for sql in statements:
+            if not sql.lstrip().upper().startswith(STATEMENTS):
+                continue
+            key = fingerprint(sql)
+            if key in findings:
+                findings[key].routes.add(route)
+                continue
+            plan = explain(sql)
+            found = issues(sql, plan)
+            if not found:
+                continue
+            finding = Finding(sql, plan, [detail for _, detail in found], {route})
+            suggestion = recommend(sql, found)
+            if suggestion is not None:
+                finding.recommendation = field_names(*suggestion)
+                finding.resolved = try_index(sql, *suggestion)
+            findings[key] = finding
+    return list(findings.values())
@@ -0,0 +1,203 @@
+"""
+Related posts from co-engagement.
+
+Likes, shares and comments form a sparse user × post matrix: a cell is the
+sum of the WEIGHTS of what that user did on that post, any number of comments
+counting once. It is aggregated by the database in one query and held in
+compressed sparse row form, once per user (their posts) and once per post
+(its users), in flat arrays rather than model instances. Two posts are as
+related as the cosine of their columns, and each post keeps its LIMIT most
+similar neighbours in RelatedPost, which blog_detail reads in rank order.
+
+A post's similarities are accumulated by walking its column and, for each of
+its users, that user's row; users with more than MAX_USER_POSTS posts are
+skipped there, because they connect almost everything to everything while
+saying little about any pair and dominate the running time.
+
+refresh() rebuilds only the posts whose neighbours can have changed since
+its last run: those with new engagement and every post sharing a user with
+them. Removed likes and shares leave no such trace, so everything is rebuilt
+every FULL_INTERVAL seconds.
+"""
+import heapq
+from array import array
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import timedelta
+from math import sqrt
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import caching, jobs
+
+LIMIT = getattr(settings, 'RELATED_POSTS_LIMIT', 5)
+WEIGHTS = getattr(settings, 'RELATED_POSTS_WEIGHTS', {'like': 1.0, 'share': 2.0, 'comment': 2.0})
+MAX_USER_POSTS = getattr(settings, 'RELATED_POSTS_MAX_USER_POSTS', 500)
+FULL_INTERVAL = getattr(settings, 'RELATED_POSTS_FULL_INTERVAL', 24 * 60 * 60)
+BATCH_SIZE = 500
+CHECKPOINT = 'related_posts'
+FULL_CHECKPOINT = 'related_posts:full'
+
+
+@dataclass
+class Matrix:
+    # Rows: the posts user engaged with are row_posts[start:stop], with row_weights
+    user_slices: dict
+    row_posts: array
+    row_weights: array
+    # Columns: the users of post are col_users[start:stop], with col_weights
+    post_slices: dict
+    col_users: array
+    col_weights: array
+    # Euclidean norm of each post's column
+    norms: dict
+
+
+def _engagement_sql(order_by):
+    from .models import Comment, Like, Share
+
+    quote = connection.ops.quote_name
+    parts = [
+        f'SELECT {quote("user_id")} AS u, {quote("post_id")} AS p, %s AS w FROM {quote(Like._meta.db_table)}',
+        f'SELECT {quote("user_id")}, {quote("post_id")}, %s FROM {quote(Share._meta.db_table)}',
+        # Any number of comments on a post counts once
+        f'SELECT DISTINCT {quote("author_id")}, {quote("post_id")}, %s FROM {quote(Comment._meta.db_table)}',
+    ]
+    return (
+        f'SELECT u, p, SUM(w) FROM ({" UNION ALL ".join(parts)}) GROUP BY u, p ORDER BY {order_by}',
+        [WEIGHTS['like'], WEIGHTS['share'], WEIGHTS['comment']],
+    )
+
+
+def _compress(order_by):
+    """({key: (start, stop)}, others, weights) of the matrix ordered by key (u or p)."""
+    sql, params = _engagement_sql(order_by)
+    slices, others, weights = {}, array('q'), array('d')
+    key_index = 0 if order_by.startswith('u') else 1
+    current, start = None, 0
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(10000)
+            if not rows:
+                break
+            for row in rows:
+                key = row[key_index]
+                if key != current:
+                    if current is not None:
+                        slices[current] = (start, len(others))
+                    current, start = key, len(others)
+                others.append(row[1 - key_index])
+                weights.append(row[2])
+    if current is not None:
+        slices[current] = (start, len(others))
+    return slices, others, weights
+
+
+def load_matrix():
+    """The engagement matrix as it is now."""
+    user_slices, row_posts, row_weights = _compress('u, p')
+    post_slices, col_users, col_weights = _compress('p, u')
+    norms = {
+        post: sqrt(sum(weight * weight for weight in col_weights[start:stop]))
+        for post, (start, stop) in post_slices.items()
+    }
+    return Matrix(user_slices, row_posts, row_weights, post_slices, col_users, col_weights, norms)
+
+
+def _users(matrix, post):
+    start, stop = matrix.post_slices.get(post, (0, 0))
+    for user, weight in zip(matrix.col_users[start:stop], matrix.col_weights[start:stop]):
+        row_start, row_stop = matrix.user_slices[user]
+        if row_stop - row_start <= MAX_USER_POSTS:
+            yield weight, row_start, row_stop
+
+
+def neighbours(matrix, post, limit=LIMIT):
+    """[(similarity, post id)] of post's limit most similar posts, best first."""
+    dots = defaultdict(float)
+    for weight, start, stop in _users(matrix, post):
+        for other, other_weight in zip(matrix.row_posts[start:stop], matrix.row_weights[start:stop]):
+            dots[other] += weight * other_weight
+    dots.pop(post, None)
+    norm = matrix.norms.get(post)
+    if not norm:
+        return []
+    norms = matrix.norms
+    return heapq.nlargest(limit, ((dot / (norm * norms[other]), other) for other, dot in dots.items()))
+
+
+def co_engaged(matrix, posts):
+    """posts and every post sharing a (not oversized) user with one of them."""
+    found = set(posts)
+    for post in posts:
+        for _, start, stop in _users(matrix, post):
+            found.update(matrix.row_posts[start:stop])
+    return found
+
+
+def store(matrix, posts, limit=LIMIT, batch_size=BATCH_SIZE):
+    """Replace the stored neighbours of posts; returns the number of RelatedPost rows written."""
+    from .models import BlogPost, RelatedPost
+
+    posts = sorted(posts)
+    written = 0
+    for i in range(0, len(posts), batch_size):
+        batch = posts[i:i + batch_size]
+        with transaction.atomic():
+            # Posts deleted since the matrix was read are skipped
+            existing = set(BlogPost.objects.filter(pk__in=batch).values_list('pk', flat=True))
+            rows = [
+                RelatedPost(post_id=post, related_id=other, score=score, rank=rank)
+                for post in batch if post in existing
+                for rank, (score, other) in enumerate(neighbours(matrix, post, limit))
+            ]
+            RelatedPost.objects.filter(post_id__in=batch).delete()
+            RelatedPost.objects.bulk_create(rows, batch_size=batch_size)
+        written += len(rows)
+    return written
+
+
+def changed_since(since):
+    """Ids of the posts with likes, shares or comments created at or after since."""
+    from .models import Comment, Like, Share
+
+    changed = set()
+    for model in (Like, Share, Comment):
+        changed.update(model.objects.filter(created_at__gte=since).values_list('post_id', flat=True).distinct())
+    return changed
+
+
+@jobs.task
+def refresh(full=False, limit=LIMIT):
+    """
+    Bring RelatedPost up to date; returns (posts rebuilt, rows written).
+
+    Rebuilds everything when full, on the first run and every FULL_INTERVAL
+    seconds, otherwise only what engagement since the last run can affect.
+    """
+    from .models import RelatedPost
+
+    started = timezone.now()
+    since, last_full = jobs.checkpoint(CHECKPOINT), jobs.checkpoint(FULL_CHECKPOINT)
+    full = full or since is None or last_full is None or started - last_full > timedelta(seconds=FULL_INTERVAL)
+    if not full:
+        changed = changed_since(since)
+        if not changed:
+            jobs.save_checkpoint(CHECKPOINT, started)
+            return 0, 0
+    matrix = load_matrix()
+    if full:
+        # Posts that lost all their engagement drop their old neighbours too
+        posts = set(matrix.post_slices) | set(RelatedPost.objects.values_list('post_id', flat=True).distinct())
+    else:
+        posts = co_engaged(matrix, changed)
+    written = store(matrix, posts, limit)
+    # Engagement created while this ran is picked up next time
+    jobs.save_checkpoint(CHECKPOINT, started)
+    if full:
+        jobs.save_checkpoint(FULL_CHECKPOINT, started)
+    caching.invalidate('related_posts')
+    return len(posts), written
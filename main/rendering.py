@@ -0,0 +1,77 @@
+"""
+Rendering blog post bodies once, when they are saved.
+
+Post bodies are plain text. Saving a BlogPost stores three columns derived
+from its content: content_html, the escaped body split into paragraphs and
+line breaks as the linebreaks filter would; excerpt, its first EXCERPT_WORDS
+words as plain text; and word_count, from which the reading time follows.
+Pages show these columns instead of filtering the body on every request, and
+list queries leave the body columns out altogether (see LIST_DEFERRED).
+
+Every template truncates the excerpt to at most EXCERPT_WORDS words, so
+`excerpt|truncatewords:n` shows the same text `content|truncatewords:n` did.
+"""
+import math
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.html import linebreaks
+from django.utils.text import Truncator
+
+from . import caching
+
+EXCERPT_WORDS = getattr(settings, 'POST_EXCERPT_WORDS', 50)
+WORDS_PER_MINUTE = getattr(settings, 'READING_WORDS_PER_MINUTE', 200)
+RENDERED_FIELDS = ('content_html', 'excerpt', 'word_count')
+# Columns no list of posts reads; defer() them there
+LIST_DEFERRED = ('content', 'content_html')
+
+
+def render(content):
+    """{field: value} of the rendered columns for a post body."""
+    words = content.split()
+    return {
+        'content_html': linebreaks(content, autoescape=True),
+        # Same ending as the truncatewords filter
+        'excerpt': Truncator(' '.join(words)).words(EXCERPT_WORDS, truncate=' …'),
+        'word_count': len(words),
+    }
+
+
+def render_post(post):
+    for name, value in render(post.content).items():
+        setattr(post, name, value)
+
+
+def reading_minutes(word_count):
+    return max(1, math.ceil(word_count / WORDS_PER_MINUTE))
+
+
+def rerender(queryset, batch_size=500):
+    """
+    Render the body of every post in queryset again, e.g. after the renderer
+    changed; returns the number of posts whose stored rendering changed.
+
+    Changed posts get a new updated_at, which moves their ETags and cached
+    cards on; posts that render the same are not written at all.
+    """
+    model = queryset.model
+    last_pk, changed = 0, 0
+    rows = queryset.order_by('pk').values_list('pk', 'content', *RENDERED_FIELDS)
+    while True:
+        batch = list(rows.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            break
+        now = timezone.now()
+        updates = []
+        for pk, content, *stored in batch:
+            rendered = render(content)
+            if [rendered[name] for name in RENDERED_FIELDS] != stored:
+                updates.append(model(pk=pk, updated_at=now, **rendered))
+        with transaction.atomic():
+            model._base_manager.bulk_update(updates, [*RENDERED_FIELDS, 'updated_at'], batch_size=batch_size)
+        last_pk, changed = batch[-1][0], changed + len(updates)
+    if changed:
+        caching.invalidate('featured_posts')
+    return changed
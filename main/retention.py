@@ -0,0 +1,206 @@
+"""
+Deleting rows that have outlived their use.
+
+Each entry of RETENTION_POLICIES names a model, the date field that ages its
+rows, how many seconds they are kept and optionally a filter narrowing which
+rows expire. Expired rows go in chunks of CHUNK_SIZE, walked in primary-key
+order, each chunk read and deleted in its own short transaction with a pause
+before the next, so other writers never queue long behind SQLite's single
+write lock. Inside that transaction a policy can first archive the chunk to
+gzipped NDJSON under RETENTION_ARCHIVE_DIR and pass it to a before_delete
+hook: LoginAttempt rows are rolled up into daily LoginAttemptRollup totals,
+and unread notifications are taken off their recipient's badge.
+
+Each chunk is appended to the archive as its own gzip member, and cut off
+again if its transaction rolls back, so the archive only holds rows that were
+deleted. Rows are never deleted without being archived first; a process that
+dies between the two archives the chunk again on the next run.
+
+Deleted rows leave free pages in the database file; vacuum() hands them back
+to the filesystem a few pages at a time with PRAGMA incremental_vacuum, which
+only works once auto_vacuum is INCREMENTAL (see enable_incremental_vacuum()).
+"""
+import gzip
+import json
+import os
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import counters, jobs
+
+CHUNK_SIZE = getattr(settings, 'RETENTION_CHUNK_SIZE', 1000)
+# Seconds between chunks, leaving the write lock to other connections
+PAUSE = getattr(settings, 'RETENTION_PAUSE', 0.05)
+ARCHIVE_DIR = getattr(settings, 'RETENTION_ARCHIVE_DIR', os.path.join(settings.BASE_DIR, 'archive'))
+# Free pages released per PRAGMA incremental_vacuum step
+VACUUM_PAGES = 2000
+
+
+@dataclass(frozen=True)
+class Policy:
+    name: str
+    # 'app_label.ModelName'
+    model: str
+    # Seconds a row is kept after its date_field
+    max_age: int
+    date_field: str = 'created_at'
+    # Extra lookups limiting which old rows expire, e.g. {'is_read': True}
+    filter: dict = field(default_factory=dict)
+    # Write expired rows to RETENTION_ARCHIVE_DIR before deleting them
+    archive: bool = False
+    # Dotted path of a callable given each chunk of expired rows (as dicts) before it is deleted
+    before_delete: str = ''
+
+    def expired(self, now):
+        model = apps.get_model(self.model)
+        return model._base_manager.filter(**{f'{self.date_field}__lt': now - timedelta(seconds=self.max_age)}, **self.filter)
+
+
+def policies(names=None):
+    configured = getattr(settings, 'RETENTION_POLICIES', {})
+    return [Policy(name, **spec) for name, spec in configured.items() if names is None or name in names]
+
+
+def open_archive(policy, now):
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    path = os.path.join(ARCHIVE_DIR, f'{policy.name}-{now:%Y%m%dT%H%M%S}.ndjson.gz')
+    # Concatenated gzip members read back as one stream
+    return path, open(path, 'ab')
+
+
+def apply(policy, chunk_size=CHUNK_SIZE, pause=PAUSE, dry_run=False, now=None):
+    """Delete the rows policy has expired; returns how many were (or, with dry_run, would be) deleted."""
+    now = now or timezone.now()
+    expired = policy.expired(now).order_by('pk')
+    hook = import_string(policy.before_delete) if policy.before_delete else None
+    pk_name = expired.model._meta.pk.attname
+    archive = None
+    last_pk, deleted = 0, 0
+    try:
+        while True:
+            if dry_run:
+                chunk = list(expired.filter(pk__gt=last_pk).values_list('pk', flat=True)[:chunk_size])
+                if chunk:
+                    last_pk, deleted = chunk[-1], deleted + len(chunk)
+            else:
+                archived_to = None
+                try:
+                    with transaction.atomic():
+                        chunk = list(expired.filter(pk__gt=last_pk).values()[:chunk_size])
+                        if not chunk:
+                            break
+                        if policy.archive:
+                            if archive is None:
+                                _, archive = open_archive(policy, now)
+                            archived_to = archive.tell()
+                            lines = ''.join(json.dumps(row, cls=DjangoJSONEncoder) + '\n' for row in chunk)
+                            archive.write(gzip.compress(lines.encode()))
+                            archive.flush()
+                        if hook is not None:
+                            hook(chunk)
+                        pks = [row[pk_name] for row in chunk]
+                        expired.model._base_manager.filter(pk__in=pks).delete()
+                except BaseException:
+                    if archived_to is not None:
+                        # The rows are still there; the next run archives them again
+                        archive.truncate(archived_to)
+                    raise
+                last_pk, deleted = pks[-1], deleted + len(pks)
+            if len(chunk) < chunk_size:
+                break
+            time.sleep(pause)
+    finally:
+        if archive is not None:
+            archive.close()
+    return deleted
+
+
+def apply_policies(names=None, **options):
+    """Apply every configured policy (or those named); returns {policy name: rows deleted}."""
+    return {policy.name: apply(policy, **options) for policy in policies(names)}
+
+
+def vacuum(using='default', pages=VACUUM_PAGES, pause=PAUSE):
+    """
+    Release the free pages of an auto_vacuum = INCREMENTAL SQLite database in
+    steps of pages; returns the number released, or None if the database
+    cannot be vacuumed incrementally.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA auto_vacuum')
+        if cursor.fetchone()[0] != 2:
+            return None
+        cursor.execute('PRAGMA freelist_count')
+        free = start = cursor.fetchone()[0]
+        while free:
+            # Each step is its own short write transaction
+            cursor.execute(f'PRAGMA incremental_vacuum({int(pages)})')
+            cursor.fetchall()
+            cursor.execute('PRAGMA freelist_count')
+            free = cursor.fetchone()[0]
+            if free:
+                time.sleep(pause)
+    return start
+
+
+def enable_incremental_vacuum(using='default'):
+    """Switch a SQLite database to auto_vacuum = INCREMENTAL; rewrites the whole file once with VACUUM."""
+    with connections[using].cursor() as cursor:
+        cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        cursor.execute('VACUUM')
+
+
+@jobs.task
+def enforce():
+    apply_policies()
+    vacuum()
+
+
+def rollup_login_attempts(rows):
+    """before_delete hook adding LoginAttempt rows to their day's LoginAttemptRollup totals."""
+    from .models import LoginAttemptRollup
+
+    totals = defaultdict(lambda: [0, 0])
+    for row in rows:
+        key = (timezone.localdate(row['created_at']), row['ip_address'])
+        totals[key][0 if row['success'] else 1] += 1
+    existing = {
+        (rollup.day, rollup.ip_address): rollup
+        for rollup in LoginAttemptRollup.objects.filter(
+            day__in={day for day, _ in totals}, ip_address__in={ip for _, ip in totals},
+        )
+    }
+    to_create = []
+    for (day, ip_address), (successes, failures) in totals.items():
+        rollup = existing.get((day, ip_address))
+        if rollup is None:
+            to_create.append(LoginAttemptRollup(day=day, ip_address=ip_address, successes=successes, failures=failures))
+        else:
+            rollup.successes += successes
+            rollup.failures += failures
+    LoginAttemptRollup.objects.bulk_update(
+        [rollup for key, rollup in existing.items() if key in totals], ['successes', 'failures'], batch_size=500,
+    )
+    LoginAttemptRollup.objects.bulk_create(to_create, batch_size=500)
+
+
+def release_unread_notifications(rows):
+    """before_delete hook taking unread notifications off their recipients' unread counters."""
+    from .events import publish_counters
+    from .models import Profile
+
+    for recipient_id, count in Counter(row['recipient_id'] for row in rows if not row['is_read']).items():
+        counters.bump(Profile, {'user_id': recipient_id}, 'unread_notifications_count', -count)
+        publish_counters(recipient_id, deltas={'unread_notifications': -count})
@@ -0,0 +1,33 @@
+"""
+Read/write routing for the production SQLite profile.
+
+Both aliases open the same database file. Writes always go through 'default'
+(BEGIN IMMEDIATE, so SQLite serializes writers on its lock); reads go through
+'replica', whose connections are opened with PRAGMA query_only. In WAL mode
+readers never wait for the writer and always see the last committed state.
+"""
+from django.db import connections
+
+WRITE_ALIAS = 'default'
+READ_ALIAS = 'replica'
+
+
+class ReadReplicaRouter:
+    """Send reads to READ_ALIAS and writes, migrations and in-transaction reads to WRITE_ALIAS."""
+
+    def db_for_read(self, model, **hints):
+        # Inside a transaction the rows just written are only visible on the
+        # writer's connection
+        if connections[WRITE_ALIAS].in_atomic_block:
+            return WRITE_ALIAS
+        return READ_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return WRITE_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases are the same database
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == WRITE_ALIAS
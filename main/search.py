@@ -0,0 +1,197 @@
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from . import rendering
+
+# FTS5 virtual table holding one row per BlogPost, keyed by the post id (rowid)
+SEARCH_TABLE = 'main_blogpost_fts'
+# The BlogPost fields copied into it; saves that touch none of them leave it alone
+INDEXED_FIELDS = ('title', 'content')
+
+# Column weights passed to bm25(): a hit in the title counts more than one in the body
+TITLE_WEIGHT = 10.0
+CONTENT_WEIGHT = 1.0
+
+SNIPPET_TOKENS = 24
+
+# Only the newest matches are ranked, so a query for a very common word costs the
+# same on a large corpus as on a small one
+MAX_CANDIDATES = getattr(settings, 'SEARCH_MAX_CANDIDATES', 1000)
+
+# Private markers used around matches so the snippet can be escaped before highlighting
+_MATCH_START = '\x02'
+_MATCH_END = '\x03'
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def is_available():
+    """Return True if the database connection can serve full-text queries."""
+    return connection.vendor == 'sqlite'
+
+
+def create_index():
+    """Create the FTS5 table if it does not exist yet."""
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} "
+            f"USING fts5(title, content, tokenize = 'unicode61 remove_diacritics 2', "
+            f"prefix = '2 3')"
+        )
+
+
+def fill_index():
+    """Index every post into the (empty) FTS5 table; returns the number of posts indexed."""
+    if not is_available():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE}(rowid, title, content) "
+            f"SELECT id, title, content FROM main_blogpost"
+        )
+        return cursor.rowcount
+
+
+def drop_index():
+    """Drop the FTS5 table."""
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+
+def rebuild_index():
+    """Recreate the index from scratch and return the number of posts indexed."""
+    if not is_available():
+        return 0
+    with transaction.atomic():
+        drop_index()
+        create_index()
+        indexed = fill_index()
+    with connection.cursor() as cursor:
+        # Merge all b-tree segments so queries touch as few pages as possible
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('optimize')")
+    return indexed
+
+
+def index_post(post):
+    """Add or refresh a single post in the index."""
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [post.pk])
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE}(rowid, title, content) VALUES (%s, %s, %s)",
+            [post.pk, post.title, post.content],
+        )
+
+
+def unindex_post(post_id):
+    """Remove a post from the index."""
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [post_id])
+
+
+def build_match_expression(query):
+    """
+    Turn free text typed by a user into a safe FTS5 MATCH expression.
+
+    Every word is quoted so FTS5 operators in the input are treated as text, and
+    the last word is a prefix match so results appear while the user is typing.
+    """
+    tokens = _TOKEN_RE.findall(query or '')
+    if not tokens:
+        return ''
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def matching_ids_sql(query):
+    """Return (sql, params) selecting the ids of every post matching query."""
+    return (
+        f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s",
+        [build_match_expression(query)],
+    )
+
+
+def filter_posts(queryset, query):
+    """Restrict a BlogPost queryset to posts matching query, keeping its ordering."""
+    if not build_match_expression(query):
+        return queryset.none()
+    if not is_available():
+        return queryset.filter(Q(title__icontains=query) | Q(content__icontains=query))
+    sql, params = matching_ids_sql(query)
+    return queryset.filter(pk__in=RawSQL(sql, params))
+
+
+def _highlight(snippet):
+    """Escape a raw snippet and turn the match markers into <mark> tags."""
+    html = escape(snippet)
+    html = html.replace(_MATCH_START, '<mark>').replace(_MATCH_END, '</mark>')
+    return mark_safe(html)
+
+
+def search_posts(query, limit=50, queryset=None):
+    """
+    Return posts matching query, best match first.
+
+    Each post gets a ``search_rank`` (lower is better, as returned by bm25) and
+    a ``search_snippet`` with the matching words wrapped in <mark> tags.
+    """
+    from .models import BlogPost
+
+    if queryset is None:
+        queryset = BlogPost.objects.select_related('author', 'category').defer(*rendering.LIST_DEFERRED)
+    match = build_match_expression(query)
+    if not match:
+        return []
+    if not is_available():
+        return list(filter_posts(queryset, query).order_by('-created_at')[:limit])
+
+    with connection.cursor() as cursor:
+        # FTS5 doclists are stored in rowid order, so this stops after MAX_CANDIDATES hits
+        cursor.execute(
+            f"SELECT min(rowid) FROM (SELECT rowid FROM {SEARCH_TABLE} "
+            f"WHERE {SEARCH_TABLE} MATCH %s ORDER BY rowid DESC LIMIT %s)",
+            [match, MAX_CANDIDATES],
+        )
+        oldest_candidate = cursor.fetchone()[0]
+        if oldest_candidate is None:
+            return []
+        cursor.execute(
+            f"SELECT rowid, bm25({SEARCH_TABLE}, %s, %s) FROM {SEARCH_TABLE} "
+            f"WHERE {SEARCH_TABLE} MATCH %s AND rowid >= %s "
+            f"ORDER BY 2 LIMIT %s",
+            [TITLE_WEIGHT, CONTENT_WEIGHT, match, oldest_candidate, limit],
+        )
+        ranks = dict(cursor.fetchall())
+        # Snippets are only built for the page of results actually shown
+        placeholders = ', '.join(['%s'] * len(ranks))
+        cursor.execute(
+            f"SELECT rowid, snippet({SEARCH_TABLE}, 1, %s, %s, '…', %s) FROM {SEARCH_TABLE} "
+            f"WHERE {SEARCH_TABLE} MATCH %s AND rowid IN ({placeholders})",
+            [_MATCH_START, _MATCH_END, SNIPPET_TOKENS, match, *ranks],
+        )
+        snippets = dict(cursor.fetchall())
+
+    posts = queryset.in_bulk(list(ranks))
+    results = []
+    for post_id, rank in ranks.items():
+        post = posts.get(post_id)
+        if post is None:
+            continue
+        post.search_rank = rank
+        post.search_snippet = _highlight(snippets.get(post_id, ''))
+        results.append(post)
+    return results
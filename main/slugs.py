@@ -0,0 +1,113 @@
+"""
+Unique slug allocation.
+
+A title's slug is its stem (slugify(title), trimmed so a numeric suffix still
+fits the field) if that is free, otherwise stem-N with N one past the
+highest numeric suffix in use. Both facts come from one aggregate over the
+index range [stem, stem + '.'), which holds exactly the stem and every
+'stem-...' slug because '-' is the only slug character sorting before '.'.
+
+Two requests can still pick the same slug at the same moment, so saving
+retries with a fresh slug when the unique constraint rejects the insert.
+"""
+import re
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, IntegerField, Max, Q
+from django.db.models.functions import Cast, Substr
+from django.utils.text import slugify
+
+# Characters kept free at the end of the field for '-' and the suffix
+SUFFIX_ROOM = 8
+MAX_ATTEMPTS = 5
+DEFAULT_STEM = 'post'
+
+
+def slug_stem(text, max_length):
+    return slugify(text)[:max_length - SUFFIX_ROOM].strip('-_') or DEFAULT_STEM
+
+
+def _slug_range(model, stem, field):
+    prefix = f'{stem}-'
+    return model._default_manager.filter(**{
+        f'{field}__gte': stem,
+        f'{field}__lt': f'{stem}.',
+    }).aggregate(
+        taken=Count('pk', filter=Q(**{field: stem})),
+        highest=Max(
+            Cast(Substr(field, len(prefix) + 1), IntegerField()),
+            filter=Q(**{f'{field}__regex': rf'^{re.escape(prefix)}[0-9]+$'}),
+        ),
+    )
+
+
+def next_free_slug(model, stem, field='slug'):
+    """The slug a new row with this stem should get, found with one query."""
+    usage = _slug_range(model, stem, field)
+    if not usage['taken']:
+        return stem
+    return f'{stem}-{(usage["highest"] or 0) + 1}'
+
+
+def allocate(model, text, field='slug'):
+    """A currently free slug for text; another save may take it before this one is stored."""
+    return next_free_slug(model, slug_stem(text, model._meta.get_field(field).max_length), field)
+
+
+def save_with_unique_slug(instance, text, field='slug', update_fields=None):
+    """
+    Give instance a free slug derived from text and save it (only update_fields,
+    if given), retrying if another save takes the slug first.
+    """
+    model = type(instance)
+    stem = slug_stem(text, model._meta.get_field(field).max_length)
+    for attempt in range(MAX_ATTEMPTS):
+        setattr(instance, field, next_free_slug(model, stem, field))
+        try:
+            with transaction.atomic():
+                instance.save(update_fields=update_fields)
+            return instance
+        except IntegrityError:
+            if attempt == MAX_ATTEMPTS - 1 or not model._default_manager.filter(**{field: getattr(instance, field)}).exists():
+                # Out of attempts, or the conflict was not about the slug
+                raise
+
+
+def needs_slug(value, max_length):
+    return not value or len(value) > max_length or slugify(value) != value
+
+
+def backfill(queryset, source_field='title', field='slug', batch_size=500):
+    """
+    Give every row of queryset with an empty, over-long or malformed slug a
+    unique one; returns the number of rows updated.
+
+    Rows sharing a stem are numbered in memory after one range query per stem.
+    """
+    model = queryset.model
+    max_length = model._meta.get_field(field).max_length
+    rows = [
+        (pk, source, value)
+        for pk, source, value in queryset.order_by('pk').values_list('pk', source_field, field).iterator()
+        if needs_slug(value, max_length)
+    ]
+    next_suffix, free_stems = {}, set()
+    updates = []
+    for pk, source, _ in rows:
+        stem = slug_stem(source, max_length)
+        if stem not in next_suffix:
+            usage = _slug_range(model, stem, field)
+            # Suffixes already in use stay taken even while the bare stem is free
+            next_suffix[stem] = (usage['highest'] or 0) + 1
+            if not usage['taken']:
+                free_stems.add(stem)
+        if stem in free_stems:
+            free_stems.discard(stem)
+            slug = stem
+        else:
+            slug = f'{stem}-{next_suffix[stem]}'
+            next_suffix[stem] += 1
+        updates.append(model(pk=pk, **{field: slug}))
+    with transaction.atomic():
+        model._default_manager.bulk_update(updates, [field], batch_size=batch_size)
+    return len(updates)
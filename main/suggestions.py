@@ -0,0 +1,148 @@
+"""
+Who to follow: friends of friends.
+
+A profile is suggested to someone who does not follow it yet when people
+they follow do; the more of them (mutuals), the higher. Each profile keeps its
+LIMIT best suggestions in FollowSuggestion.
+
+rebuild() computes every profile's list in one pass over the whole follow
+graph, held in compressed sparse row form: for each follower a slice of one
+flat array of followed profile ids. A profile's candidates are counted by
+concatenating the slices of everyone it follows, so the counting runs in C.
+Profiles following more than MAX_FOLLOWING others are not walked through, as
+they would make nearly everyone a candidate for all their followers.
+
+When a profile follows or unfollows someone only its own list is out of
+date: the followed profile is dropped from it straight away and the whole
+list is recomputed in the background by refresh_profile(), with one grouped
+query on the follow table (skipping the same profiles, by following_count).
+Lists of everyone else catch up at the next rebuild.
+"""
+import heapq
+from array import array
+from collections import Counter
+from itertools import chain
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count
+
+from . import jobs
+
+LIMIT = getattr(settings, 'FOLLOW_SUGGESTIONS_LIMIT', 10)
+MAX_FOLLOWING = getattr(settings, 'FOLLOW_SUGGESTIONS_MAX_FOLLOWING', 5000)
+BATCH_SIZE = 1000
+
+
+def load_graph():
+    """({follower id: (start, stop)}, followed ids) of every follow edge, followers' slices in id order."""
+    from .models import Profile
+
+    Follow = Profile.following.through
+    quote = connection.ops.quote_name
+    slices, targets = {}, array('q')
+    current, start = None, 0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT {quote("from_profile_id")}, {quote("to_profile_id")} FROM {quote(Follow._meta.db_table)} '
+            f'ORDER BY {quote("from_profile_id")}'
+        )
+        while True:
+            rows = cursor.fetchmany(10000)
+            if not rows:
+                break
+            for follower, followed in rows:
+                if follower != current:
+                    if current is not None:
+                        slices[current] = (start, len(targets))
+                    current, start = follower, len(targets)
+                targets.append(followed)
+    if current is not None:
+        slices[current] = (start, len(targets))
+    return slices, targets
+
+
+def suggest(slices, targets, profile, limit=LIMIT):
+    """[(mutuals, suggested id)] for profile, best first."""
+    start, stop = slices.get(profile, (0, 0))
+    following = targets[start:stop]
+    walked = (
+        slices[followed] for followed in following
+        if followed in slices and slices[followed][1] - slices[followed][0] <= MAX_FOLLOWING
+    )
+    counts = Counter(chain.from_iterable(targets[s:e] for s, e in walked))
+    counts.pop(profile, None)
+    for followed in following:
+        counts.pop(followed, None)
+    # Ties go to the older profile
+    return [(mutuals, suggested) for suggested, mutuals in heapq.nlargest(
+        limit, counts.items(), key=lambda item: (item[1], -item[0]),
+    )]
+
+
+def _replace(profiles, suggestions):
+    """Store {profile id: [(mutuals, suggested id)]} as the whole lists of profiles."""
+    from .models import FollowSuggestion
+
+    FollowSuggestion.objects.filter(profile_id__in=profiles).delete()
+    FollowSuggestion.objects.bulk_create([
+        FollowSuggestion(profile_id=profile, suggested_id=suggested, mutuals=mutuals, rank=rank)
+        for profile in profiles
+        for rank, (mutuals, suggested) in enumerate(suggestions.get(profile, []))
+    ], batch_size=BATCH_SIZE)
+
+
+@jobs.task
+def rebuild(limit=LIMIT, batch_size=BATCH_SIZE):
+    """Recompute every profile's suggestions; returns (profiles, suggestions stored)."""
+    from .models import Profile
+
+    slices, targets = load_graph()
+    profiles = list(Profile.objects.order_by('pk').values_list('pk', flat=True))
+    stored = 0
+    for i in range(0, len(profiles), batch_size):
+        batch = profiles[i:i + batch_size]
+        suggestions = {profile: suggest(slices, targets, profile, limit) for profile in batch}
+        with transaction.atomic():
+            _replace(batch, suggestions)
+        stored += sum(map(len, suggestions.values()))
+    return len(profiles), stored
+
+
+@jobs.task
+def refresh_profile(profile_id, limit=LIMIT):
+    """Recompute one profile's suggestions from the follow table."""
+    from .models import Profile
+
+    Follow = Profile.following.through
+    following = Follow.objects.filter(from_profile_id=profile_id).values('to_profile_id')
+    walked = Profile.objects.filter(pk__in=following, following_count__lte=MAX_FOLLOWING).values('pk')
+    rows = (
+        Follow.objects.filter(from_profile_id__in=walked)
+        .exclude(to_profile_id__in=following).exclude(to_profile_id=profile_id)
+        .values('to_profile_id').annotate(mutuals=Count('pk'))
+        .order_by('-mutuals', 'to_profile_id').values_list('mutuals', 'to_profile_id')[:limit]
+    )
+    with transaction.atomic():
+        _replace([profile_id], {profile_id: list(rows)})
+
+
+def follow_changed(profile, action, reverse, pk_set):
+    """
+    Apply an m2m_changed event on Profile.following to the stored suggestions.
+
+    When reverse is False, profile is the follower and pk_set the profiles it
+    (un)follows; when True, profile is the one being followed.
+    """
+    from .models import FollowSuggestion
+
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    followers = list(pk_set or ()) if reverse else [profile.pk]
+    if action == 'post_add':
+        if reverse:
+            FollowSuggestion.objects.filter(profile_id__in=followers, suggested=profile).delete()
+        else:
+            FollowSuggestion.objects.filter(profile=profile, suggested_id__in=pk_set).delete()
+    for follower in followers:
+        jobs.enqueue(refresh_profile, profile_id=follower)
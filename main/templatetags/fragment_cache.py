@@ -0,0 +1,43 @@
+from django import template
+
+from main import caching
+
+register = template.Library()
+
+
+class CacheFragmentNode(template.Node):
+    def __init__(self, nodelist, namespace, vary_on):
+        self.nodelist = nodelist
+        self.namespace = namespace
+        self.vary_on = vary_on
+
+    def render(self, context):
+        namespace = self.namespace.resolve(context)
+        parts = [var.resolve(context) for var in self.vary_on]
+        return caching.get_or_set(namespace, parts, lambda: self.nodelist.render(context))
+
+
+@register.tag
+def cachefragment(parser, token):
+    """
+    Cache the enclosed template fragment in a caching namespace.
+
+    Usage::
+
+        {% cachefragment 'post_cards' post.pk post.updated_at %}
+            ...
+        {% endcachefragment %}
+
+    The values after the namespace become part of the key, so a fragment is
+    re-rendered whenever one of them changes or the namespace is invalidated.
+    """
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' tag requires at least a namespace.")
+    nodelist = parser.parse(('endcachefragment',))
+    parser.delete_first_token()
+    return CacheFragmentNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        [parser.compile_filter(bit) for bit in bits[2:]],
+    )
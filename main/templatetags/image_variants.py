@@ -0,0 +1,23 @@
+from django import template
+from django.utils.html import format_html_join
+
+from main import images
+
+register = template.Library()
+
+
+@register.simple_tag
+def srcset(fieldfile, variant='card', lazy=True):
+    """
+    Render src, srcset and size attributes for an <img> showing a resized variant.
+
+    Usage::
+
+        <img {% srcset profile.avatar 'card' %} alt="..." class="...">
+    """
+    if not fieldfile:
+        return ''
+    attrs = images.srcset(fieldfile, variant)
+    if lazy:
+        attrs.update(loading='lazy', decoding='async')
+    return format_html_join(' ', '{}="{}"', attrs.items())
@@ -1,3 +1,1486 @@
-from django.test import TestCase
+import asyncio
+import base64
+import email
+import gzip
+import json
+import os
+import shutil
+import smtplib
+import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.template import Context, Template
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.text import slugify
+
+from asgiref.sync import async_to_sync, sync_to_async
+from PIL import Image
+
+from . import (
+    assets, benchmarks, caching, counters, events, feed, images, jobs, loadgen, login_attempts, newsletter, notify,
+    queryplans, related, rendering, retention, routers, search, slugs, suggestions, throttle, trending,
+    two_factor_utils,
+)
+from .forms import PostForm, ProfileUpdateForm
+from .mailsink import SMTPSink
+from .models import (
+    BlogCategory, BlogPost, Comment, FeedEntry, FollowSuggestion, Job, Like, LoginAttempt, LoginAttemptRollup,
+    NewsletterCampaign, NewsletterSubscriber, Notification, NotificationActor, Profile, RelatedPost, Share,
+    StreamEvent, TrendingScore, TwoFactorAuth,
+)
+from .pagination import CursorPaginator
+
+
+class SearchIndexTests(TestCase):
+    """The FTS5 index follows posts as they are saved and deleted, and ranks title hits above body hits."""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='writer', password='secret')
+
+    def post(self, title, content):
+        return BlogPost.objects.create(title=title, slug=slugify(title), author=self.author, content=content)
+
+    def found(self, query):
+        return [post.pk for post in search.search_posts(query)]
+
+    def test_index_follows_saves_and_deletes(self):
+        post = self.post('Django tips', 'Views and models')
+        self.assertEqual(self.found('models'), [post.pk])
+        post.content = 'Templates only'
+        post.save()
+        self.assertEqual(self.found('models'), [])
+        # The last word matches as a prefix
+        self.assertEqual(self.found('templ'), [post.pk])
+        post.delete()
+        self.assertEqual(self.found('templates'), [])
+
+    def test_saves_of_other_fields_leave_the_index_alone(self):
+        post = self.post('Django tips', 'Views and models')
+        loaded = BlogPost.objects.defer('content').get(pk=post.pk)
+        loaded.likes_count = 5
+        with self.assertNumQueries(1):
+            loaded.save(update_fields=['likes_count'])
+        loaded.title = 'Flask tips'
+        loaded.save(update_fields=['title'])
+        self.assertEqual(self.found('flask'), [post.pk])
+        self.assertEqual(self.found('models'), [post.pk])
+
+    def test_title_hits_rank_first(self):
+        body = self.post('Cooking notes', 'Python comes up in the body, python twice')
+        title = self.post('Python basics', 'An introduction')
+        self.assertEqual(self.found('python'), [title.pk, body.pk])
+        results = search.search_posts('python')
+        self.assertLess(results[0].search_rank, results[1].search_rank)
+        self.assertIn('<mark>python</mark>', results[1].search_snippet)
+
+    def test_operators_in_queries_are_text(self):
+        self.assertEqual(search.build_match_expression('tips OR "near'), '"tips" "OR" "near"*')
+        self.assertEqual(search.build_match_expression('!!'), '')
+        self.post('Tips', '<b>or</b> tricks')
+        self.assertEqual(self.found('"tricks'), self.found('tricks'))
+        self.assertNotIn('<b>', str(search.search_posts('tricks')[0].search_snippet))
+
+
+class EngagementCounterTests(TestCase):
+    """Counter columns only move through counters.bump and recount, never through saves of stale rows."""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='secret')
+        self.reader = User.objects.create_user(username='reader', password='secret')
+        self.category = BlogCategory.objects.create(name='Django')
+        self.post = BlogPost.objects.create(
+            title='Counted', slug='counted', author=self.author, category=self.category, content='Body',
+        )
+
+    def test_edits_of_stale_rows_keep_the_counters(self):
+        post = BlogPost.objects.get(pk=self.post.pk)
+        profile = Profile.objects.get(user=self.author)
+        Like.objects.create(user=self.reader, post=self.post)
+        self.reader.profile.following.add(self.author.profile)
+
+        form = PostForm(data={'title': 'Edited', 'content': 'New body', 'category': self.category.pk}, instance=post)
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+        ProfileUpdateForm(data={'bio': 'Hi'}, instance=profile).save()
+        self.author.save()
+
+        post = BlogPost.objects.get(pk=self.post.pk)
+        self.assertEqual((post.title, post.likes_count), ('Edited', 1))
+        self.assertIn('New body', post.content_html)
+        profile = Profile.objects.get(user=self.author)
+        self.assertEqual((profile.bio, profile.followers_count, profile.posts_count), ('Hi', 1, 1))
+
+    def test_admin_edits_keep_the_counters(self):
+        model_admin = admin.site._registry[BlogPost]
+        request = RequestFactory().post('/')
+        request.user = User.objects.create_superuser(username='admin', password='secret')
+        post = BlogPost.objects.get(pk=self.post.pk)
+        Like.objects.create(user=self.reader, post=self.post)
+
+        form = model_admin.get_form(request, post, change=True)(data={
+            'title': 'Edited', 'slug': '', 'author': self.author.pk, 'category': self.category.pk, 'content': 'New body',
+        }, instance=post)
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertNotIn('likes_count', form.fields)
+        model_admin.save_model(request, form.save(commit=False), form, change=True)
+
+        post = BlogPost.objects.get(pk=self.post.pk)
+        self.assertEqual((post.title, post.slug, post.likes_count), ('Edited', 'edited', 1))
+        self.assertIn('New body', post.content_html)
+
+    def test_toggle_featured_keeps_the_counters(self):
+        self.client.force_login(self.author)
+        Like.objects.create(user=self.reader, post=self.post)
+        with mock.patch.object(BlogPost, 'asave', autospec=True, side_effect=BlogPost.asave) as asave:
+            self.client.post(reverse('toggle_featured', args=[self.post.pk]))
+        self.assertEqual(asave.call_args.kwargs['update_fields'], ['featured', 'updated_at'])
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.featured, self.post.likes_count), (True, 1))
+
+    def test_engagement_bumps_and_clamps_at_zero(self):
+        like = Like.objects.create(user=self.reader, post=self.post)
+        Share.objects.create(user=self.reader, post=self.post)
+        Comment.objects.create(post=self.post, author=self.reader, content='Nice')
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.shares_count, self.post.comments_count), (1, 1, 1))
+
+        # A counter that has drifted below the real count never goes negative
+        BlogPost.objects.filter(pk=self.post.pk).update(likes_count=0)
+        like.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 0)
+
+    def test_follow_counters(self):
+        others = [User.objects.create_user(username=f'fan{i}', password='secret').profile for i in range(2)]
+        for profile in others:
+            profile.following.add(self.author.profile)
+        self.author.profile.following.add(*others)
+        others[0].following.remove(self.author.profile)
+        self.author.profile.following.clear()
+        counts = dict(Profile.objects.values_list('user__username', 'followers_count'))
+        self.assertEqual((counts['author'], counts['fan0'], counts['fan1']), (1, 0, 0))
+        self.assertEqual(Profile.objects.get(user=self.author).following_count, 0)
+        self.assertEqual(Profile.objects.get(user__username='fan1').following_count, 1)
+
+    def test_recount_repairs_drift(self):
+        Like.objects.create(user=self.reader, post=self.post)
+        BlogPost.objects.update(likes_count=7)
+        Profile.objects.filter(user=self.author).update(posts_count=0, followers_count=3)
+        self.assertEqual((counters.recount_posts(), counters.recount_profiles()), (1, 1))
+        self.post.refresh_from_db()
+        profile = Profile.objects.get(user=self.author)
+        self.assertEqual((self.post.likes_count, profile.posts_count, profile.followers_count), (1, 1, 0))
+        self.assertEqual((counters.recount_posts(), counters.recount_profiles()), (0, 0))
+
+
+class CursorPaginatorTests(TestCase):
+    """Keyset pages cover every row once, in (created_at, id) order, and bad cursors fall back to the first page."""
+
+    def setUp(self):
+        author = User.objects.create_user(username='writer', password='secret')
+        self.posts = [
+            BlogPost.objects.create(title=f'Post {i}', slug=f'post-{i}', author=author, content='Body')
+            for i in range(7)
+        ]
+        # Three posts share a timestamp, so the id alone orders them
+        start = timezone.now()
+        for i, post in enumerate(self.posts):
+            BlogPost.objects.filter(pk=post.pk).update(created_at=start + timedelta(minutes=min(i, 4)))
+        self.expected = [post.pk for post in BlogPost.objects.order_by('-created_at', '-pk')]
+        self.paginator = CursorPaginator(BlogPost.objects.all(), 3)
+
+    def test_pages_cover_ties_exactly_once(self):
+        pages, cursor = [], None
+        while True:
+            page = self.paginator.page(cursor)
+            pages.append([post.pk for post in page])
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual(sum(pages, []), self.expected)
+
+    def test_previous_cursor_returns_the_preceding_page(self):
+        first = self.paginator.page()
+        self.assertFalse(first.has_previous())
+        second = self.paginator.page(first.next_cursor)
+        back = self.paginator.page(second.previous_cursor)
+        self.assertEqual([post.pk for post in back], self.expected[:3])
+        self.assertFalse(back.has_previous())
+        self.assertTrue(back.has_next())
+
+    def test_last_full_page_has_no_next(self):
+        paginator = CursorPaginator(BlogPost.objects.all(), 7)
+        self.assertFalse(paginator.page().has_next())
+
+    def test_invalid_cursors_give_the_first_page(self):
+        def token(payload):
+            return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+        for cursor in ['garbage', '!!!', token(['x', 1, 2]), token(['n', True, 1]), token(['n', 'not a date', 1]), token([1])]:
+            self.assertEqual([post.pk for post in self.paginator.page(cursor)], self.expected[:3], cursor)
+
+
+class HomeTimelineTests(TestCase):
+    """Posts are fanned out on write, backfilled on follow, pruned on unfollow and merged in from celebrities."""
+
+    def setUp(self):
+        self.reader = User.objects.create_user(username='reader', password='secret')
+        self.writer = User.objects.create_user(username='writer', password='secret')
+
+    def post(self, author, title):
+        return BlogPost.objects.create(title=title, slug=slugify(title), author=author, content='Body')
+
+    def timeline(self, user, cursor=None, per_page=10):
+        return [post.pk for post in feed.timeline_page(user, cursor, per_page)]
+
+    def follow(self):
+        self.reader.profile.following.add(self.writer.profile)
+
+    def test_fan_out_and_prune(self):
+        self.follow()
+        post = self.post(self.writer, 'Fresh')
+        self.assertEqual(self.timeline(self.reader), [post.pk])
+        self.assertEqual(self.timeline(self.writer), [post.pk])
+        self.reader.profile.following.remove(self.writer.profile)
+        self.assertEqual(self.timeline(self.reader), [])
+        self.assertEqual(self.timeline(self.writer), [post.pk])
+
+    def test_follow_backfills_recent_posts(self):
+        posts = [self.post(self.writer, f'Old {i}') for i in range(3)]
+        with mock.patch.object(feed, 'BACKFILL_LIMIT', 2):
+            self.follow()
+        self.assertEqual(self.timeline(self.reader), [posts[2].pk, posts[1].pk])
+
+    def test_celebrity_posts_are_merged_on_read(self):
+        with mock.patch.object(feed, 'FANOUT_THRESHOLD', 0):
+            self.follow()
+            own = self.post(self.reader, 'Mine')
+            famous = [self.post(self.writer, f'Famous {i}') for i in range(2)]
+            self.assertFalse(FeedEntry.objects.filter(owner=self.reader, author=self.writer).exists())
+            self.assertEqual(self.timeline(self.reader), [famous[1].pk, famous[0].pk, own.pk])
+
+            first = feed.timeline_page(self.reader, per_page=2)
+            self.assertEqual([post.pk for post in first], [famous[1].pk, famous[0].pk])
+            self.assertEqual(self.timeline(self.reader, first.next_cursor, per_page=2), [own.pk])
+
+    @mock.patch.object(feed, 'FANOUT_THRESHOLD', 1)
+    def test_authors_back_below_the_threshold_are_backfilled(self):
+        fans = [User.objects.create_user(username=f'fan{i}', password='secret') for i in range(2)]
+        for fan in [self.reader, *fans]:
+            fan.profile.following.add(self.writer.profile)
+        famous = self.post(self.writer, 'Famous')
+        self.assertFalse(FeedEntry.objects.filter(author=self.writer).exclude(owner=self.writer).exists())
+
+        backfills = Job.objects.filter(task=jobs.task_name(feed.backfill_followers))
+        # 3 -> 2 followers stays above the threshold; 2 -> 1 crosses it
+        self.reader.profile.following.remove(self.writer.profile)
+        self.assertFalse(backfills.exists())
+        fans[0].profile.following.clear()
+        self.assertEqual(backfills.count(), 1)
+        jobs.work(burst=True)
+        self.assertEqual(self.timeline(fans[1]), [famous.pk])
+        self.assertEqual(self.timeline(fans[0]), [])
+
+
+class NotificationCoalescingTests(TestCase):
+    """Events on the same post coalesce into one unread row per type, counting each sender once."""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='secret')
+        self.readers = [User.objects.create_user(username=f'reader{i}', password='secret') for i in range(3)]
+        self.post = BlogPost.objects.create(title='Popular', slug='popular', author=self.author, content='Body')
+
+    def unread(self):
+        return Profile.objects.get(user=self.author).unread_notifications_count
+
+    def test_senders_coalesce_into_one_unread_row(self):
+        for reader in self.readers:
+            Like.objects.create(user=reader, post=self.post)
+        notification = Notification.objects.get(recipient=self.author)
+        self.assertEqual((notification.actor_count, notification.sender_id), (3, self.readers[-1].pk))
+        self.assertEqual(self.unread(), 1)
+
+        notify.mark_all_read(self.author)
+        Like.objects.filter(user=self.readers[0]).delete()
+        Like.objects.create(user=self.readers[0], post=self.post)
+        self.assertEqual(Notification.objects.filter(recipient=self.author).count(), 2)
+        self.assertEqual(self.unread(), 1)
+
+    def test_repeat_events_from_one_sender_count_once(self):
+        reader = self.readers[0]
+        Like.objects.create(user=reader, post=self.post)
+        Like.objects.filter(user=reader).delete()
+        Like.objects.create(user=reader, post=self.post)
+        with notify.buffered():
+            Comment.objects.create(post=self.post, author=reader, content='First')
+            Comment.objects.create(post=self.post, author=reader, content='Second')
+        Comment.objects.create(post=self.post, author=self.readers[1], content='Third')
+        counts = dict(Notification.objects.filter(recipient=self.author).values_list('notification_type', 'actor_count'))
+        self.assertEqual(counts, {'like': 1, 'comment': 2})
+
+    def flush_queries(self, senders):
+        with CaptureQueriesContext(connection) as queries:
+            with notify.buffered():
+                for sender in senders:
+                    notify.emit(self.author.pk, sender.pk, 'like', post_id=self.post.pk)
+                    notify.emit(self.author.pk, sender.pk, 'share', post_id=self.post.pk)
+        return [query['sql'] for query in queries.captured_queries if 'main_notification' in query['sql'] or 'main_profile' in query['sql']]
+
+    def test_buffer_flushes_in_fixed_queries(self):
+        # SELECT unread rows, INSERT new ones and their senders, UPDATE the unread badge
+        self.assertEqual(len(self.flush_queries(self.readers)), 4)
+        self.assertEqual(self.unread(), 2)
+        # SELECT unread rows and which buffered senders they count, UPDATE them, INSERT the new senders
+        self.assertEqual(len(self.flush_queries(self.readers[:1] + [self.author, User.objects.create_user(username='new')])), 4)
+        counts = dict(Notification.objects.filter(recipient=self.author).values_list('notification_type', 'actor_count'))
+        self.assertEqual(counts, {'like': 4, 'share': 4})
+        self.assertEqual(NotificationActor.objects.count(), 8)
+
+
+class NamespaceCacheTests(TestCase):
+    """Bumping a namespace's version drops its cached values and fragments, and nothing else."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='writer', password='secret')
+
+    def test_invalidate_moves_only_that_namespace(self):
+        calls = []
+
+        def compute():
+            calls.append(None)
+            return len(calls)
+
+        with mock.patch.object(caching, 'STATS_SAMPLE_RATE', 1):
+            self.assertEqual([caching.get_or_set('projects', ['all'], compute) for _ in range(2)], [1, 1])
+        caching.get_or_set('tutorials', ['all'], lambda: 'kept')
+        version = caching.namespace_version('projects')
+        caching.invalidate('projects')
+        self.assertEqual(caching.namespace_version('projects'), version + 1)
+        with mock.patch.object(caching, 'STATS_SAMPLE_RATE', 1):
+            self.assertEqual(caching.get_or_set('projects', ['all'], compute), 2)
+            self.assertEqual(caching.get_or_set('tutorials', ['all'], lambda: 'recomputed'), 'kept')
+            self.assertEqual(caching.stats()['projects'][:2], (1, 2))
+
+    def test_evicted_version_never_goes_back(self):
+        caching.get_or_set('projects', ['all'], lambda: 'first')
+        caching.invalidate('projects')
+        caching.get_or_set('projects', ['all'], lambda: 'second')
+        version = caching.namespace_version('projects')
+        # An evicted version key must not bring back either value stored before it
+        cache.delete(caching._version_key('projects'))
+        self.assertGreater(caching.namespace_version('projects'), version)
+        self.assertEqual(caching.get_or_set('projects', ['all'], lambda: 'third'), 'third')
+        cache.delete(caching._version_key('projects'))
+        caching.invalidate('projects')
+        self.assertEqual(caching.get_or_set('projects', ['all'], lambda: 'fourth'), 'fourth')
+
+    @mock.patch.object(caching, 'STATS_SAMPLE_RATE', 0.5)
+    def test_stats_are_sampled_and_scaled(self):
+        # A miss then three hits, of which only the miss and one hit are counted
+        with mock.patch.object(caching.random, 'random', side_effect=[0.1, 0.9, 0.2, 0.7]):
+            for _ in range(4):
+                caching.get_or_set('projects', ['all'], lambda: 'value')
+        self.assertEqual(caching.stats()['projects'], (2, 2, 0.5))
+
+    def test_fragments_follow_their_namespace(self):
+        fragment = Template("{% load fragment_cache %}{% cachefragment 'post_cards' 'card' 1 %}{{ title }}{% endcachefragment %}")
+        self.assertEqual(fragment.render(Context({'title': 'First'})), 'First')
+        self.assertEqual(fragment.render(Context({'title': 'Second'})), 'First')
+        caching.invalidate('post_cards')
+        self.assertEqual(fragment.render(Context({'title': 'Second'})), 'Second')
+
+    def test_saves_invalidate_the_namespaces_that_show_them(self):
+        category = BlogCategory.objects.create(name='Django')
+        self.assertEqual([c.name for c in caching.categories()], ['Django'])
+        BlogCategory.objects.create(name='Python')
+        self.assertEqual(len(caching.categories()), 2)
+
+        post = BlogPost.objects.create(title='Star', slug='star', author=self.author, category=category, content='Body', featured=True)
+        self.assertEqual([p.title for p in caching.featured_posts()], ['Star'])
+        version = caching.namespace_version('featured_posts')
+        BlogPost.objects.create(title='Plain', slug='plain', author=self.author, content='Body')
+        self.assertEqual(caching.namespace_version('featured_posts'), version)
+
+        post.title = 'Renamed'
+        post.save()
+        self.assertEqual([p.title for p in caching.featured_posts()], ['Renamed'])
+
+
+class QueryBudgetTests(TestCase):
+    """
+    The dashboard, profile and notifications pages must run the same number of
+    queries whether the user has a handful of rows or hundreds of them.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.category = BlogCategory.objects.create(name='Django')
+        self.reader = User.objects.create_user(username='reader', password='secret')
+
+    def seed(self, username, size):
+        """Create a user with size posts, each liked and commented on, and size notifications."""
+        author = User.objects.create_user(username=username, password='secret')
+        posts = [
+            BlogPost.objects.create(
+                title=f'{username} post {i}', slug=f'{username}-post-{i}',
+                author=author, category=self.category, content='Lorem ipsum dolor sit amet',
+            )
+            for i in range(size)
+        ]
+        for post in posts:
+            Like.objects.create(user=self.reader, post=post)
+            Comment.objects.create(post=post, author=self.reader, content='Nice post')
+            Comment.objects.create(post=post, author=author, content='Thanks')
+        Notification.objects.bulk_create([
+            Notification(recipient=author, sender=self.reader, notification_type='like', post=post)
+            for post in posts
+        ])
+        return author
+
+    def count_queries(self, user, url):
+        self.client.force_login(user)
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def assertFixedQueryCount(self, url_for, budget):
+        small = self.seed('small', 5)
+        large = self.seed('large', 60)
+        small_count = self.count_queries(small, url_for(small))
+        large_count = self.count_queries(large, url_for(large))
+        self.assertEqual(small_count, large_count)
+        self.assertLessEqual(large_count, budget)
+
+    def test_dashboard(self):
+        # Includes the follow suggestions (main.suggestions)
+        self.assertFixedQueryCount(lambda user: reverse('dashboard'), budget=10)
+
+    def test_own_profile(self):
+        # Includes the ETag validator query (main.conditional)
+        self.assertFixedQueryCount(lambda user: reverse('profile', args=[user.username]), budget=8)
+
+    def test_other_profile(self):
+        small = self.seed('small', 5)
+        large = self.seed('large', 60)
+        self.assertEqual(
+            self.count_queries(self.reader, reverse('profile', args=[small.username])),
+            self.count_queries(self.reader, reverse('profile', args=[large.username])),
+        )
+
+    def test_notifications(self):
+        self.assertFixedQueryCount(lambda user: reverse('notifications'), budget=6)
+
+    def test_blog_list(self):
+        self.seed('small', 5)
+        small_count = self.count_queries(self.reader, reverse('blog_list'))
+        self.seed('large', 60)
+        self.assertEqual(self.count_queries(self.reader, reverse('blog_list')), small_count)
+
+
+class LoadGeneratorTests(TestCase):
+    """seed_load_data must be reproducible and leave every denormalized counter correct."""
+
+    def generate(self, prefix):
+        loadgen.LoadGenerator(
+            users=40, follows=200, posts=60, likes=400, shares=50, comments=80, notifications=60,
+            seed=7, prefix=prefix,
+        ).run()
+
+    def test_counters_are_consistent(self):
+        self.generate('a')
+        self.assertEqual(Like.objects.count(), 400)
+        self.assertEqual(counters.recount_posts(), 0)
+        self.assertEqual(counters.recount_profiles(), 0)
+
+    def test_same_seed_same_data(self):
+        def snapshot(prefix):
+            return sorted(
+                (like.user.username.split('_', 1)[1], like.post.slug.split('-', 1)[1])
+                for like in Like.objects.filter(user__username__startswith=f'{prefix}_').select_related('user', 'post')
+            )
+
+        self.generate('a')
+        self.generate('b')
+        self.assertEqual(snapshot('a'), snapshot('b'))
+
+
+class ImageVariantTests(TestCase):
+    """Uploaded images are served as small, metadata-free variants, created on first request if missing."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera maker'
+        buffer = BytesIO()
+        Image.new('RGB', (1600, 900), 'green').save(buffer, 'JPEG', exif=exif)
+        self.source = default_storage.save('avatars/photo.jpg', ContentFile(buffer.getvalue()))
+
+    def test_generate_strips_metadata(self):
+        images.generate(self.source)
+        with default_storage.open(images.variant_name(self.source, 'card', 2)) as variant, Image.open(variant) as image:
+            self.assertEqual(image.format, 'WEBP')
+            self.assertEqual(image.size, (300, 300))
+            self.assertEqual(len(image.getexif()), 0)
+
+    def test_missing_variant_is_generated_on_request(self):
+        url = default_storage.url(images.variant_name(self.source, 'thumb', 1))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertTrue(default_storage.exists(images.variant_name(self.source, 'thumb', 1)))
+
+    def test_unknown_variant_is_not_found(self):
+        self.assertEqual(self.client.get('/media/variants/avatars/photo.jpg/huge-1x.webp').status_code, 404)
+        self.assertEqual(self.client.get('/media/variants/../secret.txt/card-1x.webp').status_code, 404)
+
+    def test_undecodable_source_is_not_found(self):
+        source = default_storage.save('avatars/broken.jpg', ContentFile(b'not an image'))
+        url = default_storage.url(images.variant_name(source, 'thumb', 1))
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertFalse(default_storage.exists(images.variant_name(source, 'thumb', 1)))
+
+
+class StaticFilesMiddlewareTests(TestCase):
+    """Collected static files are served with the right encoding, caching and range handling."""
+
+    CSS = b'body { color: green; }\n' * 50
+
+    def setUp(self):
+        self.static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.static_root)
+        os.makedirs(os.path.join(self.static_root, 'css'))
+        for name in ('css/site.css', 'css/site.0123456789ab.css'):
+            path = os.path.join(self.static_root, name)
+            with open(path, 'wb') as handle:
+                handle.write(self.CSS)
+            assets.compress_file(path)
+        with open(os.path.join(self.static_root, 'staticfiles.json'), 'w') as handle:
+            json.dump({'paths': {'css/site.css': 'css/site.0123456789ab.css'}, 'version': '1.1'}, handle)
+        settings_override = override_settings(STATIC_ROOT=self.static_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_hashed_file_is_immutable_and_precompressed(self):
+        response = self.client.get('/static/css/site.0123456789ab.css', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], assets.IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), self.CSS)
+
+    def test_unhashed_file_is_revalidated(self):
+        response = self.client.get('/static/css/site.css')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+        self.assertNotIn('Content-Encoding', response)
+        again = self.client.get('/static/css/site.css', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+
+    def test_range_request(self):
+        response = self.client.get('/static/css/site.css', HTTP_RANGE='bytes=0-3', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.content, b'body')
+        self.assertEqual(response['Content-Range'], f'bytes 0-3/{len(self.CSS)}')
+        self.assertEqual(self.client.get('/static/css/site.css', HTTP_RANGE='bytes=5000-').status_code, 416)
+
+    def test_unknown_file_falls_through(self):
+        self.assertEqual(self.client.get('/static/css/missing.css').status_code, 404)
+
+
+class AsyncSocialViewTests(TestCase):
+    """The async social endpoints update counters and buffer notifications like the sync ones did."""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='secret')
+        self.reader = User.objects.create_user(username='reader', password='secret')
+        self.post = BlogPost.objects.create(title='Async', slug='async', author=self.author, content='...')
+
+    async def test_like_toggle_notifies_author(self):
+        await self.async_client.aforce_login(self.reader)
+        response = await self.async_client.post(reverse('like_post'), {'post_id': self.post.pk})
+        self.assertEqual(response.json(), {'status': 'success', 'likes_count': 1, 'is_liked': True})
+        self.assertEqual(await Notification.objects.filter(recipient=self.author, notification_type='like').acount(), 1)
+
+        response = await self.async_client.post(reverse('like_post'), {'post_id': self.post.pk})
+        self.assertEqual(response.json()['likes_count'], 0)
+
+    async def test_follow_toggle(self):
+        await self.async_client.aforce_login(self.reader)
+        response = await self.async_client.post(reverse('follow_toggle'), {'user_id': self.author.pk})
+        self.assertEqual(response.json(), {'status': 'success', 'is_following': True, 'followers_count': 1})
+        self.assertTrue(await Notification.objects.filter(recipient=self.author, notification_type='follow').aexists())
+
+    def test_add_comment_notifies_and_publishes_on_commit(self):
+        # Driven from this thread so the view's queries and on_commit callbacks
+        # use the connection whose callbacks are captured here
+        post = async_to_sync(self.async_client.post)
+        url = reverse('add_comment', args=[self.post.pk])
+        self.assertEqual(post(url, {'content': 'Nice'}).status_code, 302)
+        self.assertFalse(Comment.objects.exists())
+
+        backend = events.LocalBackend()
+        self.async_client.force_login(self.reader)
+        with mock.patch.object(events, '_backend', backend), self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(post(url, {'content': ''}).status_code, 400)
+            response = post(url, {'content': 'Nice'})
+        self.assertEqual(response.json()['author'], 'reader')
+        self.post.refresh_from_db(fields=['comments_count'])
+        self.assertEqual(self.post.comments_count, 1)
+        self.assertTrue(Notification.objects.filter(recipient=self.author, notification_type='comment').exists())
+        published = [(event.type, event.data.get('deltas')) for event in backend._history[self.author.pk]]
+        self.assertCountEqual(published, [
+            ('counters', {'comments_count': 1}), ('counters', {'unread_notifications': 1}), ('notification', None),
+        ])
+
+    async def test_only_the_author_deletes_a_post(self):
+        await self.async_client.aforce_login(self.reader)
+        response = await self.async_client.post(reverse('delete_post', args=[self.post.pk]))
+        self.assertEqual(response.status_code, 404)
+        self.assertTrue(await BlogPost.objects.filter(pk=self.post.pk).aexists())
+
+        await self.async_client.aforce_login(self.author)
+        response = await self.async_client.post(reverse('delete_post', args=[self.post.pk]))
+        self.assertEqual(response.json(), {'status': 'success'})
+        self.assertFalse(await BlogPost.objects.filter(pk=self.post.pk).aexists())
+        self.assertEqual((await Profile.objects.aget(user=self.author)).posts_count, 0)
+        self.assertEqual(await sync_to_async(lambda: list(search.search_posts('async')))(), [])
+
+    async def test_only_the_author_toggles_featured(self):
+        await self.async_client.aforce_login(self.reader)
+        response = await self.async_client.post(reverse('toggle_featured', args=[self.post.pk]))
+        self.assertEqual(response.status_code, 404)
+
+        await sync_to_async(caching.featured_posts)()
+        await self.async_client.aforce_login(self.author)
+        response = await self.async_client.post(reverse('toggle_featured', args=[self.post.pk]))
+        self.assertEqual(response.json(), {'status': 'success', 'featured': True})
+        # The cached (empty) list of featured posts was invalidated by the save
+        self.assertEqual([post.pk for post in await sync_to_async(caching.featured_posts)()], [self.post.pk])
+
+
+class EventStreamTests(TestCase):
+    """Live events reach the /events/ stream and are replayed after a reconnect."""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='secret')
+        self.reader = User.objects.create_user(username='reader', password='secret')
+        self.post = BlogPost.objects.create(title='Live', slug='live', author=self.author, content='...')
+        self.backend = events.LocalBackend()
+        patcher = mock.patch.object(events, '_backend', self.backend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_backend_history(self):
+        first, second, third = [self.backend.publish(self.author.pk, 'counters', {'n': n}) for n in range(3)]
+        self.assertEqual(self.backend.since(self.author.pk, first.id), [second, third])
+        self.assertEqual(self.backend.since(self.author.pk, third.id), [])
+        # Ids from before this backend started cannot be replayed
+        self.assertIsNone(self.backend.since(self.author.pk, 1))
+
+    def test_reconnect_replays_missed_events(self):
+        marker = self.backend.publish(self.author.pk, 'counters', {})
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.create(user=self.reader, post=self.post)
+
+        self.client.force_login(self.author)
+        response = self.client.get(reverse('event_stream'), HTTP_LAST_EVENT_ID=str(marker.id))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = response.content.decode()
+        self.assertIn('event: notification', body)
+        self.assertIn('"deltas": {"unread_notifications": 1}', body)
+        self.assertIn('"deltas": {"likes_count": 1}', body)
+        self.assertNotIn('"values"', body)
+
+    def test_first_connect_sends_snapshot(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.create(user=self.reader, post=self.post)
+
+        self.client.force_login(self.author)
+        body = self.client.get(reverse('event_stream')).content.decode()
+        self.assertIn('"values": {"unread_notifications": 1, "followers_count": 0}', body)
+        self.assertNotIn('event: notification', body)
+
+    def test_database_backend_drops_pollers_with_their_loop(self):
+        backend = events.DatabaseBackend()
+
+        async def request():
+            first, second = backend.subscribe(self.author.pk), backend.subscribe(self.reader.pk)
+            _, poller = backend._pollers[first.loop]
+            backend.unsubscribe(first)
+            self.assertFalse(poller.done())
+            backend.unsubscribe(second)
+            await asyncio.sleep(0)
+            return poller
+
+        # Each WSGI request runs in a loop of its own
+        for _ in range(3):
+            self.assertTrue(asyncio.run(request()).cancelled())
+        self.assertEqual(backend._pollers, {})
+
+    def test_database_pollers_deliver_each_event_once(self):
+        backend = events.DatabaseBackend()
+        backend._cursor = 0
+        rows = [StreamEvent.objects.create(user_id=self.author.pk, event_type='counters', data={'n': n}) for n in range(3)]
+        with mock.patch.object(backend, 'deliver') as deliver:
+            # Pollers on different loops read overlapping batches, the slowest one last
+            backend._deliver_new(rows[:2])
+            backend._deliver_new(rows)
+            backend._deliver_new(rows[:1])
+        self.assertEqual([call.args[0].id for call in deliver.call_args_list], [row.pk for row in rows])
+        self.assertEqual(backend._cursor, rows[-1].pk)
+
+
+class ReadReplicaRouterTests(SimpleTestCase):
+    """Reads use the read-only alias except inside a transaction on the writer."""
+
+    router = routers.ReadReplicaRouter()
+
+    def test_routing(self):
+        self.assertEqual(self.router.db_for_read(BlogPost), 'replica')
+        self.assertEqual(self.router.db_for_write(BlogPost), 'default')
+        self.assertTrue(self.router.allow_migrate('default', 'main'))
+        self.assertFalse(self.router.allow_migrate('replica', 'main'))
+
+    def test_reads_inside_transaction_use_writer(self):
+        with mock.patch.object(connection, 'in_atomic_block', True):
+            self.assertEqual(self.router.db_for_read(BlogPost), 'default')
+
+
+class LoginThrottleTests(TestCase):
+    """Repeated failures delay and then lock out an account without reading LoginAttempt."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='member', password='secret')
+        self.writer = login_attempts.AttemptWriter(background=False)
+        patcher = mock.patch.object(login_attempts, 'writer', self.writer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def login(self, password):
+        return self.client.post(reverse('login'), {'username': 'member', 'password': password})
+
+    def test_failures_beyond_free_attempts_are_delayed(self):
+        for _ in range(throttle.login.rules['account'].free_attempts + 1):
+            self.assertEqual(self.login('wrong').status_code, 200)
+        response = self.login('secret')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertNotIn('_auth_user_id', self.client.session)
+
+    @mock.patch('main.throttle.time.time', return_value=throttle.WINDOW * 2000 + 10)
+    def test_lockout_lasts_until_failures_slide_out(self, now):
+        rule = throttle.login.rules['account']
+        for _ in range(rule.limit):
+            throttle.login.failed(account='member', ip='10.0.0.1')
+        with self.assertRaises(throttle.Throttled) as raised:
+            throttle.login.check(account='member', ip='10.0.0.2')
+        self.assertEqual(raised.exception.retry_after, throttle.WINDOW - 10)
+        # In the next bucket the old failures count less and less
+        now.return_value += throttle.WINDOW - 10 + throttle.WINDOW // 10 + 1
+        throttle.login.check(account='member', ip='10.0.0.2')
+        # Other accounts from the same IP are unaffected
+        throttle.login.check(account='someone-else', ip='10.0.0.1')
+
+    def test_repeat_failures_take_one_incr_per_identity(self):
+        throttle.login.failed(account='member', ip='10.0.0.1')
+        with mock.patch.object(throttle, 'cache', wraps=cache) as counted:
+            throttle.login.failed(account='member', ip='10.0.0.1')
+        self.assertEqual([call[0] for call in counted.method_calls], ['incr', 'incr', 'set_many'])
+
+    def test_success_clears_account_and_attempts_are_written_in_batches(self):
+        self.login('wrong')
+        with self.assertNumQueries(0):
+            login_attempts.record(mock.Mock(META={}, headers={}), 'member', success=False)
+        self.assertEqual(self.login('secret').status_code, 302)
+        self.assertEqual(throttle.login.retry_after(account='member', ip='127.0.0.1'), 0)
+
+        self.assertEqual(LoginAttempt.objects.count(), 0)
+        self.assertEqual(self.writer.flush(), 3)
+        self.assertEqual(
+            list(LoginAttempt.objects.order_by('pk').values_list('success', 'ip_address')),
+            [(False, '127.0.0.1'), (False, '0.0.0.0'), (True, '127.0.0.1')],
+        )
+
+    def test_two_factor_codes_are_throttled(self):
+        code = two_factor_utils.issue_code(self.user).code
+        wrong = f'{(int(code) + 1) % 1000000:06d}'
+        for _ in range(throttle.two_factor.rules['account'].free_attempts + 1):
+            self.assertFalse(two_factor_utils.verify_code(self.user, wrong, '127.0.0.1'))
+        with self.assertRaises(throttle.Throttled):
+            two_factor_utils.verify_code(self.user, code, '127.0.0.1')
+
+        cache.clear()
+        self.assertTrue(two_factor_utils.verify_code(self.user, code, '127.0.0.1'))
+        self.assertFalse(two_factor_utils.verify_code(self.user, code, '127.0.0.1'))
+
+
+JOB_CALLS = []
+
+
+@jobs.task
+def record_job_call(value=None):
+    JOB_CALLS.append(value)
+
+
+@jobs.task
+def failing_job():
+    raise RuntimeError('boom')
+
+
+@jobs.task
+def long_job():
+    running = Job.objects.filter(status=Job.RUNNING)
+    running.update(locked_at=timezone.now() - timedelta(seconds=jobs.TIMEOUT + 1))
+    JOB_CALLS.append(jobs.heartbeat())
+    JOB_CALLS.append(jobs.cleanup()[0])
+    running.update(locked_by='other-worker')
+    JOB_CALLS.append(jobs.heartbeat())
+
+
+@jobs.task
+def slow_batch_job():
+    JOB_CALLS.append('slow')
+    # The rest of the batch has waited past the timeout, and another worker takes it over
+    waiting = Job.objects.filter(status=Job.RUNNING).exclude(task=jobs.task_name(slow_batch_job))
+    waiting.update(locked_at=timezone.now() - timedelta(seconds=jobs.TIMEOUT + 1))
+    jobs.cleanup()
+    for job in jobs.claim('other-worker'):
+        jobs.run(job)
+
+
+class JobQueueTests(TestCase):
+    """Jobs are claimed once, retried with backoff and run by run_workers."""
+
+    def setUp(self):
+        JOB_CALLS.clear()
+
+    def test_due_jobs_run_in_priority_order(self):
+        jobs.enqueue(record_job_call, value='later', delay=60)
+        jobs.enqueue(record_job_call, value='low')
+        jobs.enqueue(record_job_call, value='high', priority=5)
+        self.assertEqual(jobs.work(burst=True), 2)
+        self.assertEqual(JOB_CALLS, ['high', 'low'])
+        self.assertEqual(Job.objects.filter(status=Job.DONE).count(), 2)
+        self.assertEqual(Job.objects.get(status=Job.QUEUED).kwargs, {'value': 'later'})
+
+    def test_claim_is_exclusive(self):
+        job = jobs.enqueue(record_job_call)
+        self.assertEqual([claimed.pk for claimed in jobs.claim('first')], [job.pk])
+        self.assertEqual(jobs.claim('second'), [])
+
+    def test_failures_back_off_then_give_up(self):
+        job = jobs.enqueue(failing_job, max_attempts=2)
+        with self.assertLogs('main.jobs', 'ERROR'):
+            jobs.work(burst=True)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertGreater(job.run_at, timezone.now() + timedelta(seconds=jobs.RETRY_BASE_DELAY * 0.5))
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        with self.assertLogs('main.jobs', 'ERROR'):
+            jobs.work(burst=True)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertIn('RuntimeError: boom', job.last_error)
+
+    def test_abandoned_jobs_are_requeued(self):
+        job = jobs.enqueue(record_job_call)
+        jobs.claim('dead-worker')
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(seconds=jobs.TIMEOUT + 1))
+        self.assertEqual(jobs.cleanup(), (1, 0))
+        self.assertEqual(Job.objects.get(pk=job.pk).status, Job.QUEUED)
+
+    def test_heartbeat_keeps_long_jobs_locked(self):
+        self.assertTrue(jobs.heartbeat())
+        job = jobs.enqueue(long_job)
+        jobs.work(burst=True)
+        # Not requeued while beating; told once another worker has the job
+        self.assertEqual(JOB_CALLS, [True, 0, False])
+        self.assertEqual(Job.objects.get(pk=job.pk).locked_by, 'other-worker')
+
+    def test_requeued_batch_mates_run_once(self):
+        jobs.enqueue(slow_batch_job, priority=5)
+        jobs.enqueue(record_job_call, value='a')
+        jobs.enqueue(record_job_call, value='b')
+        # Only the slow job counts for the first worker; the other two ran on the second
+        self.assertEqual(jobs.work(worker_id='first-worker', burst=True), 1)
+        self.assertEqual(JOB_CALLS, ['slow', 'a', 'b'])
+        self.assertEqual(Job.objects.filter(status=Job.DONE).count(), 3)
+
+    def test_periodic_jobs_and_run_workers(self):
+        with mock.patch.object(jobs, 'SCHEDULE', {'main.tests.record_job_call': 60}):
+            call_command('run_workers', concurrency=1, burst=True, stdout=StringIO())
+            jobs.schedule_periodic()
+        self.assertEqual(JOB_CALLS, [None])
+        upcoming = Job.objects.get(status=Job.QUEUED)
+        self.assertGreater(upcoming.run_at, timezone.now() + timedelta(seconds=50))
+
+    def test_verification_email_is_sent_by_a_job(self):
+        user = User.objects.create_user(username='member', email='member@example.com', password='secret')
+        code = two_factor_utils.send_code(user)
+        self.assertEqual(mail.outbox, [])
+        jobs.work(burst=True)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn(code.code, mail.outbox[0].body)
+
+    def test_admin_shows_queue_depth(self):
+        jobs.enqueue(record_job_call)
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'secret'))
+        response = self.client.get(reverse('admin:main_job_changelist'))
+        self.assertContains(response, 'Queue depth')
+        self.assertContains(response, 'main.tests.record_job_call')
+
+
+class NewsletterDispatchTests(TestCase):
+    """Campaigns go out in batches over the SMTP backend and resume from their checkpoint."""
+
+    def setUp(self):
+        NewsletterSubscriber.objects.bulk_create(
+            NewsletterSubscriber(email=f'reader{i}@example.com') for i in range(25)
+        )
+        self.campaign = NewsletterCampaign.objects.create(
+            subject='Issue 1', body_text='Hello readers', body_html='<p>Hello readers</p>',
+        )
+
+    def smtp(self, sink):
+        return override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend', EMAIL_HOST=sink.host, EMAIL_PORT=sink.port,
+        )
+
+    def test_batches_share_a_connection(self):
+        with SMTPSink(refuse=lambda address: address == 'reader3@example.com') as sink, self.smtp(sink):
+            campaign = newsletter.dispatch(self.campaign.pk, batch_size=10)
+        self.assertEqual((campaign.status, campaign.sent_count, campaign.failed_count), (NewsletterCampaign.SENT, 24, 1))
+        self.assertEqual((sink.messages, sink.connections), (24, 3))
+
+        recipients, data = sink.last_messages[-1]
+        self.assertEqual(recipients, ['reader24@example.com'])
+        message = email.message_from_bytes(data)
+        self.assertEqual((message['To'], message['Subject']), ('reader24@example.com', 'Issue 1'))
+        self.assertTrue(message['Message-ID'].startswith(f'<newsletter.{campaign.pk}.'))
+        self.assertEqual([part.get_content_type() for part in message.get_payload()], ['text/plain', 'text/html'])
+
+    def test_crashed_run_resumes_from_checkpoint(self):
+        with SMTPSink(disconnect_after=13) as sink, self.smtp(sink):
+            with self.assertRaises(smtplib.SMTPServerDisconnected):
+                newsletter.dispatch(self.campaign.pk, batch_size=10)
+        self.campaign.refresh_from_db()
+        self.assertEqual((self.campaign.status, self.campaign.sent_count), (NewsletterCampaign.SENDING, 10))
+
+        with SMTPSink() as sink, self.smtp(sink):
+            campaign = newsletter.dispatch(self.campaign.pk, batch_size=10)
+        self.assertEqual(sink.messages, 15)
+        self.assertEqual((campaign.status, campaign.sent_count), (NewsletterCampaign.SENT, 25))
+
+    def test_stops_when_another_run_moves_the_checkpoint(self):
+        def overtaken(campaign):
+            # Another run sends the next batch meanwhile
+            NewsletterCampaign.objects.filter(pk=campaign.pk).update(last_subscriber_id=campaign.last_subscriber_id + 10)
+
+        campaign = newsletter.dispatch(self.campaign.pk, batch_size=10, progress=overtaken)
+        self.assertEqual((campaign.status, campaign.sent_count), (NewsletterCampaign.SENDING, 10))
+        self.assertEqual(len(mail.outbox), 20)
+
+    def test_other_backends_get_regular_messages(self):
+        newsletter.schedule(self.campaign)
+        jobs.work(burst=True)
+        self.assertEqual(len(mail.outbox), 25)
+        self.assertEqual(mail.outbox[0].alternatives[0][1], 'text/html')
+
+
+class SlugAllocationTests(TestCase):
+    """Free slugs are found with one query whatever number of posts share a title."""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='writer', password='secret')
+        self.category = BlogCategory.objects.create(name='Django')
+
+    def post(self, slug, title='Hello World'):
+        return BlogPost.objects.create(title=title, slug=slug, author=self.author, category=self.category, content='Body')
+
+    def submit(self, title='Hello World'):
+        form = PostForm(data={'title': title, 'content': 'Body', 'category': self.category.pk})
+        self.assertTrue(form.is_valid(), form.errors)
+        form.instance.author = self.author
+        return form.save()
+
+    def test_next_suffix_in_one_query(self):
+        self.assertEqual(self.submit().slug, 'hello-world')
+        for slug in ['hello-world-1', 'hello-world-7', 'hello-world-again', 'hello-world-2-b', 'hello-worlds-9']:
+            self.post(slug)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(slugs.allocate(BlogPost, 'Hello, World!'), 'hello-world-8')
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(self.submit('Hello Worlds').slug, 'hello-worlds')
+
+    def test_long_and_empty_titles(self):
+        slug = self.submit('word ' * 30).slug
+        self.assertLessEqual(len(slug), BlogPost._meta.get_field('slug').max_length - slugs.SUFFIX_ROOM)
+        self.assertEqual(self.submit('!!!').slug, 'post')
+
+    def test_retries_when_slug_is_taken_concurrently(self):
+        self.post('hello-world')
+        real = slugs.next_free_slug
+        # The first lookup returns a slug another request stores before this save
+        answers = iter(['hello-world', None])
+        with mock.patch.object(slugs, 'next_free_slug', side_effect=lambda *args: next(answers) or real(*args)):
+            self.assertEqual(self.submit().slug, 'hello-world-1')
+
+    def test_backfill(self):
+        self.post('hello-world')
+        broken = [self.post('', 'Hello World'), self.post('Not A Slug', 'Hello World'), self.post('ok', 'Other')]
+        BlogPost.objects.filter(pk=broken[2].pk).update(slug='x' * 80)
+        out = StringIO()
+        call_command('backfill_slugs', stdout=out)
+        self.assertIn('Successfully updated 3 slugs', out.getvalue())
+        self.assertEqual(
+            [BlogPost.objects.get(pk=post.pk).slug for post in broken],
+            ['hello-world-1', 'hello-world-2', 'other'],
+        )
+
+    def test_backfill_with_free_stem_skips_used_suffixes(self):
+        self.post('hello-world-1')
+        broken = [self.post('', 'Hello World'), self.post('Not A Slug', 'Hello World')]
+        self.assertEqual(slugs.backfill(BlogPost.objects.all()), 2)
+        self.assertEqual([BlogPost.objects.get(pk=post.pk).slug for post in broken], ['hello-world', 'hello-world-2'])
+
+
+class RetentionTests(TestCase):
+    """Expired rows are removed in chunks, after being archived or rolled up as their policy says."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='reader', email='reader@example.com', password='secret')
+        self.sender = User.objects.create_user(username='sender', password='secret')
+        self.archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.archive_dir, ignore_errors=True)
+        self.long_ago = timezone.now() - timedelta(days=400)
+
+    def notify(self, is_read, created_at):
+        notification = Notification.objects.create(
+            recipient=self.user, sender=self.sender, notification_type='follow', is_read=is_read,
+        )
+        Notification.objects.filter(pk=notification.pk).update(created_at=created_at)
+        return notification
+
+    def test_notifications_and_codes(self):
+        read_old = self.notify(True, timezone.now() - timedelta(days=40))
+        unread_old = self.notify(False, self.long_ago)
+        kept = [self.notify(False, timezone.now() - timedelta(days=40)), self.notify(True, timezone.now())]
+        Profile.objects.filter(user=self.user).update(unread_notifications_count=2)
+        TwoFactorAuth.objects.create(user=self.user, code='123456', expires_at=timezone.now() - timedelta(days=2))
+        live_code = TwoFactorAuth.objects.create(user=self.user, code='654321', expires_at=timezone.now())
+
+        out = StringIO()
+        call_command('apply_retention', '--chunk-size', '1', '--pause', '0', stdout=out)
+        self.assertIn('read_notifications: 1 rows deleted', out.getvalue())
+        self.assertIn('\nnotifications: 1 rows deleted', out.getvalue())
+        self.assertEqual(set(Notification.objects.values_list('pk', flat=True)), {n.pk for n in kept})
+        self.assertFalse(Notification.objects.filter(pk__in=[read_old.pk, unread_old.pk]).exists())
+        self.assertEqual(Profile.objects.get(user=self.user).unread_notifications_count, 1)
+        self.assertEqual(list(TwoFactorAuth.objects.values_list('pk', flat=True)), [live_code.pk])
+
+    def test_login_attempts_are_rolled_up_and_archived(self):
+        LoginAttempt.objects.bulk_create(
+            LoginAttempt(email='reader@example.com', ip_address='10.0.0.1', success=i == 0) for i in range(5)
+        )
+        LoginAttempt.objects.create(email='reader@example.com', ip_address='10.0.0.2')
+        LoginAttempt.objects.update(created_at=self.long_ago)
+        recent = LoginAttempt.objects.create(email='reader@example.com', ip_address='10.0.0.1')
+        LoginAttemptRollup.objects.create(day=timezone.localdate(self.long_ago), ip_address='10.0.0.1', failures=7)
+
+        policy, = retention.policies(['login_attempts'])
+        self.assertEqual(retention.apply(policy, dry_run=True), 6)
+        with mock.patch.object(retention, 'ARCHIVE_DIR', self.archive_dir):
+            self.assertEqual(retention.apply(policy, chunk_size=4, pause=0), 6)
+
+        self.assertEqual(list(LoginAttempt.objects.values_list('pk', flat=True)), [recent.pk])
+        self.assertEqual(
+            set(LoginAttemptRollup.objects.values_list('ip_address', 'successes', 'failures')),
+            {('10.0.0.1', 1, 11), ('10.0.0.2', 0, 1)},
+        )
+        archive, = os.listdir(self.archive_dir)
+        with gzip.open(os.path.join(self.archive_dir, archive), 'rt') as lines:
+            rows = [json.loads(line) for line in lines]
+        self.assertEqual([row['ip_address'] for row in rows], ['10.0.0.1'] * 5 + ['10.0.0.2'])
+
+    def test_rolled_back_chunks_are_not_archived(self):
+        LoginAttempt.objects.bulk_create(
+            LoginAttempt(email='reader@example.com', ip_address='10.0.0.1') for _ in range(5)
+        )
+        LoginAttempt.objects.update(created_at=self.long_ago)
+        pks = list(LoginAttempt.objects.order_by('pk').values_list('pk', flat=True))
+        policy, = retention.policies(['login_attempts'])
+
+        def archived():
+            ids = []
+            for name in sorted(os.listdir(self.archive_dir)):
+                with gzip.open(os.path.join(self.archive_dir, name), 'rt') as lines:
+                    ids += [json.loads(line)['id'] for line in lines]
+            return ids
+
+        with mock.patch.object(retention, 'ARCHIVE_DIR', self.archive_dir):
+            hook = mock.Mock(side_effect=[None, RuntimeError('hook failed')])
+            with mock.patch.object(retention, 'import_string', return_value=hook), self.assertRaises(RuntimeError):
+                retention.apply(policy, chunk_size=2, pause=0)
+            self.assertEqual(list(LoginAttempt.objects.order_by('pk').values_list('pk', flat=True)), pks[2:])
+            self.assertEqual(archived(), pks[:2])
+
+            # The next run archives the rest exactly once
+            with mock.patch.object(retention, 'import_string', return_value=mock.Mock()):
+                self.assertEqual(retention.apply(policy, chunk_size=2, pause=0), 3)
+            self.assertEqual(sorted(archived()), pks)
+
+
+class QueryPlanAuditTests(TestCase):
+    """The audit flags scans and sorts, and its suggested index is checked against the real plan."""
+
+    def captured(self, queryset):
+        with CaptureQueriesContext(connection) as queries:
+            list(queryset)
+        return [query['sql'] for query in queries.captured_queries]
+
+    def test_unindexed_filter_gets_a_working_suggestion(self):
+        sql = self.captured(LoginAttempt.objects.filter(email='reader@example.com', success=False).order_by('-created_at'))
+        finding, = queryplans.audit({'login': sql})
+        self.assertIn('SCAN main_loginattempt', finding.issues)
+        self.assertEqual(finding.recommendation, ('main.LoginAttempt', ('email', 'created_at'), (('success', False),)))
+        self.assertTrue(finding.resolved)
+
+    def test_hot_queries_use_their_indexes(self):
+        user = User.objects.create_user(username='reader', password='secret')
+        sql = self.captured(Notification.objects.filter(recipient=user, is_read=False).order_by('-created_at')[:5])
+        sql += self.captured(BlogPost.objects.filter(featured=True).order_by('-created_at')[:3])
+        sql += self.captured(Comment.objects.filter(author=user).order_by('-created_at')[:5])
+        self.assertEqual(queryplans.audit({'dashboard': sql}), [])
+
+    def test_routes_need_no_missing_index(self):
+        ctx = benchmarks.seed()
+        captured = {route.name: benchmarks.capture_route(route, ctx) for route in benchmarks.ROUTES}
+        fixable = [finding for finding in queryplans.audit(captured) if finding.resolved]
+        self.assertEqual([(finding.sql, finding.recommendation) for finding in fixable], [])
+
+    def test_or_branches_and_joins_are_not_equality_filters(self):
+        equality, booleans, ordering, _, _ = queryplans.parse(
+            'SELECT * FROM "main_notification" INNER JOIN "auth_user" T3 ON ("main_notification"."sender_id" = T3."id") '
+            'WHERE (("main_notification"."post_id" IN (9) OR "main_notification"."post_id" IS NULL) '
+            'AND NOT "main_notification"."is_read" AND "main_notification"."recipient_id" = 2) '
+            'ORDER BY "main_notification"."created_at" ASC'
+        )
+        self.assertEqual(equality, [('main_notification', 'recipient_id')])
+        self.assertEqual(booleans, {('main_notification', 'is_read'): False})
+        self.assertEqual(ordering, [('main_notification', 'created_at')])
+
+
+class ConditionalGetTests(TestCase):
+    """Repeat visits get 304 from the validator query alone until the page's content or viewer changes."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='writer', password='secret')
+        self.reader = User.objects.create_user(username='reader', password='secret')
+        self.category = BlogCategory.objects.create(name='Django')
+        self.post = BlogPost.objects.create(
+            title='Hello', slug='hello', author=self.author, category=self.category, content='Body', featured=True,
+        )
+
+    def visit(self, url):
+        # The first page sets the CSRF cookie, which is part of the validator
+        self.client.get(url)
+        return self.client.get(url)
+
+    def revisit(self, url, response):
+        with CaptureQueriesContext(connection) as queries:
+            repeat = self.client.get(url, HTTP_IF_NONE_MATCH=response.headers['ETag'])
+        return repeat, len(queries)
+
+    def test_unchanged_pages_are_not_rendered_again(self):
+        self.client.force_login(User.objects.get(pk=self.reader.pk))
+        for url in ['/', reverse('blog_list'), reverse('blog_detail', args=['hello']), reverse('profile', args=['writer'])]:
+            response = self.visit(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.headers['ETag'].startswith('W/"'))
+            self.assertIn('Cookie', response.headers['Vary'])
+            self.assertIn('private', response.headers['Cache-Control'])
+            repeat, queries = self.revisit(url, response)
+            self.assertEqual(repeat.status_code, 304, url)
+            self.assertEqual(repeat.content, b'')
+            # Session, user and the validator
+            self.assertLessEqual(queries, 3, url)
+
+    def test_changes_invalidate_the_etag(self):
+        url = reverse('blog_detail', args=['hello'])
+        response = self.visit(url)
+        self.assertIn('public', response.headers['Cache-Control'])
+        self.assertIn('Last-Modified', response.headers)
+        self.assertEqual(self.revisit(url, response)[0].status_code, 304)
+
+        Like.objects.create(user=self.reader, post=self.post)
+        repeat, _ = self.revisit(url, response)
+        self.assertEqual(repeat.status_code, 200)
+
+        # Another viewer never gets the anonymous copy validated, even with the same CSRF cookie
+        self.assertEqual(self.revisit(url, repeat)[0].status_code, 304)
+        csrf_cookie = self.client.cookies['csrftoken'].value
+        self.client.force_login(User.objects.get(pk=self.reader.pk))
+        self.client.cookies['csrftoken'] = csrf_cookie
+        self.assertEqual(self.revisit(url, repeat)[0].status_code, 200)
+
+    def test_profile_tracks_the_viewers_follow(self):
+        self.client.force_login(User.objects.get(pk=self.reader.pk))
+        url = reverse('profile', args=['writer'])
+        response = self.visit(url)
+        self.assertEqual(self.revisit(url, response)[0].status_code, 304)
+        self.reader.profile.following.add(self.author.profile)
+        self.assertEqual(self.revisit(url, response)[0].status_code, 200)
+
+    def test_anonymous_profile_visit_redirects_to_login(self):
+        url = reverse('profile', args=['writer'])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.url.startswith(reverse('login')), response.url)
+        self.assertNotIn('ETag', response.headers)
+
+    def test_missing_post_is_still_404(self):
+        response = self.client.get(reverse('blog_detail', args=['missing']), HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, 404)
+
+
+class RenderedContentTests(TestCase):
+    """Post bodies are rendered on save and list pages never read them."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='writer', password='secret')
+        self.category = BlogCategory.objects.create(name='Django')
+        self.post = BlogPost.objects.create(
+            title='Hello', slug='hello', author=self.author, category=self.category,
+            content='First <b>para</b>\n\n' + 'word ' * 300,
+        )
+
+    def test_rendered_on_save(self):
+        self.assertTrue(self.post.content_html.startswith('<p>First &lt;b&gt;para&lt;/b&gt;</p>'))
+        self.assertEqual(self.post.word_count, 302)
+        self.assertEqual(self.post.reading_minutes, 2)
+        self.assertEqual(len(self.post.excerpt.split()), rendering.EXCERPT_WORDS + 1)
+        self.assertTrue(self.post.excerpt.endswith(' …'))
+
+        self.post.content = 'Short'
+        self.post.save()
+        self.assertEqual((self.post.content_html, self.post.excerpt, self.post.word_count), ('<p>Short</p>', 'Short', 1))
+        # Saving a copy loaded without its body keeps the rendered columns
+        partial = BlogPost.objects.defer('content').get(pk=self.post.pk)
+        partial.featured = True
+        partial.save()
+        self.assertEqual(BlogPost.objects.get(pk=self.post.pk).content_html, '<p>Short</p>')
+
+    def test_pages_show_precomputed_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('blog_list'))
+        self.assertContains(response, 'First &lt;b&gt;para&lt;/b&gt; word')
+        self.assertContains(response, '2 min read')
+        self.assertFalse([query for query in queries if '"main_blogpost"."content' in query['sql']])
+
+        response = self.client.get(reverse('blog_detail', args=['hello']))
+        self.assertContains(response, '<p>First &lt;b&gt;para&lt;/b&gt;</p>')
+
+    def test_rerender_command(self):
+        stale = BlogPost.objects.filter(pk=self.post.pk)
+        stale.update(content_html='', excerpt='', word_count=0)
+        updated_at = stale.get().updated_at
+        out = StringIO()
+        call_command('render_posts', '--missing', stdout=out)
+        self.assertIn('Successfully re-rendered 1 posts', out.getvalue())
+        post = stale.get()
+        self.assertEqual(post.word_count, 302)
+        self.assertGreater(post.updated_at, updated_at)
+        # Nothing to write when the stored rendering is current
+        self.assertEqual(rendering.rerender(BlogPost.objects.all()), 0)
+
+
+class RelatedPostsTests(TestCase):
+    """Neighbours come from co-engagement and are refreshed only where it changed."""
+
+    def setUp(self):
+        cache.clear()
+        author = User.objects.create_user(username='writer', password='secret')
+        self.readers = [User.objects.create_user(username=f'reader{i}', password='secret') for i in range(3)]
+        self.posts = [
+            BlogPost.objects.create(title=f'Post {i}', slug=f'post-{i}', author=author, content='Body')
+            for i in range(4)
+        ]
+        a, b, c, d = self.posts
+        for reader in self.readers[:2]:
+            Like.objects.create(user=reader, post=a)
+            Like.objects.create(user=reader, post=b)
+        Like.objects.create(user=self.readers[2], post=b)
+        Comment.objects.create(post=c, author=self.readers[2], content='Nice')
+        Comment.objects.create(post=c, author=self.readers[2], content='Again')
+
+    def neighbours(self, post):
+        return list(RelatedPost.objects.filter(post=post).order_by('rank').values_list('related__slug', flat=True))
+
+    def test_cosine_neighbours(self):
+        a, b, c, d = self.posts
+        self.assertEqual(related.refresh(), (3, 4))
+        self.assertEqual(self.neighbours(a), ['post-1'])
+        # b shares two readers with a and one with c
+        self.assertEqual(self.neighbours(b), ['post-0', 'post-2'])
+        score = RelatedPost.objects.get(post=b, related=c).score
+        # A like weighs 1 and any number of comments by one reader 2
+        self.assertAlmostEqual(score, 1 * 2 / (3 ** 0.5 * 2))
+        self.assertEqual(self.neighbours(d), [])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('blog_detail', args=['post-0']))
+        self.assertContains(response, 'Related posts')
+        self.assertContains(response, reverse('blog_detail', args=['post-1']))
+        # Neither the post nor its neighbours load the raw body
+        self.assertFalse([query for query in queries if '"main_blogpost"."content",' in query['sql']])
+        self.assertEqual(len([query for query in queries if 'main_relatedpost' in query['sql']]), 1)
+
+    def test_incremental_refresh(self):
+        a, b, c, d = self.posts
+        related.refresh()
+        self.assertEqual(related.refresh(), (0, 0))
+        Like.objects.create(user=self.readers[2], post=d)
+        # d and the posts reader2 engaged with: b and c, but not a
+        with mock.patch.object(related, 'store', wraps=related.store) as store:
+            self.assertEqual(related.refresh()[0], 3)
+        self.assertEqual(store.call_args.args[1], {b.pk, c.pk, d.pk})
+        self.assertEqual(self.neighbours(d), ['post-2', 'post-1'])
+
+        # A full rebuild drops the neighbours of posts that lost their engagement
+        Comment.objects.filter(post=c).delete()
+        Like.objects.filter(post=d).delete()
+        call_command('build_related_posts', '--full', stdout=StringIO())
+        self.assertEqual(self.neighbours(c), [])
+        self.assertEqual(self.neighbours(b), ['post-0'])
+
+
+class TrendingTests(TestCase):
+    """Scores decay with age, take each event once and are ranked straight from their index."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='writer', password='secret')
+        self.readers = [User.objects.create_user(username=f'reader{i}', password='secret') for i in range(3)]
+        self.django = BlogCategory.objects.create(name='Django')
+        self.old, self.new = [
+            BlogPost.objects.create(title=title, slug=title.lower(), author=self.author, category=self.django, content='Body')
+            for title in ('Old', 'New')
+        ]
+
+    def engage(self, model, user, post, age):
+        row = model.objects.create(user=user, post=post)
+        model.objects.filter(pk=row.pk).update(created_at=timezone.now() - age)
+
+    def test_recent_engagement_ranks_first(self):
+        for reader in self.readers:
+            self.engage(Like, reader, self.old, timedelta(days=3))
+        self.engage(Like, self.readers[0], self.new, timedelta(minutes=5))
+        self.assertEqual(trending.refresh(), 2)
+        score = TrendingScore.objects.get(post=self.old).score
+        # Three likes three half-lives ago weigh 3 / 8 of a like now
+        self.assertAlmostEqual(trending.decayed(score), 3 / 8, places=3)
+
+        response = self.client.get(reverse('blog_list'), {'sort': 'trending', 'category': 'Django'})
+        self.assertEqual([post.slug for post in response.context['page_obj']], ['new', 'old'])
+        self.assertEqual([post.slug for post in self.client.get('/').context['trending_posts']], ['new', 'old'])
+
+    def test_each_event_counted_once(self):
+        self.engage(Like, self.readers[0], self.new, timedelta(hours=2))
+        trending.refresh()
+        self.assertEqual(trending.refresh(), 0)
+        jobs.save_checkpoint(trending.CHECKPOINT, timezone.now() - timedelta(hours=1))
+        self.engage(Share, self.readers[1], self.new, timedelta(minutes=30))
+        self.assertEqual(trending.refresh(), 1)
+        expected = 2 ** -(2 / 24) + trending.WEIGHTS['share'] * 2 ** -(0.5 / 24)
+        self.assertAlmostEqual(trending.decayed(TrendingScore.objects.get(post=self.new).score), expected, places=2)
+
+        out = StringIO()
+        call_command('update_trending', '--rebuild', stdout=out)
+        self.assertIn('Successfully updated the trending scores of 1 posts', out.getvalue())
+        self.assertAlmostEqual(trending.decayed(TrendingScore.objects.get(post=self.new).score), expected, places=2)
+
+    def test_rankings_scan_one_index(self):
+        self.engage(Like, self.readers[0], self.new, timedelta(hours=1))
+        trending.refresh()
+        for category, index in ((None, 'trendingscore_score_idx'), ('Django', 'trendingscore_category_idx')):
+            scores = trending.ranking(category)
+            page = trending.TrendingPaginator(scores, 5).page_queryset()
+            plan = page.explain()
+            self.assertIn(index, plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+        # The category copy follows the post
+        other = BlogCategory.objects.create(name='Python')
+        self.new.category = other
+        self.new.save()
+        self.assertEqual(TrendingScore.objects.get(post=self.new).category, other)
+
+
+class FollowSuggestionTests(TestCase):
+    """Friends of friends are ranked by mutuals in bulk and per profile alike."""
+
+    def setUp(self):
+        self.users = [User.objects.create_user(username=name, password='secret') for name in 'abcdef']
+        self.a, self.b, self.c, self.d, self.e, self.f = [user.profile for user in self.users]
+        self.a.following.add(self.b, self.c)
+        self.b.following.add(self.d, self.e, self.a)
+        self.c.following.add(self.d, self.f)
+        Job.objects.all().delete()
+
+    def suggested(self, profile):
+        return list(
+            FollowSuggestion.objects.filter(profile=profile).order_by('rank').values_list('suggested__user__username', 'mutuals')
+        )
+
+    def test_rebuild_ranks_by_mutuals(self):
+        out = StringIO()
+        call_command('build_follow_suggestions', stdout=out)
+        self.assertIn('for 6 profiles', out.getvalue())
+        # d is followed by both b and c; ties go to the older profile
+        self.assertEqual(self.suggested(self.a), [('d', 2), ('e', 1), ('f', 1)])
+        self.assertEqual(self.suggested(self.b), [('c', 1)])
+        self.assertEqual(self.suggested(self.d), [])
+
+    def test_follow_refreshes_the_followers_list(self):
+        suggestions.rebuild()
+        self.a.following.add(self.d)
+        # The followed profile goes at once, the rest when the queued job runs
+        self.assertEqual(self.suggested(self.a), [('e', 1), ('f', 1)])
+        job = Job.objects.get(task='main.suggestions.refresh_profile')
+        self.assertEqual(job.kwargs, {'profile_id': self.a.pk})
+
+        self.d.following.add(self.e)
+        suggestions.refresh_profile(self.a.pk)
+        self.assertEqual(self.suggested(self.a), [('e', 2), ('f', 1)])
+        # The batch agrees with the per-profile query
+        suggestions.rebuild()
+        self.assertEqual(self.suggested(self.a), [('e', 2), ('f', 1)])
+
+        self.client.force_login(User.objects.get(pk=self.users[0].pk))
+        response = self.client.get(reverse('dashboard'))
+        self.assertContains(response, 'Followed by 2 people you follow')
@@ -0,0 +1,139 @@
+"""
+Brute-force throttling for the login and two-factor code forms.
+
+Failures are counted per client IP and per account in the cache, using a
+sliding window approximated from two fixed buckets: the current bucket's
+count plus the previous one's, weighted by how much of it still overlaps the
+window. Checking a request is a single get_many() whatever the attempt
+history, so the login path never scans LoginAttempt.
+
+After a rule's free attempts every further failure doubles the wait before
+the next attempt is accepted (up to THROTTLE_MAX_DELAY); at the rule's limit
+the key is locked out until enough failures have slid out of the window.
+"""
+import hashlib
+import math
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import cache
+
+WINDOW = getattr(settings, 'THROTTLE_WINDOW', 15 * 60)
+MAX_DELAY = getattr(settings, 'THROTTLE_MAX_DELAY', 60)
+
+
+class Throttled(Exception):
+    """Raised when an attempt arrives before its key may try again."""
+
+    def __init__(self, retry_after):
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(f'Too many failed attempts; retry in {self.retry_after} seconds')
+
+
+@dataclass(frozen=True)
+class Rule:
+    # Failures within the window that lock the key out
+    limit: int
+    # Failures accepted before delays start
+    free_attempts: int
+    # Whether a successful attempt clears the key's failures
+    reset_on_success: bool = True
+
+
+def seconds_until_below(limit, current, previous, elapsed, window):
+    """Seconds until current + previous * (1 - elapsed / window) drops below limit."""
+    if current < limit:
+        if previous <= 0:
+            return 0
+        # Still inside the current bucket: wait for the previous one to fade
+        target = window * (1 - (limit - current) / previous)
+        if target < window:
+            return max(0, target - elapsed)
+    # The current bucket becomes the previous one and has to fade too
+    return window - elapsed + window * (1 - limit / current)
+
+
+class Throttle:
+    """Sliding-window failure counters for one form, keyed by several identities (IP, account)."""
+
+    def __init__(self, scope, rules, window=WINDOW, max_delay=MAX_DELAY):
+        self.scope = scope
+        self.rules = rules
+        self.window = window
+        self.max_delay = max_delay
+
+    def _key(self, kind, ident, suffix):
+        digest = hashlib.blake2b(str(ident).lower().encode(), digest_size=16).hexdigest()
+        return f'throttle:{self.scope}:{kind}:{digest}:{suffix}'
+
+    def _keys(self, idents, bucket):
+        keys = {}
+        for kind, ident in idents.items():
+            keys[kind] = (
+                self._key(kind, ident, bucket),
+                self._key(kind, ident, bucket - 1),
+                self._key(kind, ident, 'last'),
+            )
+        return keys
+
+    def retry_after(self, **idents):
+        """Seconds to wait before the next attempt for these identities, 0 if it may proceed."""
+        now = time.time()
+        bucket, elapsed = divmod(now, self.window)
+        keys = self._keys(idents, int(bucket))
+        values = cache.get_many([key for triple in keys.values() for key in triple])
+        wait = 0
+        for kind, (current_key, previous_key, last_key) in keys.items():
+            rule = self.rules[kind]
+            current, previous = values.get(current_key, 0), values.get(previous_key, 0)
+            count = current + previous * (1 - elapsed / self.window)
+            if count >= rule.limit:
+                wait = max(wait, seconds_until_below(rule.limit, current, previous, elapsed, self.window))
+            elif count > rule.free_attempts and last_key in values:
+                delay = min(self.max_delay, 2 ** (int(count) - rule.free_attempts - 1))
+                wait = max(wait, values[last_key] + delay - now)
+        return wait
+
+    def check(self, **idents):
+        """Raise Throttled if these identities must wait before trying again."""
+        wait = self.retry_after(**idents)
+        if wait > 0:
+            raise Throttled(wait)
+
+    def failed(self, **idents):
+        """Count a failed attempt against every identity."""
+        now = time.time()
+        keys = self._keys(idents, int(now // self.window))
+        for current_key, _, _ in keys.values():
+            # One round-trip once the bucket exists, which is every failure but its first
+            try:
+                cache.incr(current_key)
+            except ValueError:
+                # Buckets are read for one more window after they close; add()
+                # loses to a concurrent failure that created the bucket first
+                if not cache.add(current_key, 1, timeout=self.window * 2):
+                    cache.incr(current_key)
+        cache.set_many({last_key: now for _, _, last_key in keys.values()}, timeout=self.window)
+
+    def succeeded(self, **idents):
+        """Forget the failures of the identities whose rule resets on success."""
+        bucket = int(time.time() // self.window)
+        cleared = {kind: ident for kind, ident in idents.items() if self.rules[kind].reset_on_success}
+        cache.delete_many([key for triple in self._keys(cleared, bucket).values() for key in triple])
+
+
+login = Throttle('login', {
+    'account': Rule(limit=10, free_attempts=3),
+    # Shared by everyone behind one NAT, so looser and not reset by a success
+    'ip': Rule(limit=100, free_attempts=20, reset_on_success=False),
+})
+
+two_factor = Throttle('2fa', {
+    'account': Rule(limit=5, free_attempts=2),
+    'ip': Rule(limit=50, free_attempts=10, reset_on_success=False),
+})
+
+
+def client_ip(request):
+    return request.META.get('REMOTE_ADDR') or '0.0.0.0'
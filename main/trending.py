@@ -0,0 +1,148 @@
+"""
+Trending posts.
+
+Every like, share and comment adds its WEIGHTS entry to its post's score,
+decaying by half every HALF_LIFE seconds after the event. Decay shrinks all
+scores by the same factor, so instead of shrinking them the job grows new
+contributions: an event at time t adds weight * 2 ** ((t - EPOCH) / HALF_LIFE).
+The ranking is the same at any moment and a stored score never has to be
+touched again once its events are counted. Scores are kept as natural logs
+so they stay within float range for centuries.
+
+refresh() runs periodically and only reads the events created since its
+previous run (up to SETTLE seconds ago, so rows still being committed are
+not skipped), adds them to TrendingScore and moves its checkpoint in the same
+transaction. The first run, or a rebuild, starts HORIZON seconds back, where
+events have decayed past mattering. Removed likes and shares keep counting
+until they decay away.
+
+Rankings are read from TrendingScore alone, highest score first, through its
+score or (category, score) index.
+"""
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import caching, jobs, rendering
+from .pagination import CursorPaginator
+
+WEIGHTS = getattr(settings, 'TRENDING_WEIGHTS', {'like': 1.0, 'comment': 3.0, 'share': 5.0})
+HALF_LIFE = getattr(settings, 'TRENDING_HALF_LIFE', 24 * 60 * 60)
+# Events older than this contribute under 0.1% of their weight
+HORIZON = getattr(settings, 'TRENDING_HORIZON', 10 * HALF_LIFE)
+SETTLE = getattr(settings, 'TRENDING_SETTLE', 30)
+EPOCH = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+DECAY = math.log(2) / HALF_LIFE
+BATCH_SIZE = 500
+CHECKPOINT = 'trending'
+
+
+def log_add(a, b):
+    """log(exp(a) + exp(b)) without leaving float range; a may be None for an empty sum."""
+    if a is None:
+        return b
+    high, low = (a, b) if a >= b else (b, a)
+    return high + math.log1p(math.exp(low - high))
+
+
+def event_score(weight, created_at):
+    return math.log(weight) + (created_at - EPOCH).total_seconds() * DECAY
+
+
+def decayed(score, now=None):
+    """The weight score amounts to at now, as if every event decayed in place."""
+    now = now or timezone.now()
+    return math.exp(score - (now - EPOCH).total_seconds() * DECAY)
+
+
+def collect(since, until):
+    """{post id: log score} of the likes, shares and comments created in [since, until)."""
+    from .models import Comment, Like, Share
+
+    scores = defaultdict(lambda: None)
+    for model, name in ((Like, 'like'), (Share, 'share'), (Comment, 'comment')):
+        events = model.objects.filter(created_at__gte=since, created_at__lt=until).values_list('post_id', 'created_at')
+        for post_id, created_at in events.iterator(chunk_size=5000):
+            scores[post_id] = log_add(scores[post_id], event_score(WEIGHTS[name], created_at))
+    return scores
+
+
+def merge(scores, batch_size=BATCH_SIZE):
+    """Add {post id: log score} to the stored scores; returns the number of posts touched."""
+    from .models import BlogPost, TrendingScore
+
+    posts = sorted(scores)
+    touched = 0
+    for i in range(0, len(posts), batch_size):
+        batch = posts[i:i + batch_size]
+        existing = TrendingScore.objects.in_bulk(batch)
+        now = timezone.now()
+        for post_id, row in existing.items():
+            row.score = log_add(row.score, scores[post_id])
+            row.updated_at = now
+        # Posts deleted since their events were read have no category row to copy
+        new = [
+            TrendingScore(post_id=post_id, category_id=category_id, score=scores[post_id])
+            for post_id, category_id in BlogPost.objects.filter(pk__in=set(batch) - set(existing)).values_list('pk', 'category_id')
+        ]
+        TrendingScore.objects.bulk_update(existing.values(), ['score', 'updated_at'], batch_size=batch_size)
+        TrendingScore.objects.bulk_create(new, batch_size=batch_size)
+        touched += len(existing) + len(new)
+    return touched
+
+
+@jobs.task
+def refresh(rebuild=False):
+    """Count the events created since the last run; returns the number of posts whose score moved."""
+    from .models import TrendingScore
+
+    until = timezone.now() - timedelta(seconds=SETTLE)
+    since = None if rebuild else jobs.checkpoint(CHECKPOINT)
+    if since is None:
+        since = until - timedelta(seconds=HORIZON)
+    if since >= until:
+        return 0
+    with transaction.atomic():
+        if rebuild:
+            TrendingScore.objects.all().delete()
+        touched = merge(collect(since, until))
+        # Counted exactly once: the scores and the checkpoint commit together
+        jobs.save_checkpoint(CHECKPOINT, until)
+    if touched or rebuild:
+        caching.invalidate('trending')
+    return touched
+
+
+def category_changed(post):
+    """Keep the copy of post's category on its score row in step."""
+    from .models import TrendingScore
+
+    TrendingScore.objects.filter(post_id=post.pk).exclude(category_id=post.category_id).update(category_id=post.category_id)
+
+
+class TrendingPaginator(CursorPaginator):
+    """Keyset pages of a TrendingScore queryset, highest score first; the pages hold the posts."""
+
+    def __init__(self, queryset, per_page):
+        super().__init__(queryset, per_page, field='score', tiebreak='pk')
+
+    def _build_page(self, rows, has_next, has_previous):
+        page = super()._build_page(rows, has_next, has_previous)
+        page.object_list = [row.post for row in page.object_list]
+        return page
+
+
+def ranking(category=None):
+    """TrendingScore rows with their posts loaded for cards, optionally of one category (by name)."""
+    from .models import TrendingScore
+
+    scores = TrendingScore.objects.select_related('post__author', 'post__category').defer(
+        *(f'post__{name}' for name in rendering.LIST_DEFERRED)
+    )
+    if category:
+        scores = scores.filter(category__name=category)
+    return scores
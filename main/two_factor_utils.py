@@ -0,0 +1,77 @@
+"""
+Issuing and checking TwoFactorAuth codes.
+
+send_code() returns as soon as the code is stored; the email goes out from
+a background job. Verification goes through throttle.two_factor, per account
+and per IP, so a six-digit code cannot be guessed by trying them all, and
+codes are compared in constant time.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+
+from . import jobs, throttle
+
+CODE_LIFETIME = getattr(settings, 'TWO_FACTOR_CODE_LIFETIME', 10 * 60)
+
+
+def issue_code(user, ip_address=None):
+    """Create a fresh code for user, invalidating any earlier unused ones."""
+    from .models import TwoFactorAuth
+
+    TwoFactorAuth.objects.filter(user=user, used=False).update(used=True)
+    return TwoFactorAuth.objects.create(
+        user=user,
+        code=TwoFactorAuth.generate_code(),
+        expires_at=timezone.now() + timedelta(seconds=CODE_LIFETIME),
+        ip_address=ip_address,
+    )
+
+
+@jobs.task
+def send_code_email(code_id):
+    from .models import TwoFactorAuth
+
+    code = TwoFactorAuth.objects.select_related('user').filter(pk=code_id).first()
+    if code is None or code.used or code.is_expired():
+        return
+    context = {'user': code.user, 'code': code.code, 'minutes': CODE_LIFETIME // 60}
+    send_mail(
+        subject='Your verification code',
+        message=render_to_string('emails/verification_code.txt', context),
+        from_email=None,
+        recipient_list=[code.user.email],
+        html_message=render_to_string('emails/verification_code.html', context),
+    )
+
+
+def send_code(user, ip_address=None):
+    """Issue a code for user and queue the email carrying it."""
+    code = issue_code(user, ip_address)
+    jobs.enqueue(send_code_email, priority=10, max_attempts=3, code_id=code.pk)
+    return code
+
+
+def verify_code(user, code, ip_address):
+    """
+    Return True and consume the code if it is user's current one.
+
+    Raises throttle.Throttled while too many wrong codes have been tried.
+    """
+    from .models import TwoFactorAuth
+
+    idents = {'account': user.pk, 'ip': ip_address}
+    throttle.two_factor.check(**idents)
+    current = TwoFactorAuth.objects.filter(user=user, used=False, expires_at__gt=timezone.now()).first()
+    if current is None or not constant_time_compare(current.code, str(code).strip()):
+        throttle.two_factor.failed(**idents)
+        return False
+    # Only one request may consume the code
+    if not TwoFactorAuth.objects.filter(pk=current.pk, used=False).update(used=True):
+        return False
+    throttle.two_factor.succeeded(**idents)
+    return True
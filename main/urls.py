@@ -12,6 +12,7 @@ urlpatterns = [
     path('login/', views.user_login, name='login'),
     path('logout/', views.user_logout, name='logout'),
     path('dashboard/', views.dashboard, name='dashboard'),
+    path('feed/', views.feed, name='feed'),
     path('post/create/', views.create_post, name='create_post'),
     path('post/edit/<int:pk>/', views.edit_post, name='edit_post'),
     path('post/delete/<int:pk>/', views.delete_post, name='delete_post'),
@@ -21,4 +22,5 @@ urlpatterns = [
     path('profile/<str:username>/', views.profile_view, name='profile'),
     path('follow/', views.follow_toggle, name='follow_toggle'),
     path('notifications/', views.notifications, name='notifications'),
+    path('events/', views.event_stream, name='event_stream'),
 ]
@@ -1,45 +1,88 @@
-from django.shortcuts import render, get_object_or_404, redirect
+from django.shortcuts import aget_object_or_404, render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from django.contrib.auth import login, logout, authenticate
+from django.contrib.auth import login, logout
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib import messages
-from django.http import JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_POST
-from django.core.paginator import Paginator
-from django.db.models import Count, Q
-from .models import BlogPost, BlogCategory, Project, Tutorial, Comment, Profile, Notification, Like, Share
+from django.db.models import Count, Exists, Max, OuterRef, Prefetch, Subquery, Sum
+from .models import (
+    BlogPost, BlogCategory, Project, Tutorial, Comment, Profile, Notification, Like, Share, RelatedPost, FollowSuggestion,
+)
 from .forms import CommentForm, PostForm, ProfileUpdateForm
+from . import caching, events, images, login_attempts, notify, rendering, throttle, trending
+from .conditional import Summary, conditional_page, posts_summary
+from . import search as post_search
+from .feed import timeline_page
+from .pagination import CursorPaginator, page_json_response, wants_json
 
+def home_state(request):
+    return BlogPost.objects.filter(featured=True).aggregate(posts=posts_summary(), updated=Max('updated_at'))
+
+@conditional_page(home_state, namespaces=('categories', 'featured_posts', 'projects', 'tutorials', 'trending'))
 def home(request):
-    categories = BlogCategory.objects.all()
-    featured_posts = BlogPost.objects.filter(featured=True).order_by('-created_at')[:3]
-    projects = Project.objects.filter(featured=True).order_by('-created_at')[:3]
-    tutorials = Tutorial.objects.filter(featured=True).order_by('-created_at')[:3]
+    categories = caching.categories()
+    featured_posts = caching.featured_posts(3)
+    trending_posts = caching.trending_posts(3)
+    projects = caching.projects(featured_only=True, limit=3)
+    tutorials = caching.tutorials(featured_only=True, limit=3)
     return render(request, 'home.html', {
         'categories': categories,
         'featured_posts': featured_posts,
+        'trending_posts': trending_posts,
         'projects': projects,
         'tutorials': tutorials,
     })
 
-def blog_list(request):
+def blog_list_paginator(request):
     query = request.GET.get('q')
     category = request.GET.get('category')
-    posts = BlogPost.objects.all().order_by('-created_at')
+    if request.GET.get('sort') == 'trending':
+        scores = trending.ranking(category)
+        if query:
+            scores = scores.filter(post__in=post_search.filter_posts(BlogPost.objects.all(), query))
+        return trending.TrendingPaginator(scores, 5)
+    posts = BlogPost.objects.select_related('author', 'category').defer(*rendering.LIST_DEFERRED).order_by('-created_at')
     if query:
-        posts = posts.filter(Q(title__icontains=query) | Q(content__icontains=query))
+        posts = post_search.filter_posts(posts, query)
     if category:
         posts = posts.filter(category__name=category)
-    paginator = Paginator(posts, 5)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    categories = BlogCategory.objects.all()
+    return CursorPaginator(posts, 5)
+
+def blog_list_state(request):
+    # Exactly the rows of the requested page
+    paginator = blog_list_paginator(request)
+    rows = paginator.page_queryset(request.GET.get('cursor'))
+    if isinstance(paginator, trending.TrendingPaginator):
+        state = rows.aggregate(posts=posts_summary('post__'), updated=Max('post__updated_at'))
+        # The order moves whenever the scores do
+        state['trending'] = caching.namespace_version('trending')
+        return state
+    return rows.aggregate(posts=posts_summary(), updated=Max('updated_at'))
+
+@conditional_page(blog_list_state, namespaces=('categories', 'post_cards'))
+def blog_list(request):
+    page_obj = blog_list_paginator(request).page(request.GET.get('cursor'))
+    if wants_json(request):
+        return page_json_response(request, page_obj, 'partials/blog_list_items.html')
+    categories = caching.categories()
     return render(request, 'blog_list.html', {'page_obj': page_obj, 'categories': categories})
 
+def blog_detail_state(request, slug):
+    state = BlogPost.objects.filter(slug=slug).aggregate(posts=posts_summary(), updated=Max('updated_at'))
+    # No post: let the view raise 404
+    return state if state['updated'] else None
+
+@conditional_page(blog_detail_state, namespaces=('categories', 'related_posts'))
 def blog_detail(request, slug):
-    post = get_object_or_404(BlogPost, slug=slug)
-    comments = post.comments.all()
+    post = get_object_or_404(BlogPost.objects.select_related('author', 'category').defer('content'), slug=slug)
+    comments = post.comments.select_related('author')
+    related = (
+        RelatedPost.objects.filter(post=post).select_related('related')
+        .only('related__title', 'related__slug', 'related__word_count').order_by('rank')
+    )
     if request.method == 'POST':
         form = CommentForm(request.POST)
         if form.is_valid():
@@ -51,19 +94,19 @@ def blog_detail(request, slug):
             return redirect('blog_detail', slug=slug)
     else:
         form = CommentForm()
-    return render(request, 'blog_detail.html', {'post': post, 'comments': comments, 'form': form})
+    return render(request, 'blog_detail.html', {'post': post, 'comments': comments, 'related': related, 'form': form})
 
 def project_list(request):
-    projects = Project.objects.all().order_by('-created_at')
+    projects = caching.projects()
     return render(request, 'project_list.html', {'projects': projects})
 
 def tutorial_list(request):
-    tutorials = Tutorial.objects.all().order_by('-created_at')
+    tutorials = caching.tutorials()
     return render(request, 'tutorial_list.html', {'tutorials': tutorials})
 
 def search(request):
     query = request.GET.get('q')
-    posts = BlogPost.objects.filter(Q(title__icontains=query) | Q(content__icontains=query)) if query else BlogPost.objects.none()
+    posts = post_search.search_posts(query) if query else []
     return render(request, 'search_results.html', {'posts': posts, 'query': query})
 
 def register(request):
@@ -87,15 +130,27 @@ def user_login(request):
         
     if request.method == 'POST':
         form = AuthenticationForm(request, data=request.POST)
+        username = request.POST.get('username', '')
+        idents = {'account': username, 'ip': throttle.client_ip(request)}
+        try:
+            throttle.login.check(**idents)
+        except throttle.Throttled as throttled:
+            login_attempts.record(request, username, success=False)
+            messages.error(request, f'Too many failed login attempts. Try again in {throttled.retry_after} seconds.')
+            response = render(request, 'login.html', {'form': AuthenticationForm(request)}, status=429)
+            response['Retry-After'] = str(throttled.retry_after)
+            return response
         if form.is_valid():
-            username = form.cleaned_data.get('username')
-            password = form.cleaned_data.get('password')
-            user = authenticate(username=username, password=password)
-            if user is not None:
-                login(request, user)
-                messages.success(request, f'Welcome back, {username}!')
-                return redirect('dashboard')
+            # The form has already authenticated the user
+            user = form.get_user()
+            login(request, user)
+            throttle.login.succeeded(**idents)
+            login_attempts.record(request, username, success=True, user=user)
+            messages.success(request, f'Welcome back, {user.username}!')
+            return redirect('dashboard')
         else:
+            throttle.login.failed(**idents)
+            login_attempts.record(request, username, success=False)
             messages.error(request, 'Invalid username or password.')
     else:
         form = AuthenticationForm()
@@ -109,28 +164,31 @@ def user_logout(request):
 @login_required
 def dashboard(request):
     # Get user's posts
-    user_posts = BlogPost.objects.filter(author=request.user).order_by('-created_at')
-    print("DEBUG: user_posts:", user_posts)  # Debug statement
+    user_posts = BlogPost.objects.filter(author=request.user).defer(*rendering.LIST_DEFERRED).order_by('-created_at')
     
-    # Get total likes on user's posts
-    total_likes = Like.objects.filter(post__author=request.user).count()
+    # Get total likes and comments on user's posts from the post counters
+    totals = user_posts.aggregate(likes=Sum('likes_count'), comments=Sum('comments_count'))
+    total_likes = totals['likes'] or 0
+    total_comments = totals['comments'] or 0
     
     # Get user's comments
-    user_comments = Comment.objects.filter(author=request.user).order_by('-created_at')[:5]
-    
-    # Get total comments on user's posts
-    total_comments = Comment.objects.filter(post__author=request.user).count()
+    user_comments = Comment.objects.filter(author=request.user).select_related('post').order_by('-created_at')[:5]
     
     # Get unread notifications
-    notifications = request.user.notifications.filter(is_read=False).order_by('-created_at')[:5]
+    notifications = request.user.notifications.filter(is_read=False).select_related('sender').order_by('-created_at')[:5]
     
     # Get featured projects and tutorials
-    featured_projects = Project.objects.filter(featured=True)[:3]
-    featured_tutorials = Tutorial.objects.filter(featured=True)[:3]
+    featured_projects = caching.projects(featured_only=True, limit=3)
+    featured_tutorials = caching.tutorials(featured_only=True, limit=3)
     
     # Get user's profile
     user_profile = request.user.profile
 
+    # Friends-of-friends suggestions, precomputed by main.suggestions
+    follow_suggestions = (
+        FollowSuggestion.objects.filter(profile=user_profile).select_related('suggested__user').order_by('rank')[:5]
+    )
+
     context = {
         'user_posts': user_posts,
         'total_likes': total_likes,
@@ -140,17 +198,24 @@ def dashboard(request):
         'user_projects': featured_projects,
         'user_tutorials': featured_tutorials,
         'user_profile': user_profile,  # Add profile to context
+        'follow_suggestions': follow_suggestions,
     }
     return render(request, 'dashboard.html', context)
 
+@login_required
+def feed(request):
+    page_obj = timeline_page(request.user, request.GET.get('cursor'))
+    if wants_json(request):
+        return page_json_response(request, page_obj, 'partials/feed_items.html')
+    return render(request, 'feed.html', {'page_obj': page_obj})
+
 @login_required
 def create_post(request):
     if request.method == 'POST':
         form = PostForm(request.POST)
         if form.is_valid():
-            post = form.save(commit=False)
-            post.author = request.user
-            post.save()
+            form.instance.author = request.user
+            form.save()
             messages.success(request, 'Post created successfully!')
             return redirect('dashboard')
     else:
@@ -172,17 +237,17 @@ def edit_post(request, pk):
 
 @login_required
 @require_POST
-def delete_post(request, pk):
-    post = get_object_or_404(BlogPost, pk=pk, author=request.user)
-    post.delete()
+async def delete_post(request, pk):
+    post = await aget_object_or_404(BlogPost, pk=pk, author=await request.auser())
+    await post.adelete()
     return JsonResponse({'status': 'success'})
 
 @login_required
 @require_POST
-def toggle_featured(request, pk):
-    post = get_object_or_404(BlogPost, pk=pk, author=request.user)
+async def toggle_featured(request, pk):
+    post = await aget_object_or_404(BlogPost, pk=pk, author=await request.auser())
     post.featured = not post.featured
-    post.save()
+    await post.asave(update_fields=['featured', 'updated_at'])
     return JsonResponse({
         'status': 'success',
         'featured': post.featured
@@ -190,30 +255,33 @@ def toggle_featured(request, pk):
 
 @login_required
 @require_POST
-def like_post(request):
+async def like_post(request):
     post_id = request.POST.get('post_id')
-    post = get_object_or_404(BlogPost, id=post_id)
-    like, created = Like.objects.get_or_create(user=request.user, post=post)
+    post = await aget_object_or_404(BlogPost, id=post_id)
+    like, created = await Like.objects.aget_or_create(user=await request.auser(), post=post)
     
     if not created:
-        like.delete()
+        # Reuse the loaded post so the delete signals can reach its author's live counters
+        like.post = post
+        await like.adelete()
+    await post.arefresh_from_db(fields=['likes_count'])
         
     return JsonResponse({
         'status': 'success',
-        'likes_count': post.likes.count(),
+        'likes_count': post.likes_count,
         'is_liked': created
     })
 
 @login_required
 @require_POST
-def add_comment(request, pk):
-    post = get_object_or_404(BlogPost, pk=pk)
+async def add_comment(request, pk):
+    post = await aget_object_or_404(BlogPost, pk=pk)
     content = request.POST.get('content')
     
     if content:
-        comment = Comment.objects.create(
+        comment = await Comment.objects.acreate(
             post=post,
-            author=request.user,
+            author=await request.auser(),
             content=content
         )
         return JsonResponse({
@@ -226,62 +294,113 @@ def add_comment(request, pk):
 
 @login_required
 def notifications(request):
-    notifications = request.user.notifications.all().order_by('-created_at')
-    unread = notifications.filter(is_read=False)
+    notifications = request.user.notifications.select_related('sender', 'post')
+    page_obj = CursorPaginator(notifications, 20).page(request.GET.get('cursor'))
     
-    # Mark notifications as read
-    unread.update(is_read=True)
+    # Mark notifications as read once the page has been fetched
+    notify.mark_all_read(request.user)
     
+    if wants_json(request):
+        return page_json_response(request, page_obj, 'partials/notification_items.html')
     return render(request, 'notifications.html', {
-        'notifications': notifications
+        'page_obj': page_obj
     })
 
+@login_required
+async def event_stream(request):
+    """Server-Sent Events stream of the user's live notifications and counters."""
+    user = await request.auser()
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    # Under WSGI a held-open response would tie up a worker thread, so only
+    # what is pending is sent and the browser reconnects later
+    if isinstance(request, ASGIRequest):
+        response = StreamingHttpResponse(events.stream(user.pk, last_event_id), content_type='text/event-stream')
+    else:
+        chunks = [chunk async for chunk in events.stream(user.pk, last_event_id, keep_open=False)]
+        response = HttpResponse(''.join(chunks), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 @login_required
 @require_POST
-def follow_toggle(request):
-    user_to_follow = get_object_or_404(User, id=request.POST.get('user_id'))
-    user_profile = request.user.profile
+async def follow_toggle(request):
+    user = await request.auser()
+    user_to_follow = await aget_object_or_404(User.objects.select_related('profile'), id=request.POST.get('user_id'))
+    user_profile = await Profile.objects.aget(user=user)
     
-    if user_to_follow == request.user:
+    if user_to_follow == user:
         return JsonResponse({'status': 'error', 'message': 'You cannot follow yourself'}, status=400)
     
-    if user_profile.following.filter(id=user_to_follow.profile.id).exists():
-        user_profile.following.remove(user_to_follow.profile)
+    if await user_profile.following.filter(id=user_to_follow.profile.id).aexists():
+        await user_profile.following.aremove(user_to_follow.profile)
         is_following = False
     else:
-        user_profile.following.add(user_to_follow.profile)
+        await user_profile.following.aadd(user_to_follow.profile)
         is_following = True
         
         # Create notification
-        Notification.objects.create(
-            recipient=user_to_follow,
-            sender=request.user,
+        await notify.aemit(
+            recipient_id=user_to_follow.id,
+            sender_id=user.id,
             notification_type='follow'
         )
     
+    await user_to_follow.profile.arefresh_from_db(fields=['followers_count'])
+    
     return JsonResponse({
         'status': 'success',
         'is_following': is_following,
-        'followers_count': user_to_follow.profile.followers.count()
+        'followers_count': user_to_follow.profile.followers_count
     })
 
+def profile_state(request, username):
+    """The profile's own fields, its author's posts and the viewer's likes and follow, in one query."""
+    viewer = request.user.pk
+    posts = BlogPost.objects.filter(author=OuterRef('user')).order_by().values('author')
+    likes = Like.objects.filter(post__author=OuterRef('user'), user=viewer).order_by().values('user')
+    return Profile.objects.filter(user__username=username).values(
+        'bio', 'avatar', 'followers_count', 'following_count', 'posts_count',
+    ).annotate(
+        posts=Subquery(posts.annotate(state=posts_summary()).values('state')),
+        likes=Subquery(likes.annotate(state=Summary(Count('pk'), Sum('post_id'))).values('state')),
+        following=Exists(Profile.following.through.objects.filter(
+            from_profile__user_id=viewer, to_profile_id=OuterRef('pk'),
+        )),
+    ).first()
+
 @login_required
+@conditional_page(profile_state)
 def profile_view(request, username):
-    user = get_object_or_404(User, username=username)
+    user = get_object_or_404(User.objects.select_related('profile'), username=username)
     
     # Ensure profile exists
-    Profile.objects.get_or_create(user=user)
+    try:
+        profile = user.profile
+    except Profile.DoesNotExist:
+        profile = Profile.objects.create(user=user)
+    
+    posts = (
+        BlogPost.objects.filter(author=user)
+        .select_related('author__profile', 'category')
+        .defer(*rendering.LIST_DEFERRED)
+        .prefetch_related(Prefetch('comments', queryset=Comment.objects.select_related('author__profile').order_by('created_at')))
+        .annotate(is_liked=Exists(Like.objects.filter(post=OuterRef('pk'), user=request.user)))
+    )
+    page_obj = CursorPaginator(posts, 10).page(request.GET.get('cursor'))
+    if wants_json(request):
+        return page_json_response(request, page_obj, 'partials/profile_post_items.html')
     
-    posts = BlogPost.objects.filter(author=user).order_by('-created_at')
     is_following = request.user.is_authenticated and request.user.profile.following.filter(user=user).exists()
     
     context = {
         'profile_user': user,
-        'posts': posts,
+        'profile': profile,
+        'page_obj': page_obj,
         'is_own_profile': user == request.user,
-        'post_count': posts.count(),
-        'followers_count': user.profile.followers.count(),
-        'following_count': user.profile.following.count(),
+        'post_count': profile.posts_count,
+        'followers_count': profile.followers_count,
+        'following_count': profile.following_count,
         'is_following': is_following,
     }
     return render(request, 'profile.html', context)
@@ -301,3 +420,23 @@ def edit_profile(request):
         form = ProfileUpdateForm(instance=profile)
     
     return render(request, 'edit_profile.html', {'form': form})
+
+def image_variant(request, name):
+    """Serve a resized image variant, generating it first if it does not exist yet."""
+    parsed = images.parse_variant_name(f'{images.VARIANT_DIR}/{name}')
+    if parsed is None:
+        raise Http404('Unknown image variant')
+    source_name, variant, density = parsed
+    variant_name = images.variant_name(source_name, variant, density)
+    storage = images.default_storage
+    if not storage.exists(variant_name):
+        if not storage.exists(source_name):
+            raise Http404('Image not found')
+        try:
+            images.generate(source_name, [(variant, density)])
+        except OSError:
+            # Includes PIL.UnidentifiedImageError: the source is not an image Pillow can decode
+            raise Http404('Image cannot be decoded')
+    response = FileResponse(storage.open(variant_name, 'rb'), content_type=images.content_type(variant_name))
+    response['Cache-Control'] = 'public, max-age=86400'
+    return response
@@ -3,6 +3,9 @@ ASGI config for mysite project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve the site through this entry point (deploy/gunicorn_asgi.py) for the
+/events/ stream to stay open; under WSGI it only returns pending events.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
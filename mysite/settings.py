@@ -49,12 +49,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'main.assets.StaticFilesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'main.notify.NotificationBufferMiddleware',
 ]
 
 ROOT_URLCONF = 'mysite.urls'
@@ -79,14 +81,98 @@ WSGI_APPLICATION = 'mysite.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# DJANGO_DB_NAME points the site at another SQLite file, e.g. for benchmarks.
+# DJANGO_DB_PROFILE=production switches to WAL mode with tuned pragmas,
+# persistent connections and separate read and write aliases.
+
+DATABASE_NAME = os.environ.get('DJANGO_DB_NAME', BASE_DIR / 'db.sqlite3')
+
+# Under ASGI many requests write from their own threads at once. Taking the
+# write lock when a transaction begins lets SQLite wait for it (up to timeout
+# seconds) instead of failing with "database is locked" when a read
+# transaction tries to upgrade.
+SQLITE_WRITER_OPTIONS = {
+    'transaction_mode': 'IMMEDIATE',
+    'timeout': 20,
+}
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+# Applied to every new production connection. WAL lets readers run alongside
+# the writer; synchronous=NORMAL is durable across application crashes in WAL
+# mode and only fsyncs at checkpoints; mmap and a 64 MiB page cache keep hot
+# pages out of read() calls.
+SQLITE_PRAGMAS = ';'.join([
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA busy_timeout = 20000',
+    'PRAGMA mmap_size = 268435456',
+    'PRAGMA cache_size = -65536',
+    'PRAGMA temp_store = MEMORY',
+    # Only takes effect on a new database file; see `apply_retention --enable-incremental-vacuum`
+    'PRAGMA auto_vacuum = INCREMENTAL',
+])
+
+DATABASE_PROFILES = {
+    'development': {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': DATABASE_NAME,
+            'OPTIONS': SQLITE_WRITER_OPTIONS,
+        },
+    },
+    'production': {
+        # The single writer: every INSERT/UPDATE/DELETE and migration
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': DATABASE_NAME,
+            'CONN_MAX_AGE': 600,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {**SQLITE_WRITER_OPTIONS, 'init_command': SQLITE_PRAGMAS},
+        },
+        # Same file, read-only connections; see main.routers
+        'replica': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': DATABASE_NAME,
+            'CONN_MAX_AGE': 600,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'timeout': 20,
+                'init_command': SQLITE_PRAGMAS + ';PRAGMA query_only = ON',
+            },
+            'TEST': {'MIRROR': 'default'},
+        },
+    },
 }
 
+DATABASES = DATABASE_PROFILES[os.environ.get('DJANGO_DB_PROFILE', 'development')]
+DATABASE_ROUTERS = ['main.routers.ReadReplicaRouter'] if 'replica' in DATABASES else []
+
+
+# Cache
+# Set DJANGO_CACHE_BACKEND=file to share the cache between worker processes
+# without running a cache server; the default keeps it in each process' memory.
+
+CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'mysite',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, '.cache'),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+CACHES = {
+    'default': CACHE_BACKENDS[os.environ.get('DJANGO_CACHE_BACKEND', 'locmem')],
+}
+
+# Lifetime of cached lists and post card fragments, in seconds
+CACHE_DEFAULT_TIMEOUT = 60 * 60
+# Share of cache lookups counted for the cache_stats command
+CACHE_STATS_SAMPLE_RATE = 0.01
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -123,10 +209,25 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
 STATIC_URL = '/static/'
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'main/static'),
 ]
 
+# collectstatic writes hashed copies plus .gz/.br siblings (.br needs the Brotli
+# package); main.assets.StaticFilesMiddleware serves them from STATIC_ROOT
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'main.assets.CompressedManifestStaticFilesStorage',
+    },
+}
+
+# Cache lifetime for static files requested by their unhashed name, in seconds
+STATIC_MAX_AGE = 60
+
 
 # Media files (Uploaded files)
 MEDIA_URL = '/media/'
@@ -155,3 +256,81 @@ MESSAGE_TAGS = {
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 CRISPY_TEMPLATE_PACK = 'bootstrap4'
+
+# Full-text search: only the newest N matches of a query are ranked by bm25
+SEARCH_MAX_CANDIDATES = 1000
+
+# Home timeline: authors with more followers than this are merged into feeds on
+# read instead of being fanned out on write
+FEED_FANOUT_THRESHOLD = 1000
+FEED_BACKFILL_LIMIT = 50
+
+# Uploaded images: resized variants are written under MEDIA_ROOT/variants
+IMAGE_VARIANT_FORMAT = 'WEBP'
+IMAGE_VARIANT_QUALITY = 80
+
+# Live updates (/events/): LocalBackend only reaches streams served by the same
+# process; use 'main.events.DatabaseBackend' when running several workers
+EVENTS_BACKEND = 'main.events.LocalBackend'
+EVENTS_HEARTBEAT_INTERVAL = 15
+
+# Brute-force protection for login and two-factor codes (main.throttle):
+# failures are counted per IP and per account over a sliding window, and
+# attempts beyond a rule's free ones wait up to THROTTLE_MAX_DELAY seconds
+THROTTLE_WINDOW = 15 * 60
+THROTTLE_MAX_DELAY = 60
+
+# LoginAttempt rows are written in batches from a background thread
+LOGIN_ATTEMPT_FLUSH_INTERVAL = 2.0
+
+# Outgoing email; set DJANGO_EMAIL_BACKEND to
+# django.core.mail.backends.smtp.EmailBackend (and EMAIL_HOST etc.) in deployment
+EMAIL_BACKEND = os.environ.get('DJANGO_EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+DEFAULT_FROM_EMAIL = os.environ.get('DJANGO_DEFAULT_FROM_EMAIL', 'My CodeVerse <noreply@localhost>')
+
+# Background jobs (main.jobs, run by `manage.py run_workers`). Tasks listed in
+# JOB_SCHEDULE run again this many seconds after their previous run finished.
+JOB_SCHEDULE = {
+    'main.events.prune_stream_events': 60 * 60,
+    'main.retention.enforce': 24 * 60 * 60,
+    'main.related.refresh': 60 * 60,
+    'main.trending.refresh': 5 * 60,
+    'main.suggestions.rebuild': 24 * 60 * 60,
+}
+
+# Rows deleted by `manage.py apply_retention` (main.retention): each policy
+# keeps a model's rows for max_age seconds after date_field (created_at by
+# default). Archived rows are written to RETENTION_ARCHIVE_DIR as gzipped NDJSON.
+RETENTION_POLICIES = {
+    'read_notifications': {
+        'model': 'main.Notification',
+        'max_age': 30 * 24 * 60 * 60,
+        'filter': {'is_read': True},
+    },
+    'notifications': {
+        'model': 'main.Notification',
+        'max_age': 365 * 24 * 60 * 60,
+        'before_delete': 'main.retention.release_unread_notifications',
+    },
+    'two_factor_codes': {
+        'model': 'main.TwoFactorAuth',
+        'date_field': 'expires_at',
+        'max_age': 24 * 60 * 60,
+    },
+    'login_attempts': {
+        'model': 'main.LoginAttempt',
+        'max_age': 90 * 24 * 60 * 60,
+        'archive': True,
+        'before_delete': 'main.retention.rollup_login_attempts',
+    },
+}
+RETENTION_ARCHIVE_DIR = BASE_DIR / 'archive'
+
+# Post, list and profile pages answer repeat visits with 304 Not Modified
+# (main.conditional); changing this version invalidates every ETag, e.g. on deploy
+CONDITIONAL_PAGE_VERSION = os.environ.get('DJANGO_RELEASE', '1')
+
+# Newsletter campaigns: subscribers per SMTP connection and an optional cap on
+# messages per second (None sends as fast as the mail server accepts)
+NEWSLETTER_BATCH_SIZE = 500
+NEWSLETTER_RATE = None
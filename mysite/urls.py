@@ -18,10 +18,14 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from main import views as main_views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('main.urls')),
+    # Resized images are served from MEDIA_ROOT when they exist; this view
+    # creates a missing one on first request
+    path(f'{settings.MEDIA_URL.lstrip("/")}variants/<path:name>', main_views.image_variant, name='image_variant'),
 ]
 
 if settings.DEBUG:
@@ -0,0 +1,41 @@
+// Infinite scroll for cursor-paginated lists.
+// The container marked with data-infinite-scroll receives the rows and the
+// link marked with data-infinite-scroll-next points at the next page.
+document.addEventListener('DOMContentLoaded', () => {
+    const container = document.querySelector('[data-infinite-scroll]');
+    const nextLink = document.querySelector('[data-infinite-scroll-next]');
+    if (!container || !nextLink || !('IntersectionObserver' in window)) return;
+
+    let loading = false;
+
+    const loadNextPage = async () => {
+        if (loading) return;
+        loading = true;
+        try {
+            const response = await fetch(nextLink.href, {
+                headers: { 'Accept': 'application/json' }
+            });
+            const data = await response.json();
+            container.insertAdjacentHTML('beforeend', data.html);
+
+            if (data.has_next) {
+                const url = new URL(nextLink.href);
+                url.searchParams.set('cursor', data.next_cursor);
+                nextLink.href = url.toString();
+            } else {
+                observer.disconnect();
+                nextLink.remove();
+            }
+        } finally {
+            loading = false;
+        }
+    };
+
+    const observer = new IntersectionObserver(entries => {
+        if (entries.some(entry => entry.isIntersecting)) {
+            loadNextPage();
+        }
+    }, { rootMargin: '400px' });
+
+    observer.observe(nextLink);
+});
@@ -0,0 +1,42 @@
+// Live notification badge and counters over Server-Sent Events.
+// The body carries data-event-stream with the stream URL for signed-in users;
+// EventSource reconnects on its own and resumes from the last event id.
+document.addEventListener('DOMContentLoaded', () => {
+    const url = document.body.dataset.eventStream;
+    if (!url || !('EventSource' in window)) return;
+
+    const badge = document.querySelector('.notification-badge');
+
+    const setBadge = (count) => {
+        if (!badge) return;
+        badge.textContent = count;
+        badge.hidden = count <= 0;
+    };
+
+    const counterElements = (name, postId) => {
+        // Post counters (likes_count, ...) live in .likes-count inside the post's buttons
+        if (postId !== undefined) {
+            return document.querySelectorAll(`[data-post-id="${postId}"] .${name.replaceAll('_', '-')}`);
+        }
+        return document.querySelectorAll(`[data-live-counter="${name}"]`);
+    };
+
+    const apply = (name, value, isDelta, postId) => {
+        if (name === 'unread_notifications') {
+            const current = parseInt(badge ? badge.textContent : '0', 10) || 0;
+            setBadge(isDelta ? current + value : value);
+            return;
+        }
+        counterElements(name, postId).forEach(element => {
+            const current = parseInt(element.textContent, 10) || 0;
+            element.textContent = isDelta ? current + value : value;
+        });
+    };
+
+    const source = new EventSource(url);
+    source.addEventListener('counters', (event) => {
+        const data = JSON.parse(event.data);
+        Object.entries(data.values || {}).forEach(([name, value]) => apply(name, value, false, data.post));
+        Object.entries(data.deltas || {}).forEach(([name, value]) => apply(name, value, true, data.post));
+    });
+});